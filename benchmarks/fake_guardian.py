@@ -0,0 +1,259 @@
+"""
+Local stand-in for a Granite Guardian model served by vLLM's OpenAI-compatible API, for running the
+offline benchmarks without a network or GPU. Serves /v1/models, /v1/chat/completions and the batched
+/v1/completions endpoint with Guardian style "Yes"/"No" answers and top logprobs. Request counters
+are served at GET /stats and reset with DELETE /stats.
+
+A message is answered "Yes" when its conversation contains one of the risky keywords, followed by
+--answer-suffix tokens unless max_tokens stops generation. Echoed /v1/completions requests return
+prompt logprobs for the answer appended to the prompt and generate nothing. Response latency is a
+fixed base plus a per prompt token and per generated token cost and random jitter, and at most
+--max-num-seqs requests are processed at a time to mimic a saturated vLLM instance.
+
+    python benchmarks/fake_guardian.py --port 8000 --latency-ms 40 --per-token-us 20
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import asdict, dataclass, field
+
+from starlette.applications import Starlette
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+DEFAULT_KEYWORDS = ("kill", "attack", "bomb", "weapon", "hate")
+
+
+@dataclass
+class FakeGuardianSettings:
+    model: str = "granite-guardian-3.2-5b"
+    latency_ms: float = 30.0  # Base latency of every request
+    per_token_us: float = 10.0  # Prefill cost per prompt token
+    jitter_ms: float = 5.0  # Standard deviation of latency noise
+    max_num_seqs: int = 256  # Sequences processed concurrently, like vLLM's --max-num-seqs
+    risky_probability: float = 0.9  # P(Yes) for messages containing a risky keyword
+    safe_probability: float = 0.05  # P(Yes) for all other messages
+    risky_keywords: tuple[str, ...] = DEFAULT_KEYWORDS
+    error_rate: float = 0.0  # Fraction of requests answered with a 503
+    decode_ms: float = 8.0  # Latency per generated token
+    answer_suffix: tuple[str, ...] = ("<|end_of_text|>",)  # Generated after the label when max_tokens allows
+
+
+@dataclass
+class FakeGuardianStats:
+    requests: int = 0  # HTTP requests to the completion endpoints
+    sequences: int = 0  # Prompts scored, a batched completions request scores several
+    prompt_tokens: int = 0
+    errors: int = 0
+    by_endpoint: dict[str, int] = field(default_factory=dict)
+
+    def reset(self) -> None:
+        self.requests = self.sequences = self.prompt_tokens = self.errors = 0
+        self.by_endpoint.clear()
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _visible_text(generated: list[tuple[str, dict[str, float]]]) -> str:
+    # vLLM leaves special tokens out of the returned text by default
+    return "".join(token for token, _ in generated if not (token.startswith("<|") and token.endswith("|>")))
+
+
+class FakeGuardian:
+    def __init__(self, settings: FakeGuardianSettings | None = None):
+        self.settings = settings or FakeGuardianSettings()
+        self.stats = FakeGuardianStats()
+        self._slots: asyncio.Semaphore | None = None
+        self.app = Starlette(
+            routes=[
+                Route("/v1/models", self.models, methods=["GET"]),
+                Route("/v1/chat/completions", self.chat_completions, methods=["POST"]),
+                Route("/v1/completions", self.completions, methods=["POST"]),
+                Route("/stats", self.get_stats, methods=["GET"]),
+                Route("/stats", self.reset_stats, methods=["DELETE"]),
+            ],
+            # Hedged or cancelled calls hang up before the request is read
+            exception_handlers={ClientDisconnect: self._disconnected},
+        )
+
+    def _p_risky(self, text: str) -> float:
+        lowered = text.lower()
+        if any(keyword in lowered for keyword in self.settings.risky_keywords):
+            return self.settings.risky_probability
+        return self.settings.safe_probability
+
+    async def _process(self, endpoint: str, prompt_tokens: int, sequences: int, generated_tokens: int) -> bool:
+        """
+        Account for a request and sleep for its simulated latency. Returns False if it should fail.
+        """
+        self.stats.requests += 1
+        self.stats.sequences += sequences
+        self.stats.prompt_tokens += prompt_tokens
+        self.stats.by_endpoint[endpoint] = self.stats.by_endpoint.get(endpoint, 0) + 1
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.settings.max_num_seqs)
+
+        settings = self.settings
+        latency = settings.latency_ms / 1000 + prompt_tokens * settings.per_token_us / 1e6
+        latency += generated_tokens * settings.decode_ms / 1000
+        latency = max(0.0, latency + random.gauss(0, settings.jitter_ms / 1000))
+        async with self._slots:
+            await asyncio.sleep(latency)
+        if settings.error_rate and random.random() < settings.error_rate:
+            self.stats.errors += 1
+            return False
+        return True
+
+    @staticmethod
+    async def _disconnected(request: Request, exc: Exception) -> Response:
+        return Response(status_code=499)
+
+    @staticmethod
+    def _unavailable() -> JSONResponse:
+        return JSONResponse({"error": {"message": "Simulated overload", "code": 503}}, status_code=503)
+
+    def _label(self, p_risky: float) -> tuple[str, dict[str, float]]:
+        label = "Yes" if p_risky >= 0.5 else "No"
+        return label, {"Yes": math.log(p_risky), "No": math.log(1 - p_risky)}
+
+    async def get_stats(self, request: Request) -> JSONResponse:
+        return JSONResponse(asdict(self.stats))
+
+    async def reset_stats(self, request: Request) -> JSONResponse:
+        self.stats.reset()
+        return JSONResponse(asdict(self.stats))
+
+    async def models(self, request: Request) -> JSONResponse:
+        return JSONResponse({"object": "list", "data": [{"id": self.settings.model, "object": "model", "created": 0, "owned_by": "fake"}]})
+
+    def _generated(self, label: str, top: dict[str, float], max_tokens: int | None) -> list[tuple[str, dict[str, float]]]:
+        """
+        Tokens generated for an answer: the label, then any suffix up to max_tokens.
+        """
+        tokens = [(label, top)] + [(token, {token: math.log(0.99), "No": math.log(0.004)}) for token in self.settings.answer_suffix]
+        return tokens[:max_tokens] if max_tokens is not None else tokens
+
+    async def chat_completions(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        guardian_config = body.get("chat_template_kwargs", {}).get("guardian_config", {})
+        text = json.dumps(body["messages"]) + json.dumps(guardian_config)
+        prompt_tokens = count_tokens(text)
+        label, top = self._label(self._p_risky(json.dumps(body["messages"])))
+        generated = self._generated(label, top, body.get("max_tokens"))
+        if not await self._process("chat", prompt_tokens, 1, len(generated)):
+            return self._unavailable()
+
+        return JSONResponse({
+            "id": f"chatcmpl-{self.stats.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", self.settings.model),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "length" if body.get("max_tokens") else "stop",
+                "message": {"role": "assistant", "content": _visible_text(generated)},
+                "logprobs": {"content": [
+                    {
+                        "token": token,
+                        "logprob": alternatives[token],
+                        "bytes": None,
+                        "top_logprobs": [{"token": t, "logprob": lp, "bytes": None} for t, lp in alternatives.items()],
+                    }
+                    for token, alternatives in generated
+                ]},
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(generated), "total_tokens": prompt_tokens + len(generated)},
+        })
+
+    async def completions(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        echo = body.get("echo", False)
+        max_tokens = body.get("max_tokens", 16)
+        prompt_tokens = sum(count_tokens(prompt) for prompt in prompts)
+
+        choices = []
+        generated_tokens = 0
+        for index, prompt in enumerate(prompts):
+            if echo:
+                # Prompt logprobs: the prompt is one token followed by the appended answer token
+                answer = prompt[-3:]
+                _, top = self._label(self._p_risky(prompt[:-3]))
+                logprobs = {"tokens": [prompt[:-3], answer], "token_logprobs": [None, top.get(answer)], "top_logprobs": [None, top], "text_offset": [0, len(prompt) - 3]}
+                generated = []
+                text = prompt
+            else:
+                label, top = self._label(self._p_risky(prompt))
+                generated = self._generated(label, top, max_tokens)
+                logprobs = {
+                    "tokens": [token for token, _ in generated],
+                    "token_logprobs": [alternatives[token] for token, alternatives in generated],
+                    "top_logprobs": [alternatives for _, alternatives in generated],
+                    "text_offset": [0] * len(generated),
+                }
+                text = _visible_text(generated)
+            generated_tokens = max(generated_tokens, len(generated))
+            choices.append({"index": index, "finish_reason": "length", "text": text, "logprobs": logprobs})
+
+        if not await self._process("completions", prompt_tokens, len(prompts), generated_tokens):
+            return self._unavailable()
+        return JSONResponse({
+            "id": f"cmpl-{self.stats.requests}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": body.get("model", self.settings.model),
+            "choices": choices,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": generated_tokens * len(prompts), "total_tokens": prompt_tokens + generated_tokens * len(prompts)},
+        })
+
+
+def add_settings_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FakeGuardianSettings()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="Base latency of every request")
+    parser.add_argument("--per-token-us", type=float, default=defaults.per_token_us, help="Added latency per prompt token")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms, help="Standard deviation of latency noise")
+    parser.add_argument("--max-num-seqs", type=int, default=defaults.max_num_seqs, help="Requests processed concurrently")
+    parser.add_argument("--risky-probability", type=float, default=defaults.risky_probability, help="P(Yes) for risky messages")
+    parser.add_argument("--safe-probability", type=float, default=defaults.safe_probability, help="P(Yes) for other messages")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Fraction of requests failed with a 503")
+    parser.add_argument("--decode-ms", type=float, default=defaults.decode_ms, help="Added latency per generated token")
+    parser.add_argument(
+        "--answer-suffix", default=",".join(defaults.answer_suffix),
+        help="Comma separated tokens generated after the label, like a confidence suffix",
+    )
+
+
+def settings_from_args(args: argparse.Namespace) -> FakeGuardianSettings:
+    return FakeGuardianSettings(
+        latency_ms=args.latency_ms,
+        per_token_us=args.per_token_us,
+        jitter_ms=args.jitter_ms,
+        max_num_seqs=args.max_num_seqs,
+        risky_probability=args.risky_probability,
+        safe_probability=args.safe_probability,
+        error_rate=args.error_rate,
+        decode_ms=args.decode_ms,
+        answer_suffix=tuple(token for token in args.answer_suffix.split(",") if token),
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    uvicorn.run(FakeGuardian(settings_from_args(args)).app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Replay a JSONL workload of shield calls against the Granite Guardian shield provider and report
+latency percentiles, throughput, Granite Guardian calls per shield call and allocations.
+
+By default a fake Granite Guardian server (benchmarks/fake_guardian.py) is started on localhost so
+no network or GPU is needed. Point --base-url at a running vLLM instance to measure a real one.
+
+Each workload line is one shield call:
+
+    {"shield_id": "input_guardian", "messages": [{"role": "user", "content": "..."}]}
+
+shield_id is optional. Calls are replayed in order, cycling through the file until --requests calls
+were made, either closed loop with --concurrency callers or open loop at --rate calls per second.
+
+    python benchmarks/load_test.py --concurrency 32 --requests 2000
+    python benchmarks/load_test.py --rate 200 --arrival poisson --set batching_enabled=true \\
+        --set chat_template=benchmarks/guardian_layout.jinja
+    python benchmarks/load_test.py --trace-allocations --requests 500
+    python benchmarks/load_test.py --replicas 3 --slow-replica-ms 200 --set hedge_percentile=95
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+import httpx
+import yaml
+from llama_stack.apis.inference import Message
+from llama_stack.apis.shields import Shield
+from pydantic import TypeAdapter
+
+from fake_guardian import add_settings_arguments
+from granite_guardian_shield import get_adapter_impl
+from granite_guardian_shield.config import GraniteGuardianShieldConfig
+from granite_guardian_shield.shield import GraniteGuardianShield
+from granite_guardian_shield.telemetry import phase_timings
+
+BENCHMARKS = Path(__file__).parent
+DEFAULT_WORKLOAD = BENCHMARKS / "workload.jsonl"
+DEFAULT_RISKS = "harm,violence,social_bias,profanity"
+
+_messages_adapter = TypeAdapter(list[Message])
+
+
+class ShieldCall:
+    def __init__(self, shield_id: str, messages: list[Message]):
+        self.shield_id = shield_id
+        self.messages = messages
+
+
+def load_workload(path: Path, default_shield_id: str) -> list[ShieldCall]:
+    calls = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            calls.append(ShieldCall(record.get("shield_id", default_shield_id), _messages_adapter.validate_python(record["messages"])))
+    if not calls:
+        raise ValueError(f"Workload {path} contains no shield calls")
+    return calls
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_guardian(args: argparse.Namespace, latency_ms: float | None = None) -> tuple[subprocess.Popen, str]:
+    """
+    Start the fake Granite Guardian server in its own process so it does not compete with the
+    provider for the event loop or show up in allocation traces.
+    """
+    port = free_port()
+    command = [
+        sys.executable, str(BENCHMARKS / "fake_guardian.py"), "--port", str(port),
+        "--latency-ms", str(args.latency_ms if latency_ms is None else latency_ms), "--per-token-us", str(args.per_token_us),
+        "--jitter-ms", str(args.jitter_ms), "--max-num-seqs", str(args.max_num_seqs),
+        "--risky-probability", str(args.risky_probability), "--safe-probability", str(args.safe_probability),
+        "--error-rate", str(args.error_rate), "--decode-ms", str(args.decode_ms),
+        "--answer-suffix", args.answer_suffix,
+    ]
+    process = subprocess.Popen(command)
+    base_url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/models").raise_for_status()
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Fake Granite Guardian server did not start")
+
+
+async def guardian_stats(base_urls: list[str], reset: bool = False) -> dict[str, Any] | None:
+    """
+    Request counters of the fake servers summed over all of them, None when benchmarking a real
+    endpoint.
+    """
+    totals: dict[str, Any] = {}
+    async with httpx.AsyncClient() as client:
+        for base_url in base_urls:
+            response = await client.request("DELETE" if reset else "GET", f"{base_url.removesuffix('/v1')}/stats")
+            if response.status_code != 200:
+                return None
+            for key, value in response.json().items():
+                if isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+async def closed_loop(shield: GraniteGuardianShield, calls: list[ShieldCall], requests: int, concurrency: int) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    violations = 0
+    next_call = 0
+
+    async def caller() -> None:
+        nonlocal next_call, violations
+        while next_call < requests:
+            call = calls[next_call % len(calls)]
+            next_call += 1
+            started = time.perf_counter()
+            response = await shield.run_shield(call.shield_id, call.messages)
+            latencies.append(time.perf_counter() - started)
+            violations += response.violation is not None
+
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return latencies, violations
+
+
+async def open_loop(shield: GraniteGuardianShield, calls: list[ShieldCall], requests: int, rate: float, arrival: str) -> tuple[list[float], int]:
+    """
+    Start calls on a schedule regardless of how fast earlier ones finish. Latency is measured from
+    the scheduled start so a stalled provider is not hidden by the load generator slowing down.
+    """
+    latencies: list[float] = []
+    violations = 0
+
+    async def call_at(call: ShieldCall, scheduled: float) -> None:
+        nonlocal violations
+        response = await shield.run_shield(call.shield_id, call.messages)
+        latencies.append(time.perf_counter() - scheduled)
+        violations += response.violation is not None
+
+    tasks = []
+    scheduled = time.perf_counter()
+    for i in range(requests):
+        scheduled += random.expovariate(rate) if arrival == "poisson" else 1 / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(call_at(calls[i % len(calls)], scheduled)))
+    await asyncio.gather(*tasks)
+    return latencies, violations
+
+
+def parse_overrides(overrides: list[str]) -> dict[str, Any]:
+    values = {}
+    for override in overrides:
+        key, _, value = override.partition("=")
+        values[key] = yaml.safe_load(value)
+    return values
+
+
+async def run(args: argparse.Namespace, base_urls: list[str]) -> None:
+    config_values: dict[str, Any] = {"model": "granite-guardian-3.2-5b", "api_key": "fake"}
+    if args.config:
+        config_values.update(yaml.safe_load(Path(args.config).read_text()) or {})
+    config_values.update(parse_overrides(args.set))
+    config_values["base_url"] = base_urls if len(base_urls) > 1 else base_urls[0]
+    config = GraniteGuardianShieldConfig.model_validate(config_values)
+
+    calls = load_workload(Path(args.workload), args.shield_id)
+    risks = [{"name": name} for name in args.risks.split(",")]
+    shield = await get_adapter_impl(config, {})
+    for shield_id in sorted({call.shield_id for call in calls}):
+        await shield.register_shield(Shield(
+            identifier=shield_id,
+            provider_id="granite_guardian_shield",
+            provider_resource_id=shield_id,
+            params={"risks": risks, "short_circuit": args.short_circuit},
+        ))
+
+    try:
+        if args.warmup:
+            await closed_loop(shield, calls, args.warmup, min(args.warmup, args.concurrency))
+        phase_timings.reset()
+        await guardian_stats(base_urls, reset=True)
+
+        if args.trace_allocations:
+            tracemalloc.start(10)
+            before = tracemalloc.take_snapshot()
+
+        started = time.perf_counter()
+        if args.rate:
+            latencies, violations = await open_loop(shield, calls, args.requests, args.rate, args.arrival)
+        else:
+            latencies, violations = await closed_loop(shield, calls, args.requests, args.concurrency)
+        elapsed = time.perf_counter() - started
+
+        if args.trace_allocations:
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        stats = await guardian_stats(base_urls)
+        cache_stats = shield.cache_stats()
+        breaker_stats = shield.breaker_stats()
+        endpoint_stats = shield.endpoint_stats()
+        adaptive_limits = shield.adaptive_limit_stats()
+    finally:
+        await shield.shutdown()
+
+    latencies.sort()
+    mode = f"open loop {args.arrival} {args.rate:g}/s" if args.rate else f"closed loop x{args.concurrency}"
+    print(f"shield calls      {len(latencies)} ({mode}, {len(risks)} risks)")
+    print(f"violations        {violations}")
+    print(f"elapsed           {elapsed:.2f}s")
+    print(f"throughput        {len(latencies) / elapsed:.1f} calls/s")
+    print(
+        f"latency ms        p50 {1000 * percentile(latencies, 0.5):.1f}  p95 {1000 * percentile(latencies, 0.95):.1f}  "
+        f"p99 {1000 * percentile(latencies, 0.99):.1f}  max {1000 * latencies[-1]:.1f}"
+    )
+    if stats is not None:
+        print(f"guardian requests {stats['requests']} ({stats['requests'] / len(latencies):.2f} per shield call)")
+        print(f"guardian prompts  {stats['sequences']} ({stats['sequences'] / len(latencies):.2f} per shield call)")
+        print(f"guardian errors   {stats['errors']}")
+
+    if cache_stats is not None:
+        print(f"verdict cache     hits {cache_stats.hits} misses {cache_stats.misses} evictions {cache_stats.evictions}")
+    if breaker_stats is not None:
+        print(f"circuit breaker   {breaker_stats.state} short circuited {breaker_stats.short_circuited}")
+    if endpoint_stats is not None:
+        print(f"hedged            {endpoint_stats.hedged} ({endpoint_stats.hedge_wins} won by the hedge)")
+        for endpoint in endpoint_stats.endpoints:
+            print(f"endpoint          {endpoint.name} requests {endpoint.requests} failures {endpoint.failures} ewma {endpoint.ewma_latency_ms or 0:.1f}ms")
+
+    for limit_stats in adaptive_limits:
+        print(
+            f"adaptive limit    {limit_stats.name} {limit_stats.algorithm} limit {limit_stats.limit} "
+            f"(+{limit_stats.increases} -{limit_stats.decreases}) baseline {limit_stats.baseline_latency_ms or 0:.1f}ms "
+            f"average {limit_stats.latency_ms or 0:.1f}ms"
+        )
+
+    for phase, by_risk in phase_timings.stats().items():
+        worst = max(by_risk.values(), key=lambda s: s.p99_ms)
+        count = sum(s.count for s in by_risk.values())
+        print(f"phase {phase:<11} n={count:<7} p50 <= {worst.p50_ms:g}ms  p99 <= {worst.p99_ms:g}ms")
+
+    if args.trace_allocations:
+        differences = after.compare_to(before, "filename")
+        allocated = sum(d.size_diff for d in differences if d.size_diff > 0)
+        print(f"allocations       peak {peak / 1024:.0f} KiB, retained {allocated / 1024:.0f} KiB, {allocated / len(latencies):.0f} B per shield call")
+        for difference in after.compare_to(before, "lineno")[:args.top_allocations]:
+            print(f"  {difference}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", default=str(DEFAULT_WORKLOAD), help="JSONL file of shield calls")
+    parser.add_argument("--shield-id", default="input_guardian", help="Shield for workload lines without a shield_id")
+    parser.add_argument("--risks", default=DEFAULT_RISKS, help="Comma separated risks registered on every shield")
+    parser.add_argument("--short-circuit", action="store_true", help="Register shields with short_circuit enabled")
+    parser.add_argument("--requests", type=int, default=1000, help="Shield calls to make")
+    parser.add_argument("--warmup", type=int, default=50, help="Shield calls made before measuring")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent callers in closed loop mode")
+    parser.add_argument("--rate", type=float, help="Open loop arrival rate in shield calls per second")
+    parser.add_argument("--arrival", choices=["fixed", "poisson"], default="poisson", help="Open loop inter-arrival times")
+    parser.add_argument("--config", help="YAML provider config, as in the safety provider config of run.yaml")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Override a provider config field")
+    parser.add_argument("--base-url", action="append", help="Benchmark this Granite Guardian endpoint instead of a local fake server, repeat for several")
+    parser.add_argument("--replicas", type=int, default=1, help="Fake servers to start and balance across")
+    parser.add_argument("--slow-replica-ms", type=float, default=0.0, help="Extra latency of the last fake server")
+    parser.add_argument("--trace-allocations", action="store_true", help="Trace allocations with tracemalloc (slows calls down)")
+    parser.add_argument("--top-allocations", type=int, default=10, help="Source lines to show with --trace-allocations")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    processes = []
+    base_urls = args.base_url or []
+    try:
+        if not base_urls:
+            for i in range(args.replicas):
+                slow = args.slow_replica_ms if i == args.replicas - 1 else 0.0
+                process, base_url = start_fake_guardian(args, args.latency_ms + slow)
+                processes.append(process)
+                base_urls.append(base_url)
+        asyncio.run(run(args, base_urls))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
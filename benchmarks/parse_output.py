@@ -0,0 +1,77 @@
+"""
+Compare the CPU cost of turning one Granite Guardian chat completion response into a verdict with
+the default path (OpenAI response models, then parse_output) and the fast_parse path (raw JSON,
+then parse_raw_output).
+
+    python benchmarks/parse_output.py --iterations 20000
+"""
+import argparse
+import json
+import math
+import timeit
+
+from openai._models import construct_type
+from openai.types.chat.chat_completion import ChatCompletion
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.helpers import parse_output, parse_raw_output
+
+# Tokens a Granite Guardian model typically puts in its top 20 alternatives besides the label
+OTHER_TOKENS = ["Y", "N", "yes", "no", "YES", "NO", "The", "I", "\n", "Based", "**", "It", "This", "A", "In", "There", "None", "Sure"]
+
+
+def response_body(top_logprobs: int) -> bytes:
+    alternatives = [("Yes", math.log(0.82)), (" No", math.log(0.15))]
+    alternatives += [(token, math.log(0.001) - i) for i, token in enumerate(OTHER_TOKENS[:top_logprobs - 2])]
+    return json.dumps({
+        "id": "chatcmpl-0",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "granite-guardian",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": "Yes", "tool_calls": []},
+            "logprobs": {"content": [
+                {
+                    "token": token,
+                    "logprob": math.log(0.82),
+                    "bytes": list(token.encode()),
+                    "top_logprobs": [{"token": t, "logprob": lp, "bytes": list(t.encode())} for t, lp in alternatives],
+                }
+                for token in ("Yes", "<|end_of_text|>")
+            ]},
+        }],
+        "usage": {"prompt_tokens": 412, "completion_tokens": 2, "total_tokens": 414},
+    }).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000, help="Responses parsed per measurement")
+    parser.add_argument("--top-logprobs", type=int, default=20, help="Alternatives per generated token")
+    args = parser.parse_args()
+
+    raw = response_body(args.top_logprobs)
+    risk = Risk(name="harm", violation_threshold=0.5)
+
+    def default_path():
+        # What the OpenAI client does with a response body, followed by parse_output
+        response = construct_type(type_=ChatCompletion, value=json.loads(raw))
+        return parse_output(response, risk)
+
+    def fast_path():
+        return parse_raw_output(json.loads(raw)).to_verdict(risk)
+
+    assert default_path() == fast_path()
+
+    results = {}
+    for name, fn in (("default", default_path), ("fast_parse", fast_path)):
+        seconds = min(timeit.repeat(fn, number=args.iterations, repeat=5))
+        results[name] = seconds / args.iterations * 1e6
+        print(f"{name:<11} {results[name]:8.1f} us per response")
+    print(f"speedup     {results['default'] / results['fast_parse']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
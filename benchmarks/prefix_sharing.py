@@ -0,0 +1,64 @@
+"""
+Estimate Granite Guardian prefill tokens saved per shield call by scoring all risks of a shield
+call in one ordered prompt-list request with vLLM automatic prefix caching, as the number of
+configured risks grows. This is an estimate from token counts of the rendered prompts, nothing is
+sent to vLLM. The ordering only applies with batching_enabled.
+
+    python benchmarks/prefix_sharing.py --chat-template path/to/guardian.jinja --max-risks 8
+    python benchmarks/prefix_sharing.py --tokenizer ibm-granite/granite-guardian-3.2-5b
+
+Without --tokenizer, tokens are approximated as 4 characters each.
+"""
+import argparse
+from pathlib import Path
+
+from llama_stack.apis.inference import UserMessage
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import SimpleRisk
+from granite_guardian_shield.prompt import (GuardianPromptRenderer,
+                                            order_for_prefix_sharing,
+                                            prefill_savings)
+
+DEFAULT_TEMPLATE = Path(__file__).parent / "guardian_layout.jinja"
+
+SAMPLE_MESSAGE = (
+    "I'm putting together the quarterly report for my team and need help summarising the attached "
+    "notes. The notes cover the migration of our billing service, three incidents we had during the "
+    "rollout, the on-call changes we made afterwards and the budget we are asking for next quarter. "
+) * 4
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat-template", default=str(DEFAULT_TEMPLATE), help="Granite Guardian Jinja chat template")
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer to render and count tokens with")
+    parser.add_argument("--max-risks", type=int, default=len(SimpleRisk), help="Largest number of risks to measure")
+    args = parser.parse_args()
+
+    if args.tokenizer:
+        renderer = GuardianPromptRenderer.from_pretrained(args.tokenizer)
+    else:
+        renderer = GuardianPromptRenderer.from_file(args.chat_template)
+
+    if renderer.tokenizer is not None:
+        def count_tokens(text: str) -> int:
+            return len(renderer.tokenizer.encode(text, add_special_tokens=False))
+    else:
+        def count_tokens(text: str) -> int:
+            return max(1, len(text) // 4)
+
+    risk_names = [risk.value for risk in SimpleRisk]
+    messages = [UserMessage(content=SAMPLE_MESSAGE)]
+
+    print("Estimated prefill per shield call, assuming every shared prefix is served from the prefix cache")
+    print(f"{'risks':>5} {'prompt tokens':>14} {'est. prefilled':>14} {'est. saved':>10} {'saved %':>8}")
+    for n in range(1, min(args.max_risks, len(risk_names)) + 1):
+        prompts = [renderer.render(Risk(name=name), messages) for name in risk_names[:n]]
+        total, prefilled = prefill_savings(order_for_prefix_sharing(prompts), count_tokens)
+        saved = total - prefilled
+        print(f"{n:>5} {total:>14} {prefilled:>14} {saved:>10} {100 * saved / total:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compare Granite Guardian scoring modes for latency and agreement. Every risk of every workload
+conversation is scored with each mode; latency percentiles are reported per mode along with how
+often its verdict agrees with the default generate mode and how far its risky confidence is from it.
+
+By default a fake Granite Guardian server is started on localhost. Point --base-url at a vLLM
+instance, with --chat-template or --tokenizer for the model, to compare modes on a real one.
+
+    python benchmarks/scoring_modes.py --concurrency 8
+    python benchmarks/scoring_modes.py --base-url http://localhost:8000/v1 --model ibm-granite/granite-guardian-3.2-5b \\
+        --tokenizer ibm-granite/granite-guardian-3.2-5b
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from fake_guardian import add_settings_arguments
+from load_test import (DEFAULT_RISKS, DEFAULT_WORKLOAD, load_workload,
+                       percentile, start_fake_guardian)
+
+from granite_guardian_shield import create_inference
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import ScoringMode
+from granite_guardian_shield.models import RiskProbability
+
+DEFAULT_TEMPLATE = Path(__file__).parent / "guardian_layout.jinja"
+
+
+async def score_all(config: GraniteGuardianShieldConfig, checks: list, concurrency: int) -> tuple[list[float], list[RiskProbability]]:
+    inference, _, _ = create_inference(config)
+    await inference.initialize()
+    latencies = [0.0] * len(checks)
+    verdicts: list[RiskProbability] = [None] * len(checks)  # type: ignore[list-item]
+    slots = asyncio.Semaphore(concurrency)
+
+    async def score(i: int, risk: Risk, messages) -> None:
+        async with slots:
+            started = time.perf_counter()
+            verdicts[i] = await inference.run(risk, messages)
+            latencies[i] = time.perf_counter() - started
+
+    try:
+        await asyncio.gather(*(score(i, risk, messages) for i, (risk, messages) in enumerate(checks)))
+    finally:
+        await inference.shutdown()
+    return latencies, verdicts
+
+
+async def run(args: argparse.Namespace, base_url: str) -> None:
+    calls = load_workload(Path(args.workload), "input_guardian")
+    risks = [Risk(name=name) for name in args.risks.split(",")]
+    checks = [(risk, call.messages) for _ in range(args.repeat) for call in calls for risk in risks]
+
+    results = {}
+    for mode in ScoringMode:
+        config = GraniteGuardianShieldConfig(
+            base_url=base_url,
+            api_key="fake",
+            model=args.model,
+            scoring_mode=mode,
+            chat_template=None if args.tokenizer else args.chat_template,
+            tokenizer=args.tokenizer,
+            max_retries=0,
+        )
+        results[mode] = await score_all(config, checks, args.concurrency)
+
+    _, reference = results[ScoringMode.generate]
+    print(f"{len(checks)} risk checks per mode, concurrency {args.concurrency}")
+    print(f"{'mode':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'agree':>7} {'mean |dp|':>10}")
+    for mode, (latencies, verdicts) in results.items():
+        ordered = sorted(latencies)
+        agree = sum(v.is_risky == r.is_risky for v, r in zip(verdicts, reference)) / len(checks)
+        deltas = [
+            abs(v.risky_confidence - r.risky_confidence)
+            for v, r in zip(verdicts, reference)
+            if v.risky_confidence is not None and r.risky_confidence is not None
+        ]
+        mean_delta = sum(deltas) / len(deltas) if deltas else float("nan")
+        print(
+            f"{mode:<16} {1000 * percentile(ordered, 0.5):>8.1f} {1000 * percentile(ordered, 0.95):>8.1f} "
+            f"{1000 * percentile(ordered, 0.99):>8.1f} {100 * agree:>6.1f}% {mean_delta:>10.4f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", default=str(DEFAULT_WORKLOAD), help="JSONL file of shield calls")
+    parser.add_argument("--risks", default=DEFAULT_RISKS, help="Comma separated risks scored for every conversation")
+    parser.add_argument("--repeat", type=int, default=3, help="Times the workload is scored per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="Risk checks in flight")
+    parser.add_argument("--model", default="granite-guardian-3.2-5b", help="Granite Guardian model name")
+    parser.add_argument("--chat-template", default=str(DEFAULT_TEMPLATE), help="Jinja chat template for prompt_logprobs")
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer whose chat template renders prompts")
+    parser.add_argument("--base-url", help="Benchmark this Granite Guardian endpoint instead of a local fake server")
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        process, base_url = start_fake_guardian(args)
+    try:
+        asyncio.run(run(args, base_url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,123 @@
 from typing import Any
 
-import httpx
-from openai import AsyncOpenAI
-
+from granite_guardian_shield.admission import (AdaptiveLimit,
+                                               AdmissionController,
+                                               LimitedInference)
+from granite_guardian_shield.balancer import BalancedInference, Endpoint
+from granite_guardian_shield.batching import BatchingVLLMInference
+from granite_guardian_shield.breaker import BreakerInference, CircuitBreaker
+from granite_guardian_shield.cache import CachingInference, VerdictCache
+from granite_guardian_shield.client import create_openai_client
 from granite_guardian_shield.config import GraniteGuardianShieldConfig
-from granite_guardian_shield.inference import GraniteGuardianVLLMInference
+from granite_guardian_shield.inference import (GraniteGuardianVLLMInference,
+                                                Inference)
+from granite_guardian_shield.layers import InferenceLayers
+from granite_guardian_shield.logprob_store import LogprobStore
+from granite_guardian_shield.prompt import (GuardianPromptRenderer,
+                                            load_renderer, load_tokenizer)
 from granite_guardian_shield.shield import GraniteGuardianShield
+from granite_guardian_shield.truncation import (TokenBudgetInference,
+                                                TokenCounter)
 
 
-async def get_adapter_impl(config: GraniteGuardianShieldConfig, _deps) -> Any:
+def create_endpoint_inference(
+    config: GraniteGuardianShieldConfig,
+    base_url: str,
+    renderer: GuardianPromptRenderer | None,
+    logprob_store: LogprobStore | None,
+    layers: InferenceLayers | None = None,
+) -> Inference:
+    """
+    Build the inference that talks to one Granite Guardian endpoint. Its adaptive concurrency
+    limit, if any, is added to `layers`.
+    """
     # Initialize OpenAI Client based on user's configuration
-    api_key = config.api_key
-    openai_client: AsyncOpenAI = AsyncOpenAI(
-        base_url=config.base_url,
-        api_key=api_key.get_secret_value() if api_key else None,
-        http_client=httpx.AsyncClient(verify=config.verify_ssl),
+    openai_client = create_openai_client(config, base_url)
+    inference: Inference = GraniteGuardianVLLMInference(
+        openai_client,
+        config.model,
+        max_retries=config.max_retries,
+        retry_backoff_seconds=config.retry_backoff_seconds,
+        retry_backoff_max_seconds=config.retry_backoff_max_seconds,
+        timeout_seconds=config.timeout_seconds,
+        warmup_connections=config.warmup_connections,
+        payload_sample_rate=config.payload_sample_rate,
+        logprob_store=logprob_store,
+        fast_parse=config.fast_parse,
+        scoring_mode=config.scoring_mode,
+        renderer=renderer,
     )
-    inference = GraniteGuardianVLLMInference(openai_client, config.model)
+    if config.batching_enabled:
+        inference = BatchingVLLMInference(
+            openai_client,
+            config.model,
+            renderer=renderer,
+            fallback=inference,
+            max_batch_size=config.batch_max_size,
+            batch_window_seconds=config.batch_window_ms / 1000,
+            logprob_store=logprob_store,
+            scoring_mode=config.scoring_mode,
+        )
+    if config.adaptive_concurrency is not None:
+        # No queue limits here, the provider and shield limits above decide what is refused
+        controller = AdmissionController(config.adaptive_initial_limit, min_share=config.priority_min_share)
+        adaptive = AdaptiveLimit.from_config(controller, config, base_url)
+        inference = LimitedInference(inference, controller, config.failure_policy, adaptive)
+        if layers is not None:
+            layers.adaptive_limits.append(adaptive)
+    return inference
+
+
+def create_inference(config: GraniteGuardianShieldConfig) -> tuple[Inference, TokenCounter, InferenceLayers]:
+    """
+    Build the Granite Guardian inference chain described by `config` along with the token counter
+    its risks are measured with and its layers that keep statistics.
+    """
+    layers = InferenceLayers()
+    logprob_store = LogprobStore(config.logprob_store_path) if config.logprob_store_path else None
+    tokenizer = load_tokenizer(config.tokenizer) if config.tokenizer else None
+    renderer = load_renderer(config, tokenizer)
+    if len(config.base_urls) == 1:
+        inference = create_endpoint_inference(config, config.base_urls[0], renderer, logprob_store, layers)
+    else:
+        inference = layers.balancer = BalancedInference(
+            [Endpoint(url, create_endpoint_inference(config, url, renderer, logprob_store, layers)) for url in config.base_urls],
+            policy=config.load_balancing,
+            ejection_failures=config.ejection_consecutive_failures,
+            ejection_seconds=config.ejection_seconds,
+            hedge_percentile=config.hedge_percentile,
+        )
+    cache = None
+    if config.cache_max_size:
+        cache = layers.cache = VerdictCache(config.cache_max_size, config.cache_ttl_seconds, config.breaker_serve_stale_seconds)
+
+    if config.breaker_failure_rate:
+        layers.breaker = CircuitBreaker.from_config(config)
+        inference = BreakerInference(
+            inference,
+            layers.breaker,
+            config.failure_policy,
+            cache if config.breaker_serve_stale_seconds else None,
+        )
+
+    # Below the cache so cache hits never wait for, or are refused, a slot
+    if config.max_concurrency:
+        layers.admission = AdmissionController.from_config(config.max_concurrency, config)
+        inference = LimitedInference(inference, layers.admission, config.failure_policy)
+
+    if cache is not None:
+        inference = CachingInference(inference, cache)
+
+    # Risks with a token budget are truncated before any of the layers above see them
+    token_counter = TokenCounter(tokenizer)
+    inference = TokenBudgetInference(inference, token_counter, renderer)
+    return inference, token_counter, layers
+
+
+async def get_adapter_impl(config: GraniteGuardianShieldConfig, _deps) -> Any:
+    inference, token_counter, layers = create_inference(config)
 
     # Initialize the Granite Guardian shields manager
-    impl = GraniteGuardianShield(inference)
+    impl = GraniteGuardianShield(inference, config, token_counter, layers)
     await impl.initialize()
     return impl
@@ -0,0 +1,443 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator
+
+from llama_stack.apis.inference import Message
+from llama_stack.log import get_logger
+from pydantic import BaseModel, Field
+
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import (AdaptiveConcurrency,
+                                               FailurePolicy, Priority)
+from granite_guardian_shield.helpers import failure_verdict
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.telemetry import (Phase, phase_timings,
+                                               record_concurrency_limit)
+
+logger = get_logger(name=__name__, category="safety")
+
+# Weight of the newest latency in the moving average an adaptive limit follows
+LATENCY_EWMA_WEIGHT = 0.2
+# Calls after which the baseline latency is replaced by the lowest latency among them, so the
+# baseline follows lasting changes such as longer prompts instead of sticking to an old minimum
+BASELINE_WINDOW = 500
+# Fraction of the way a gradient limit moves towards its target on each call
+GRADIENT_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request could not get a concurrency slot.
+    """
+
+
+class PriorityStats(BaseModel):
+    """
+    Queueing counters of one priority class.
+    """
+
+    queue_depth: int = Field(default=0, description="Requests of this class currently waiting for a slot")
+    admitted: int = Field(default=0, description="Requests of this class that got a slot")
+    queued: int = Field(default=0, description="Admitted requests of this class that had to wait for a slot")
+    expired: int = Field(default=0, description="Requests of this class refused because their deadline passed before they got a slot")
+    total_wait_seconds: float = Field(default=0.0, description="Total time admitted requests of this class spent waiting for a slot")
+    max_wait_seconds: float = Field(default=0.0, description="Longest time an admitted request of this class waited for a slot")
+
+
+class AdmissionStats(BaseModel):
+    """
+    Counters describing concurrency limiting and queueing.
+    """
+
+    limit: int = Field(description="Maximum number of concurrent requests")
+    in_flight: int = Field(default=0, description="Requests currently holding a slot")
+    queue_depth: int = Field(default=0, description="Requests currently waiting for a slot")
+    admitted: int = Field(default=0, description="Requests that got a slot")
+    rejected: int = Field(default=0, description="Requests refused because the queue was full or the wait deadline passed")
+    queued: int = Field(default=0, description="Admitted requests that had to wait for a slot")
+    total_wait_seconds: float = Field(default=0.0, description="Total time admitted requests spent waiting for a slot")
+    max_wait_seconds: float = Field(default=0.0, description="Longest time an admitted request waited for a slot")
+    priorities: dict[Priority, PriorityStats] = Field(default_factory=dict, description="Queueing counters per priority class")
+
+
+# Time the Granite Guardian call in progress waited at every limit it passed, so nested limits
+# record the queue phase once per call
+_queue_wait: ContextVar[list[float] | None] = ContextVar("granite_guardian_queue_wait", default=None)
+
+# Scheduling class and deadline of the shield call in progress, see call_scheduling
+_priority: ContextVar[Priority] = ContextVar("granite_guardian_priority", default=Priority.normal)
+_deadline: ContextVar[float | None] = ContextVar("granite_guardian_deadline", default=None)
+
+
+@contextmanager
+def call_scheduling(priority: Priority, deadline: float | None = None) -> Iterator[None]:
+    """
+    Schedule the Granite Guardian calls made inside, including from tasks started inside, with
+    `priority` and a `deadline` on the time.monotonic clock by which they must get a slot.
+    """
+    priority_token = _priority.set(priority)
+    deadline_token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(deadline_token)
+        _priority.reset(priority_token)
+
+
+class AdmissionController:
+    """
+    Limits concurrent requests with a bounded wait queue and a maximum queue wait.
+
+    Waiting requests are served by priority class, each class earliest deadline first and then in
+    arrival order. While a class below high has requests waiting it gets at least `min_share` of
+    freed slots, so it is never starved. A request whose deadline passes before it gets a slot is
+    refused.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue_size: int | None = None,
+        max_queue_wait_seconds: float | None = None,
+        min_share: float = 0.0,
+    ):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be greater than 0")
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+        # A class skipped this many times in a row while waiting gets the next slot, so it gets at
+        # least one slot in every max_skips + 1, rounded down to stay at or above min_share
+        self.max_skips = max(0, math.floor(1 / min_share) - 1) if min_share else math.inf
+        self._in_flight = 0
+        self._waiting = 0
+        self._queues: dict[Priority, list[tuple[float, int, asyncio.Future[None]]]] = {p: [] for p in Priority}
+        self._skips: dict[Priority, int] = {p: 0 for p in Priority}
+        self._arrivals = itertools.count()
+        self._stats = AdmissionStats(limit=max_concurrency)
+        self._priority_stats = {p: PriorityStats() for p in Priority}
+
+    @classmethod
+    def from_config(cls, max_concurrency: int, config: GraniteGuardianShieldConfig) -> "AdmissionController":
+        return cls(
+            max_concurrency,
+            max_queue_size=config.max_queue_size,
+            max_queue_wait_seconds=config.max_queue_wait_ms / 1000 if config.max_queue_wait_ms else None,
+            min_share=config.priority_min_share,
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def set_limit(self, max_concurrency: int) -> None:
+        """
+        Change the concurrency limit. A higher limit admits waiting requests right away, a lower one
+        takes effect as requests holding a slot finish.
+        """
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be greater than 0")
+        self.max_concurrency = max_concurrency
+        while self._in_flight < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self) -> None:
+        priority = _priority.get()
+        deadline = _deadline.get()
+        stats = self._priority_stats[priority]
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            self._stats.rejected += 1
+            stats.expired += 1
+            raise AdmissionRejected("Deadline passed before requesting a slot")
+
+        if self._in_flight < self.max_concurrency and not self._waiting:
+            self._in_flight += 1
+            self._stats.admitted += 1
+            stats.admitted += 1
+            return
+
+        if self.max_queue_size is not None and self._waiting >= self.max_queue_size:
+            self._stats.rejected += 1
+            raise AdmissionRejected(f"Admission queue is full ({self.max_queue_size} waiting)")
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[priority], (deadline if deadline is not None else math.inf, next(self._arrivals), waiter))
+        self._waiting += 1
+        stats.queue_depth += 1
+        timeout = self.max_queue_wait_seconds
+        if deadline is not None:
+            timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed to us just as we gave up, pass it on
+                self.release()
+            else:
+                # Left in its heap, skipped once it reaches the top
+                waiter.cancel()
+                self._waiting -= 1
+                stats.queue_depth -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self._stats.rejected += 1
+                if deadline is not None and time.monotonic() >= deadline:
+                    stats.expired += 1
+                    raise AdmissionRejected("Deadline passed while waiting for a slot") from e
+                raise AdmissionRejected(f"Waited more than {self.max_queue_wait_seconds}s for a slot") from e
+            raise
+
+        waited = time.monotonic() - now
+        for counters in (self._stats, stats):
+            counters.admitted += 1
+            counters.queued += 1
+            counters.total_wait_seconds += waited
+            counters.max_wait_seconds = max(counters.max_wait_seconds, waited)
+
+    def release(self) -> None:
+        if self._in_flight > self.max_concurrency:
+            # The limit was lowered, retire the slot
+            self._in_flight -= 1
+            return
+        # Hand the slot straight to the next waiter so newcomers can't jump the queue
+        waiter = self._next_waiter()
+        if waiter is None:
+            self._in_flight -= 1
+        else:
+            waiter.set_result(None)
+
+    def _next_waiter(self) -> asyncio.Future[None] | None:
+        waiting = [p for p in Priority if self._priority_stats[p].queue_depth]
+        if not waiting:
+            return None
+
+        chosen = waiting[0]
+        for priority in reversed(waiting[1:]):
+            if self._skips[priority] >= self.max_skips:
+                chosen = priority
+                break
+        for priority in waiting:
+            self._skips[priority] = 0 if priority == chosen else self._skips[priority] + 1
+
+        queue = self._queues[chosen]
+        while True:
+            _, _, waiter = heapq.heappop(queue)
+            if not waiter.done():
+                self._waiting -= 1
+                self._priority_stats[chosen].queue_depth -= 1
+                return waiter
+
+    def stats(self) -> AdmissionStats:
+        return self._stats.model_copy(update={
+            "limit": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "queue_depth": self._waiting,
+            "priorities": {p: stats.model_copy() for p, stats in self._priority_stats.items()},
+        })
+
+
+class AdaptiveLimitStats(BaseModel):
+    """
+    State of an adaptive concurrency limit.
+    """
+
+    name: str = Field(description="What the limit applies to, usually an endpoint base URL")
+    algorithm: AdaptiveConcurrency = Field(description="How the limit follows latency")
+    limit: int = Field(description="Current concurrency limit")
+    baseline_latency_ms: float | None = Field(default=None, description="Lowest recent call latency, taken as the latency without queueing, in milliseconds")
+    latency_ms: float | None = Field(default=None, description="Moving average of call latency in milliseconds")
+    samples: int = Field(default=0, description="Calls the limit was adjusted after")
+    failures: int = Field(default=0, description="Calls that raised an error")
+    increases: int = Field(default=0, description="Times the limit was raised")
+    decreases: int = Field(default=0, description="Times the limit was lowered")
+
+
+class AdaptiveLimit:
+    """
+    Adjusts the limit of an AdmissionController from the latency of the calls it admits, to keep
+    enough calls in flight to use the endpoint fully without queueing inside it.
+
+    The baseline is the lowest recent latency. With `AdaptiveConcurrency.aimd` the limit grows by
+    about one call per round trip while it is in use and is multiplied by `backoff_ratio` when a call
+    takes more than `tolerance` times the baseline. With `AdaptiveConcurrency.gradient` it moves
+    towards its current value scaled by `tolerance` times the baseline over the average latency,
+    between 0.5 and 1, plus its square root as headroom to probe for more. With either, a failed
+    call multiplies the limit by `backoff_ratio`, and a limit that isn't in use isn't raised.
+    """
+
+    def __init__(
+        self,
+        controller: AdmissionController,
+        algorithm: AdaptiveConcurrency,
+        name: str = "",
+        min_limit: int = 1,
+        max_limit: int = 256,
+        tolerance: float = 2.0,
+        backoff_ratio: float = 0.9,
+    ):
+        if not 0 < min_limit <= controller.max_concurrency <= max_limit:
+            raise ValueError("The controller's limit must be between min_limit and max_limit")
+        self.controller = controller
+        self.algorithm = algorithm
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self._limit = float(controller.max_concurrency)
+        self._baseline: float | None = None
+        self._latency: float | None = None
+        self._window_min = math.inf
+        self._window_calls = 0
+        self._stats = AdaptiveLimitStats(name=name, algorithm=algorithm, limit=controller.max_concurrency)
+
+    @classmethod
+    def from_config(cls, controller: AdmissionController, config: GraniteGuardianShieldConfig, name: str = "") -> "AdaptiveLimit":
+        return cls(
+            controller,
+            config.adaptive_concurrency,
+            name=name,
+            min_limit=config.adaptive_min_limit,
+            max_limit=config.adaptive_max_limit,
+            tolerance=config.adaptive_latency_tolerance,
+            backoff_ratio=config.adaptive_backoff_ratio,
+        )
+
+    def observe(self, seconds: float | None, in_flight: int) -> None:
+        """
+        Adjust the limit after a call that took `seconds`, or failed if None, and was started with
+        `in_flight` calls holding a slot, itself included.
+        """
+        self._stats.samples += 1
+        limit = self._limit
+        if seconds is None:
+            self._stats.failures += 1
+            limit *= self.backoff_ratio
+        else:
+            self._measure(seconds)
+            if self.algorithm == AdaptiveConcurrency.aimd:
+                if seconds > self.tolerance * self._baseline:
+                    limit *= self.backoff_ratio
+                elif in_flight * 2 >= limit:
+                    limit += 1 / limit
+            else:
+                gradient = max(0.5, min(1.0, self.tolerance * self._baseline / self._latency))
+                if gradient < 1 or in_flight * 2 >= limit:
+                    limit += GRADIENT_SMOOTHING * (limit * gradient + math.sqrt(limit) - limit)
+        self._limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+
+        previous = self.controller.max_concurrency
+        current = int(self._limit)
+        if current != previous:
+            if current > previous:
+                self._stats.increases += 1
+            else:
+                self._stats.decreases += 1
+            self.controller.set_limit(current)
+        if self._baseline is not None:
+            record_concurrency_limit(self.name, current, self._baseline * 1000, self._latency * 1000)
+
+    def _measure(self, seconds: float) -> None:
+        if self._latency is None:
+            self._latency = seconds
+        else:
+            self._latency += LATENCY_EWMA_WEIGHT * (seconds - self._latency)
+        self._window_min = min(self._window_min, seconds)
+        self._window_calls += 1
+        if self._window_calls >= BASELINE_WINDOW:
+            self._baseline = self._window_min
+            self._window_min = math.inf
+            self._window_calls = 0
+        else:
+            self._baseline = min(self._baseline, seconds) if self._baseline is not None else seconds
+
+    def stats(self) -> AdaptiveLimitStats:
+        return self._stats.model_copy(update={
+            "limit": self.controller.max_concurrency,
+            "baseline_latency_ms": self._baseline * 1000 if self._baseline is not None else None,
+            "latency_ms": self._latency * 1000 if self._latency is not None else None,
+        })
+
+
+class LimitedInference(Inference):
+    """
+    Inference wrapper that enforces an AdmissionController around Inference.run. Requests that
+    are refused a slot get a verdict according to the risk's failure policy, or `failure_policy`
+    when the risk has none, instead of an error.
+
+    With an `adaptive` limit, the latency of every call is reported to it to adjust the
+    controller's limit.
+    """
+
+    def __init__(
+        self,
+        inference: Inference,
+        controller: AdmissionController,
+        failure_policy: FailurePolicy,
+        adaptive: AdaptiveLimit | None = None,
+    ):
+        self.inference = inference
+        self.controller = controller
+        self.failure_policy = failure_policy
+        self.adaptive = adaptive
+
+    async def initialize(self) -> None:
+        await self.inference.initialize()
+
+    async def shutdown(self) -> None:
+        await self.inference.shutdown()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        waits = _queue_wait.get()
+        token = None
+        if waits is None:
+            # The outermost limit of the call records the time waited at all of them
+            waits = [0.0]
+            token = _queue_wait.set(waits)
+        started = time.perf_counter()
+        try:
+            async with self.controller.slot():
+                waits[0] += time.perf_counter() - started
+                if self.adaptive is None:
+                    return await self.inference.run(risk, messages)
+                return await self._run_measured(risk, messages)
+        except AdmissionRejected as e:
+            waits[0] += time.perf_counter() - started
+            policy = risk.failure_policy or self.failure_policy
+            logger.warning(f"Admission refused for {risk.name}, failing {policy}: {e}")
+            return failure_verdict(risk, policy, str(e))
+        finally:
+            if token is not None:
+                _queue_wait.reset(token)
+                phase_timings.record(Phase.queue, risk.name, waits[0])
+
+    async def _run_measured(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        in_flight = self.controller.in_flight
+        started = time.perf_counter()
+        try:
+            verdict = await self.inference.run(risk, messages)
+        except asyncio.CancelledError:
+            raise  # Cancelled calls, like lost hedges, say nothing about the endpoint
+        except Exception:
+            self.adaptive.observe(None, in_flight)
+            raise
+        self.adaptive.observe(time.perf_counter() - started, in_flight)
+        return verdict
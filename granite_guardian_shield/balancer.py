@@ -0,0 +1,212 @@
+import asyncio
+import math
+import random
+import time
+from collections import deque
+
+from llama_stack.apis.inference import Message
+from llama_stack.log import get_logger
+from pydantic import BaseModel, Field
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import LoadBalancing
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+
+logger = get_logger(name=__name__, category="safety")
+
+# Weight of the newest latency in an endpoint's moving average
+EWMA_WEIGHT = 0.2
+# Recent call latencies the hedge delay is computed from
+HEDGE_WINDOW = 1000
+# Calls observed before hedging starts, and between hedge delay updates
+HEDGE_MIN_SAMPLES = 50
+HEDGE_REFRESH_SAMPLES = 50
+
+
+class EndpointStats(BaseModel):
+    """
+    Counters describing the calls sent to one Granite Guardian endpoint.
+    """
+
+    name: str = Field(description="Endpoint base URL")
+    outstanding: int = Field(default=0, description="Calls currently in flight")
+    requests: int = Field(default=0, description="Calls sent, including hedges")
+    failures: int = Field(default=0, description="Calls that raised an error")
+    ejections: int = Field(default=0, description="Times the endpoint was ejected after consecutive failures")
+    ejected: bool = Field(default=False, description="Whether the endpoint is currently ejected")
+    ewma_latency_ms: float | None = Field(default=None, description="Moving average of successful call latency in milliseconds")
+
+
+class BalancerStats(BaseModel):
+    """
+    Counters describing load balancing and hedging across Granite Guardian endpoints.
+    """
+
+    endpoints: list[EndpointStats] = Field(description="Per endpoint counters")
+    hedge_delay_ms: float | None = Field(default=None, description="Current wait before a call is hedged in milliseconds")
+    hedged: int = Field(default=0, description="Calls that were sent to a second endpoint")
+    hedge_wins: int = Field(default=0, description="Hedged calls answered first by the second endpoint")
+
+
+class Endpoint:
+    """
+    One Granite Guardian endpoint and the state the balancer keeps about it.
+    """
+
+    def __init__(self, name: str, inference: Inference):
+        self.name = name
+        self.inference = inference
+        self.outstanding = 0
+        self.ewma_seconds: float | None = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self._stats = EndpointStats(name=name)
+
+    def stats(self) -> EndpointStats:
+        return self._stats.model_copy(update={
+            "outstanding": self.outstanding,
+            "ejected": self.ejected_until > time.monotonic(),
+            "ewma_latency_ms": self.ewma_seconds * 1000 if self.ewma_seconds is not None else None,
+        })
+
+
+class BalancedInference(Inference):
+    """
+    Inference that spreads calls over several Granite Guardian endpoints serving the same model.
+
+    Each call goes to the endpoint with the fewest calls in flight, or with `LoadBalancing.ewma`
+    to the one with the lowest moving average latency multiplied by its calls in flight plus one.
+    An endpoint whose calls failed `ejection_failures` times in a row gets no calls for
+    `ejection_seconds`; a single failure after it returns ejects it again. When every endpoint
+    is ejected calls are spread over all of them rather than refused.
+
+    With `hedge_percentile`, a call that hasn't been answered within that percentile of recent
+    call latencies is also sent to a second endpoint. The first answer wins and the other call
+    is cancelled.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        policy: LoadBalancing = LoadBalancing.least_outstanding,
+        ejection_failures: int = 5,
+        ejection_seconds: float = 30.0,
+        hedge_percentile: float | None = None,
+    ):
+        if not endpoints:
+            raise ValueError("BalancedInference requires at least one endpoint")
+        self.endpoints = endpoints
+        self.policy = policy
+        self.ejection_failures = ejection_failures
+        self.ejection_seconds = ejection_seconds
+        self.hedge_percentile = hedge_percentile
+        self._latencies: deque[float] = deque(maxlen=HEDGE_WINDOW)
+        self._since_refresh = 0
+        self._hedge_delay: float | None = None
+        self._hedged = 0
+        self._hedge_wins = 0
+
+    async def initialize(self) -> None:
+        await asyncio.gather(*(endpoint.inference.initialize() for endpoint in self.endpoints))
+
+    async def shutdown(self) -> None:
+        await asyncio.gather(*(endpoint.inference.shutdown() for endpoint in self.endpoints))
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        primary = self._pick()
+        if self._hedge_delay is None or len(self.endpoints) < 2:
+            return await self._call(primary, risk, messages)
+
+        first = asyncio.ensure_future(self._call(primary, risk, messages))
+        second: asyncio.Future[RiskProbability] | None = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self._hedge_delay)
+            hedge = None if done else self._pick(exclude=primary)
+            if hedge is None:
+                return await first
+
+            self._hedged += 1
+            second = asyncio.ensure_future(self._call(hedge, risk, messages))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._hedge_wins += 1
+                        return task.result()
+            # Both calls failed, report the first call's error
+            return first.result()
+        finally:
+            first.cancel()
+            if second is not None:
+                second.cancel()
+
+    def _pick(self, exclude: Endpoint | None = None) -> Endpoint | None:
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e is not exclude and e.ejected_until <= now]
+        if not candidates:
+            if exclude is not None:
+                return None  # No healthy endpoint to hedge to
+            candidates = list(self.endpoints)
+
+        # Shuffle so ties don't always favour the first endpoint
+        random.shuffle(candidates)
+        if self.policy == LoadBalancing.ewma:
+            return min(candidates, key=lambda e: (e.ewma_seconds or 0.0) * (e.outstanding + 1))
+        return min(candidates, key=lambda e: e.outstanding)
+
+    async def _call(self, endpoint: Endpoint, risk: Risk, messages: list[Message]) -> RiskProbability:
+        endpoint.outstanding += 1
+        endpoint._stats.requests += 1
+        started = time.perf_counter()
+        try:
+            verdict = await endpoint.inference.run(risk, messages)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._failed(endpoint)
+            raise
+        else:
+            # A verdict decided without the endpoint, like a deadline passing in its queue, says nothing about its latency
+            if verdict.degraded_reason is None:
+                self._succeeded(endpoint, time.perf_counter() - started)
+            return verdict
+        finally:
+            endpoint.outstanding -= 1
+
+    def _succeeded(self, endpoint: Endpoint, seconds: float) -> None:
+        endpoint.consecutive_failures = 0
+        if endpoint.ewma_seconds is None:
+            endpoint.ewma_seconds = seconds
+        else:
+            endpoint.ewma_seconds += EWMA_WEIGHT * (seconds - endpoint.ewma_seconds)
+
+        if self.hedge_percentile is None:
+            return
+        self._latencies.append(seconds)
+        self._since_refresh += 1
+        if len(self._latencies) >= HEDGE_MIN_SAMPLES and self._since_refresh >= HEDGE_REFRESH_SAMPLES:
+            self._since_refresh = 0
+            ordered = sorted(self._latencies)
+            self._hedge_delay = ordered[min(len(ordered) - 1, math.ceil(self.hedge_percentile / 100 * len(ordered)) - 1)]
+
+    def _failed(self, endpoint: Endpoint) -> None:
+        endpoint._stats.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.ejection_failures:
+            endpoint.ejected_until = time.monotonic() + self.ejection_seconds
+            endpoint._stats.ejections += 1
+            logger.warning(
+                f"Ejecting Granite Guardian endpoint {endpoint.name} for {self.ejection_seconds}s "
+                f"after {endpoint.consecutive_failures} consecutive failures"
+            )
+
+    def stats(self) -> BalancerStats:
+        return BalancerStats(
+            endpoints=[endpoint.stats() for endpoint in self.endpoints],
+            hedge_delay_ms=self._hedge_delay * 1000 if self._hedge_delay is not None else None,
+            hedged=self._hedged,
+            hedge_wins=self._hedge_wins,
+        )
@@ -0,0 +1,204 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from llama_stack.apis.inference import Message
+from llama_stack.log import get_logger
+from openai import (NOT_GIVEN, AsyncOpenAI, BadRequestError, NotFoundError,
+                    UnprocessableEntityError)
+from openai.types.completion import Completion
+from openai.types.completion_choice import CompletionChoice
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import ScoringMode
+from granite_guardian_shield.helpers import (PROMPT_ANSWER,
+                                             get_completion_label_log_masses,
+                                             get_prompt_label_log_masses,
+                                             parse_completion_output,
+                                             parse_prompt_logprobs_output)
+from granite_guardian_shield.inference import Inference, request_key
+from granite_guardian_shield.logprob_store import LogprobStore
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.prompt import (GuardianPromptRenderer,
+                                            order_for_prefix_sharing)
+from granite_guardian_shield.telemetry import Phase, phase_timings
+
+logger = get_logger(name=__name__, category="safety")
+
+
+@dataclass
+class _PendingCheck:
+    risk: Risk
+    messages: list[Message]
+    prompt: str
+    future: asyncio.Future[RiskProbability]
+
+
+class BatchingVLLMInference(Inference):
+    """
+    Inference that gathers concurrent risk checks for up to `batch_window_seconds` or
+    `max_batch_size` checks and sends them as one /v1/completions request with a list of
+    pre-rendered Granite Guardian prompts.
+
+    Every risk of a shield call reaches `run` in the same event loop iteration, so a shield call is
+    scored in a single request. Prompts are ordered so the checks of one conversation are adjacent
+    and vLLM prefills the shared conversation prefix once for all risks (automatic prefix caching).
+
+    Checks are sent through `fallback` when the endpoint doesn't support batched completions.
+    """
+
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        model: str,
+        renderer: GuardianPromptRenderer,
+        fallback: Inference,
+        max_batch_size: int = 32,
+        batch_window_seconds: float = 0.005,
+        logprob_store: LogprobStore | None = None,
+        scoring_mode: ScoringMode = ScoringMode.generate,
+    ):
+        self.openai_client = openai_client
+        self.model = model
+        self.renderer = renderer
+        self.fallback = fallback
+        self.max_batch_size = max_batch_size
+        self.batch_window_seconds = batch_window_seconds
+        self.logprob_store = logprob_store
+        self.scoring_mode = scoring_mode
+        self.batching_supported = True
+        self._pending: list[_PendingCheck] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._batches: set[asyncio.Task] = set()
+
+    async def initialize(self) -> None:
+        await self.fallback.initialize()
+
+    async def shutdown(self) -> None:
+        # Send whatever is pending and let in-flight batches finish before closing the client
+        self._flush()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        await self.fallback.shutdown()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        if not self.batching_supported:
+            return await self.fallback.run(risk, messages)
+
+        loop = asyncio.get_running_loop()
+        check = _PendingCheck(risk, messages, self.renderer.render(risk, messages), loop.create_future())
+        self._pending.append(check)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window_seconds, self._flush)
+
+        verdict = await check.future
+        verdict.request_key = request_key(risk, messages)
+        return verdict
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._send(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _send(self, batch: list[_PendingCheck]) -> None:
+        # Skip checks whose callers stopped waiting before the batch was sent
+        batch = [check for check in batch if not check.future.done()]
+        if not batch:
+            return
+
+        # Identical prompts only need to be scored once
+        prompts = order_for_prefix_sharing(list(dict.fromkeys(check.prompt for check in batch)))
+        started = time.perf_counter()
+        try:
+            if self.scoring_mode == ScoringMode.prompt_logprobs:
+                response: Completion = await self.openai_client.completions.create(
+                    model=self.model,
+                    prompt=[prompt + PROMPT_ANSWER for prompt in prompts],
+                    temperature=0.0,
+                    echo=True,
+                    logprobs=20,
+                    max_tokens=0,
+                )
+            else:
+                response = await self.openai_client.completions.create(
+                    model=self.model,
+                    prompt=prompts,
+                    temperature=0.0,
+                    logprobs=20,
+                    max_tokens=1 if self.scoring_mode == ScoringMode.label_token else NOT_GIVEN,
+                )
+        except NotFoundError:
+            logger.warning("Endpoint does not support batched completions, falling back to per-request inference")
+            self.batching_supported = False
+            await self._send_fallback(batch)
+            return
+        except (BadRequestError, UnprocessableEntityError) as e:
+            logger.warning(f"Batched completions request rejected, retrying checks individually: {e}")
+            await self._send_fallback(batch)
+            return
+        except Exception as e:
+            for check in batch:
+                if not check.future.done():
+                    check.future.set_exception(e)
+            return
+
+        phase_timings.record(Phase.http, "batch", time.perf_counter() - started)
+        logger.debug(f"Scored {len(batch)} checks with {len(prompts)} prompts in one batch")
+        choices = {prompt: choice for prompt, choice in zip(prompts, sorted(response.choices, key=lambda c: c.index))}
+        for check in batch:
+            if check.future.done():
+                continue
+            choice = choices.get(check.prompt)
+            if choice is None:
+                check.future.set_exception(RuntimeError("Batched completions response is missing a choice"))
+            elif self.scoring_mode == ScoringMode.prompt_logprobs:
+                try:
+                    with phase_timings.time(Phase.parse, check.risk.name):
+                        verdict = parse_prompt_logprobs_output(choice, check.risk)
+                except ValueError as e:
+                    check.future.set_exception(e)
+                else:
+                    if self.logprob_store is not None:
+                        self._store_logprobs(check, choice)
+                    check.future.set_result(verdict)
+            else:
+                with phase_timings.time(Phase.parse, check.risk.name):
+                    verdict = parse_completion_output(choice, check.risk)
+                if self.logprob_store is not None:
+                    self._store_logprobs(check, choice)
+                check.future.set_result(verdict)
+
+    def _store_logprobs(self, check: _PendingCheck, choice: CompletionChoice) -> None:
+        if self.scoring_mode == ScoringMode.prompt_logprobs:
+            label_log_masses = get_prompt_label_log_masses
+        else:
+            label_log_masses = get_completion_label_log_masses
+        try:
+            log_masses = label_log_masses(choice.logprobs)
+        except ValueError:
+            return  # Nothing to store for a choice without logprobs
+        self.logprob_store.append(request_key(check.risk, check.messages), check.risk.name, *log_masses)
+
+    async def _send_fallback(self, batch: list[_PendingCheck]) -> None:
+        results = await asyncio.gather(
+            *(self.fallback.run(check.risk, check.messages) for check in batch),
+            return_exceptions=True,
+        )
+        for check, result in zip(batch, results):
+            if check.future.done():
+                continue
+            if isinstance(result, BaseException):
+                check.future.set_exception(result)
+            else:
+                check.future.set_result(result)
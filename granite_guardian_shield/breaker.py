@@ -0,0 +1,216 @@
+import asyncio
+import time
+from collections import deque
+
+from llama_stack.apis.inference import Message
+from llama_stack.log import get_logger
+from opentelemetry import metrics
+from pydantic import BaseModel, Field
+
+from granite_guardian_shield.cache import VerdictCache
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import CircuitState, FailurePolicy
+from granite_guardian_shield.helpers import failure_verdict
+from granite_guardian_shield.inference import Inference, request_key
+from granite_guardian_shield.models import RiskProbability
+
+logger = get_logger(name=__name__, category="safety")
+
+_meter = metrics.get_meter("granite_guardian_shield")
+_transitions = _meter.create_counter(
+    name="granite_guardian.breaker.transitions",
+    description="Circuit breaker state changes, by the state entered",
+)
+_short_circuited = _meter.create_counter(
+    name="granite_guardian.breaker.short_circuited",
+    description="Calls answered without Granite Guardian because the circuit breaker was not closed",
+)
+
+
+class BreakerStats(BaseModel):
+    """
+    Counters describing the circuit breaker in front of Granite Guardian.
+    """
+
+    state: CircuitState = Field(description="Current breaker state")
+    failure_rate: float = Field(default=0.0, description="Fraction of failed or slow calls in the current window")
+    window_calls: int = Field(default=0, description="Calls in the current window")
+    opened: int = Field(default=0, description="Times the breaker opened")
+    short_circuited: int = Field(default=0, description="Calls answered without Granite Guardian while the breaker was not closed")
+    stale_served: int = Field(default=0, description="Short circuited calls answered from a stale cached verdict")
+    probes: int = Field(default=0, description="Calls let through while half open")
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of the last `window_size` calls and opens once at least `min_calls` were
+    made and `failure_rate` of them failed or took longer than `slow_call_seconds`. After
+    `open_seconds` the breaker lets up to `half_open_probes` probe calls through; it closes once
+    that many succeeded and opens again on the first probe that fails.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float,
+        window_size: int = 20,
+        min_calls: int = 10,
+        slow_call_seconds: float | None = None,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 3,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CircuitState.closed
+        self._outcomes: deque[bool] = deque(maxlen=window_size)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._stats = BreakerStats(state=self.state)
+
+    @classmethod
+    def from_config(cls, config: GraniteGuardianShieldConfig) -> "CircuitBreaker":
+        return cls(
+            config.breaker_failure_rate,
+            window_size=config.breaker_window_size,
+            min_calls=config.breaker_min_calls,
+            slow_call_seconds=config.breaker_slow_call_ms / 1000 if config.breaker_slow_call_ms else None,
+            open_seconds=config.breaker_open_seconds,
+            half_open_probes=config.breaker_half_open_probes,
+        )
+
+    def acquire(self) -> CircuitState | None:
+        """
+        Ask to make a call. Returns the state the call was admitted in, to be passed back to
+        `record` or `release`, or None when the call must not be made.
+        """
+        if self.state == CircuitState.open:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return None
+            self._transition(CircuitState.half_open)
+
+        if self.state == CircuitState.half_open:
+            if self._probes_in_flight + self._probe_successes >= self.half_open_probes:
+                return None
+            self._probes_in_flight += 1
+            self._stats.probes += 1
+        return self.state
+
+    def release(self, admitted: CircuitState) -> None:
+        """
+        Give back a call that ended without an outcome, such as a cancelled one.
+        """
+        if admitted == CircuitState.half_open and self.state == CircuitState.half_open:
+            self._probes_in_flight -= 1
+
+    def record(self, admitted: CircuitState, seconds: float | None) -> None:
+        """
+        Record the outcome of a call: how long it took, or None when it failed.
+        """
+        failed = seconds is None or (self.slow_call_seconds is not None and seconds > self.slow_call_seconds)
+        if admitted != self.state:
+            # The breaker moved on while the call was in flight, its outcome is outdated
+            return
+
+        if self.state == CircuitState.half_open:
+            self._probes_in_flight -= 1
+            if failed:
+                self._transition(CircuitState.open)
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._transition(CircuitState.closed)
+            return
+
+        if len(self._outcomes) == self._outcomes.maxlen:
+            self._failures -= self._outcomes[0]
+        self._outcomes.append(failed)
+        self._failures += failed
+        if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.failure_rate:
+            self._transition(CircuitState.open)
+
+    def _transition(self, state: CircuitState) -> None:
+        logger.warning(f"Granite Guardian circuit breaker {self.state} -> {state}")
+        self.state = state
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == CircuitState.open:
+            self._opened_at = time.monotonic()
+            self._stats.opened += 1
+        elif state == CircuitState.closed:
+            self._outcomes.clear()
+            self._failures = 0
+        _transitions.add(1, {"state": str(state)})
+
+    def short_circuited(self, stale: bool) -> None:
+        self._stats.short_circuited += 1
+        self._stats.stale_served += stale
+        _short_circuited.add(1, {"state": str(self.state), "stale": stale})
+
+    def stats(self) -> BreakerStats:
+        return self._stats.model_copy(update={
+            "state": self.state,
+            "failure_rate": self._failures / len(self._outcomes) if self._outcomes else 0.0,
+            "window_calls": len(self._outcomes),
+        })
+
+
+class BreakerInference(Inference):
+    """
+    Inference wrapper that stops calling Granite Guardian while a CircuitBreaker is open. Calls
+    made meanwhile are answered from `cache` with a verdict up to its stale window past its TTL,
+    or else with the risk's failure policy, `failure_policy` when the risk has none.
+    """
+
+    def __init__(
+        self,
+        inference: Inference,
+        breaker: CircuitBreaker,
+        failure_policy: FailurePolicy,
+        cache: VerdictCache | None = None,
+    ):
+        self.inference = inference
+        self.breaker = breaker
+        self.failure_policy = failure_policy
+        self.cache = cache
+
+    async def initialize(self) -> None:
+        await self.inference.initialize()
+
+    async def shutdown(self) -> None:
+        await self.inference.shutdown()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        admitted = self.breaker.acquire()
+        if admitted is None:
+            return self._short_circuit(risk, messages)
+
+        started = time.perf_counter()
+        try:
+            verdict = await self.inference.run(risk, messages)
+        except asyncio.CancelledError:
+            self.breaker.release(admitted)
+            raise
+        except Exception:
+            self.breaker.record(admitted, None)
+            raise
+        if verdict.degraded_reason:
+            # A layer below answered without reaching Granite Guardian, e.g. its admission limit was full
+            self.breaker.release(admitted)
+        else:
+            self.breaker.record(admitted, time.perf_counter() - started)
+        return verdict
+
+    def _short_circuit(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        reason = f"Granite Guardian circuit breaker is {self.breaker.state}"
+        if self.cache is not None:
+            verdict = self.cache.get_stale(request_key(risk, messages))
+            if verdict is not None:
+                self.breaker.short_circuited(stale=True)
+                return verdict.model_copy(update={"degraded_reason": f"{reason}, served a cached verdict"})
+
+        self.breaker.short_circuited(stale=False)
+        return failure_verdict(risk, risk.failure_policy or self.failure_policy, reason)
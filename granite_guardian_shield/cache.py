@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict
+
+from llama_stack.apis.inference import Message
+from llama_stack.log import get_logger
+from pydantic import BaseModel, Field
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.inference import Inference, request_key
+from granite_guardian_shield.models import RiskProbability
+
+logger = get_logger(name=__name__, category="safety")
+
+
+class CacheStats(BaseModel):
+    """
+    Counters describing verdict cache effectiveness.
+    """
+
+    hits: int = Field(default=0, description="Lookups answered from the cache")
+    misses: int = Field(default=0, description="Lookups that required an inference")
+    evictions: int = Field(default=0, description="Entries dropped because the cache was full")
+    expirations: int = Field(default=0, description="Entries dropped because their TTL elapsed")
+    size: int = Field(default=0, description="Current number of cached verdicts")
+
+
+class VerdictCache:
+    """
+    Size-bounded LRU cache of RiskProbability verdicts with a per-entry TTL. Expired verdicts are
+    kept for another `stale_seconds` so they can still be served by `get_stale` while Granite
+    Guardian is unavailable.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, stale_seconds: float = 0.0):
+        if max_size <= 0:
+            raise ValueError("Verdict cache max_size must be greater than 0")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._entries: OrderedDict[str, tuple[float, RiskProbability]] = OrderedDict()
+        self._stats = CacheStats()
+
+    def get(self, key: str) -> RiskProbability | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats.misses += 1
+            return None
+
+        expires_at, verdict = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            if expires_at + self.stale_seconds <= now:
+                del self._entries[key]
+                self._stats.expirations += 1
+            self._stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return verdict
+
+    def get_stale(self, key: str) -> RiskProbability | None:
+        """
+        Look up a verdict that may be up to `stale_seconds` past its TTL. Not counted as a hit or miss.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] + self.stale_seconds <= time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key: str, verdict: RiskProbability) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, verdict)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        return self._stats.model_copy(update={"size": len(self._entries)})
+
+
+class CachingInference(Inference):
+    """
+    Inference wrapper that answers repeated (risk, messages) checks from a VerdictCache.
+    """
+
+    def __init__(self, inference: Inference, cache: VerdictCache):
+        self.inference = inference
+        self.cache = cache
+
+    async def initialize(self) -> None:
+        await self.inference.initialize()
+
+    async def shutdown(self) -> None:
+        await self.inference.shutdown()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        key = request_key(risk, messages)
+        verdict = self.cache.get(key)
+        if verdict is not None:
+            logger.debug(f"Verdict cache hit for {risk.name}")
+            return verdict
+
+        verdict = await self.inference.run(risk, messages)
+        # Verdicts decided without Granite Guardian must not outlive the outage
+        if verdict.degraded_reason is None:
+            self.cache.put(key, verdict)
+        return verdict
@@ -0,0 +1,35 @@
+import httpx
+from openai import AsyncOpenAI
+
+from granite_guardian_shield.config import GraniteGuardianShieldConfig
+
+
+def create_openai_client(config: GraniteGuardianShieldConfig, base_url: str | None = None) -> AsyncOpenAI:
+    """
+    Create the OpenAI client used to talk to Granite Guardian at `base_url`, the first configured
+    endpoint by default, backed by one shared and tuned HTTP connection pool. Retries are handled
+    by GraniteGuardianVLLMInference so the client's own retries are disabled.
+    """
+    timeout = httpx.Timeout(
+        config.read_timeout_seconds,
+        connect=config.connect_timeout_seconds,
+    )
+    http_client = httpx.AsyncClient(
+        verify=config.verify_ssl,
+        http2=config.http2,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_seconds,
+        ),
+    )
+
+    api_key = config.api_key
+    return AsyncOpenAI(
+        base_url=base_url or config.base_urls[0],
+        api_key=api_key.get_secret_value() if api_key else None,
+        http_client=http_client,
+        timeout=timeout,
+        max_retries=0,
+    )
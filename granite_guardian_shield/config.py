@@ -1,8 +1,13 @@
 from llama_stack.apis.safety import ViolationLevel
-from pydantic import BaseModel, ConfigDict, Field, SecretStr
+from pydantic import BaseModel, ConfigDict, Field, SecretStr, model_validator
 
 from granite_guardian_shield.constants import (RISK_DEFINITION, RISK_NAME,
-                                               SimpleRisk)
+                                               AdaptiveConcurrency,
+                                               ChunkReducer, FailurePolicy,
+                                               LoadBalancing, MessageRole,
+                                               Priority, ScoringMode, SimpleRisk,
+                                               StreamCheckpoint,
+                                               TruncationStrategy)
 
 
 class Risk(BaseModel):
@@ -27,13 +32,81 @@ class Risk(BaseModel):
         default=ViolationLevel.ERROR,
         description="The violation level for this risk. Only error level violations will be raised in API responses."
     )
+    token_budget: int | None = Field(
+        default=None,
+        gt=0,
+        description="Maximum number of message tokens sent to Granite Guardian for this risk. Defaults to None which sends messages unchanged.",
+    )
+    truncation: TruncationStrategy = Field(
+        default=TruncationStrategy.head_tail,
+        description="How messages over the token budget are reduced.",
+    )
+    window_overlap: int = Field(
+        default=64,
+        ge=0,
+        description="Tokens shared by consecutive windows when truncation is sliding_window.",
+    )
+    chunk_size: int | None = Field(
+        default=None,
+        gt=0,
+        description="Split a last message longer than this many tokens into overlapping chunks scored concurrently. Defaults to None which scores the message whole.",
+    )
+    chunk_overlap: int = Field(
+        default=64,
+        ge=0,
+        description="Tokens shared by consecutive chunks.",
+    )
+    chunk_reducer: ChunkReducer = Field(
+        default=ChunkReducer.max,
+        description="How chunk risky confidences are combined. max and noisy_or stop scoring as soon as one chunk is risky.",
+    )
+    failure_policy: FailurePolicy | None = Field(
+        default=None,
+        description="Verdict for this risk when Granite Guardian can't be asked. Defaults to None which uses the provider's failure_policy.",
+    )
+    prescreen_keywords: tuple[str, ...] | None = Field(
+        default=None,
+        description="Terms that make a message worth asking Granite Guardian about for this risk. Messages containing none of them, case-insensitively, are safe without a Granite Guardian call. Defaults to None which sends every message.",
+    )
+    roles: tuple[MessageRole, ...] | None = Field(
+        default=None,
+        description="Roles of the messages this risk is checked on, for example only user to check inputs. Defaults to None which checks every role the risk applies to.",
+    )
 
-    model_config = ConfigDict(serialize_by_alias=True)
+    # Frozen so a risk can key compiled payloads, see inference.extra_body
+    model_config = ConfigDict(serialize_by_alias=True, frozen=True)
+
+
+class ShieldParams(BaseModel):
+    """
+    Per-shield configuration passed through the Llama Stack shield `params`.
+    """
+    risks: list[Risk] = Field(
+        description="List of risks this shield evaluates",
+    )
+    max_concurrency: int | None = Field(
+        default=None,
+        gt=0,
+        description="Maximum concurrent Granite Guardian calls for this shield. Defaults to the provider's shield_max_concurrency.",
+    )
+    short_circuit: bool = Field(
+        default=False,
+        description="Return as soon as one risk raises an ERROR level violation and cancel the remaining risk checks.",
+    )
+    priority: Priority = Field(
+        default=Priority.normal,
+        description="Scheduling class of this shield's calls when they queue for a concurrency slot. A priority run_shield param overrides it. Has no effect without a concurrency limit, where calls never queue.",
+    )
+    deadline_ms: float | None = Field(
+        default=None,
+        gt=0,
+        description="Time after the start of a call by which its Granite Guardian checks must have a concurrency slot, in milliseconds. Checks not sent by the deadline, whether still queued for a slot or, with or without a concurrency limit, not dispatched yet, get the failure policy verdict. A deadline_ms run_shield param overrides it. Defaults to None which waits as long as max_queue_wait_ms allows.",
+    )
 
 
 class GraniteGuardianShieldConfig(BaseModel):
-    base_url: str = Field(
-        description="OpenAI Compatible endpoint serving Granite Guardian"
+    base_url: str | list[str] = Field(
+        description="OpenAI Compatible endpoint serving Granite Guardian, or a list of endpoints serving the same model that calls are balanced across"
     )
     api_key: SecretStr | None = Field(
         description="Optional API Key for the base_url",
@@ -44,7 +117,303 @@ class GraniteGuardianShieldConfig(BaseModel):
         description="The Granite Guardian model name",
         default="granite-guardian-3-2-8b"
     )
+    max_connections: int = Field(
+        default=100,
+        gt=0,
+        description="Maximum number of connections in the HTTP connection pool.",
+    )
+    max_keepalive_connections: int = Field(
+        default=20,
+        ge=0,
+        description="Maximum number of idle connections kept alive in the HTTP connection pool.",
+    )
+    keepalive_expiry_seconds: float = Field(
+        default=30.0,
+        ge=0,
+        description="How long an idle connection is kept alive, in seconds.",
+    )
+    http2: bool = Field(
+        default=False,
+        description="Use HTTP/2 to talk to base_url. Requires the httpx http2 extra.",
+    )
+    connect_timeout_seconds: float = Field(
+        default=5.0,
+        gt=0,
+        description="Timeout for establishing a connection, in seconds.",
+    )
+    read_timeout_seconds: float = Field(
+        default=30.0,
+        gt=0,
+        description="Timeout for reading a response, in seconds.",
+    )
+    timeout_seconds: float | None = Field(
+        default=None,
+        gt=0,
+        description="Total time allowed for one Granite Guardian call including retries, in seconds. Defaults to None which means no total limit.",
+    )
+    max_retries: int = Field(
+        default=2,
+        ge=0,
+        description="How many times a failed Granite Guardian call is retried.",
+    )
+    retry_backoff_seconds: float = Field(
+        default=0.25,
+        ge=0,
+        description="Initial delay before retrying a failed call, doubled on every retry, in seconds.",
+    )
+    retry_backoff_max_seconds: float = Field(
+        default=4.0,
+        ge=0,
+        description="Maximum delay between retries, in seconds.",
+    )
+    load_balancing: LoadBalancing = Field(
+        default=LoadBalancing.least_outstanding,
+        description="How an endpoint is picked for each call when base_url lists several. least_outstanding picks the endpoint with the fewest calls in flight, ewma the one with the lowest recent latency weighted by its calls in flight.",
+    )
+    ejection_consecutive_failures: int = Field(
+        default=5,
+        ge=1,
+        description="Consecutive failed calls after which an endpoint stops receiving calls for ejection_seconds. A single further failure after it returns ejects it again.",
+    )
+    ejection_seconds: float = Field(
+        default=30.0,
+        gt=0,
+        description="How long an ejected endpoint stops receiving calls, in seconds.",
+    )
+    hedge_percentile: float | None = Field(
+        default=None,
+        gt=0,
+        lt=100,
+        description="Send a duplicate call to a second endpoint when the first hasn't answered within this percentile of recent call latencies, and keep whichever answers first. Defaults to None which disables hedging. Requires several endpoints.",
+    )
+    payload_sample_rate: float = Field(
+        default=0.0,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of Granite Guardian requests whose full request and response payloads are logged.",
+    )
+    scoring_mode: ScoringMode = Field(
+        default=ScoringMode.generate,
+        description="How the answer probability is obtained. generate lets Granite Guardian generate freely, label_token limits generation to the label token and prompt_logprobs scores the label from echoed prompt logprobs without generating. prompt_logprobs requires chat_template or tokenizer.",
+    )
+    fast_parse: bool = Field(
+        default=False,
+        description="Parse Granite Guardian responses from their raw JSON, reading only the first token's logprobs, instead of building OpenAI response models. Saves CPU at high call rates.",
+    )
+    logprob_store_path: str | None = Field(
+        default=None,
+        description="Optional file the raw safe and risky label log masses of every Granite Guardian verdict are appended to, for re-evaluating violation thresholds offline.",
+    )
+    warmup_connections: int = Field(
+        default=1,
+        ge=0,
+        description="Number of connections opened to base_url when the provider starts. 0 disables the warm-up.",
+    )
+    prescreen_model_path: str | None = Field(
+        default=None,
+        description="Optional hashed n-gram pre-screen model trained with granite-guardian-prescreen. Messages it gives a risky probability below prescreen_safe_threshold are safe, for the risks it was trained on, without a Granite Guardian call.",
+    )
+    prescreen_safe_threshold: float = Field(
+        default=0.01,
+        gt=0,
+        lt=1,
+        description="Risky probability under which the pre-screen model finds a message safe. Pick it with granite-guardian-prescreen calibrate.",
+    )
     risks: list[Risk] = Field(
         default=[Risk()],
         description="List of risks to run on each user input",
     )
+    cache_max_size: int = Field(
+        default=0,
+        ge=0,
+        description="Maximum number of verdicts kept in the verdict cache. Defaults to 0 which disables the cache.",
+    )
+    cache_ttl_seconds: float = Field(
+        default=300.0,
+        gt=0,
+        description="How long a cached verdict may be reused, in seconds.",
+    )
+    chat_template: str | None = Field(
+        default=None,
+        description="Optional path to the Granite Guardian Jinja chat template used to render prompts locally.",
+    )
+    tokenizer: str | None = Field(
+        default=None,
+        description="Optional Hugging Face tokenizer name or path for the Granite Guardian model. Used to count tokens for risk token budgets and, without chat_template, to render prompts locally. Requires transformers.",
+    )
+    batching_enabled: bool = Field(
+        default=False,
+        description="Gather concurrent risk checks and send them as one batched /v1/completions request. Requires chat_template or tokenizer. The prompts of a shield call's risks are ordered so vLLM prefills their shared conversation prefix once, which only happens with batching: otherwise each risk is a separate chat completions request.",
+    )
+    batch_max_size: int = Field(
+        default=32,
+        ge=1,
+        description="Maximum number of risk checks sent in one batched request.",
+    )
+    batch_window_ms: float = Field(
+        default=5.0,
+        ge=0,
+        description="How long to wait for more risk checks before sending a batch, in milliseconds. 0 still scores all risks of one shield call in a single request.",
+    )
+
+    shields_path: str | None = Field(
+        default=None,
+        description="Optional YAML file of shields laid out like the shields section of run.yaml. It is loaded when the provider starts and reloaded whenever it changes: shields it defines are registered or updated and shields removed from it are unregistered, without restarting the stack or dropping calls in flight.",
+    )
+    shields_reload_seconds: float = Field(
+        default=5.0,
+        gt=0,
+        description="How often shields_path is checked for changes, in seconds.",
+    )
+
+    session_idle_seconds: float | None = Field(
+        default=None,
+        gt=0,
+        description="Remember the verdicts computed on each turn of a conversation so a shield called again on a turn it already scored, such as a retried call or a regenerated response, doesn't score it again, dropping sessions idle for this many seconds. Calls are grouped into sessions by a session_id run_shield param; calls without one are always scored. Defaults to None which disables sessions.",
+    )
+    session_max_count: int = Field(
+        default=10000,
+        ge=1,
+        description="Maximum number of sessions remembered. The least recently used session is dropped first.",
+    )
+    context_max_tokens: int | None = Field(
+        default=8192,
+        gt=0,
+        description="Maximum tokens of retrieved context sent for the groundedness and context_relevance risks. Context is taken from the user message's context and the tool results of the turn, with repeated documents sent once. The document crossing the limit is cut and later ones are dropped. None sends all of it.",
+    )
+    stream_checkpoint: StreamCheckpoint = Field(
+        default=StreamCheckpoint.sentence,
+        description="Where a response shielded with stream_output is checked while it is generated. sentence checks at the end of each sentence or line, tokens every stream_checkpoint_tokens tokens. The complete response is always checked when the stream is closed.",
+    )
+    stream_checkpoint_tokens: int = Field(
+        default=16,
+        ge=1,
+        description="Tokens generated between streaming checks. With sentence checkpoints, the minimum tokens since the last check before a sentence end triggers one.",
+    )
+
+    max_concurrency: int | None = Field(
+        default=None,
+        gt=0,
+        description="Maximum concurrent Granite Guardian calls across all shields. Defaults to None which means unlimited.",
+    )
+    shield_max_concurrency: int | None = Field(
+        default=None,
+        gt=0,
+        description="Default maximum concurrent Granite Guardian calls per shield. Defaults to None which means unlimited.",
+    )
+    max_queue_size: int | None = Field(
+        default=None,
+        ge=0,
+        description="Maximum number of calls waiting for a concurrency slot. Further calls are refused. Defaults to None which means unbounded.",
+    )
+    max_queue_wait_ms: float | None = Field(
+        default=None,
+        gt=0,
+        description="Maximum time a call waits for a concurrency slot before it is refused, in milliseconds.",
+    )
+    priority_min_share: float = Field(
+        default=0.1,
+        ge=0,
+        lt=1,
+        description="Minimum share of freed concurrency slots handed to each priority class below high while it has calls waiting, so low priority work is never starved. 0 serves lower classes only when higher ones have nothing waiting.",
+    )
+    adaptive_concurrency: AdaptiveConcurrency | None = Field(
+        default=None,
+        description="Limit the concurrent calls sent to each Granite Guardian endpoint and adjust the limit from their latency, measured against the lowest recent latency as the baseline. 'aimd' grows the limit by about one call per round trip and cuts it by adaptive_backoff_ratio when latency exceeds the tolerated multiple of the baseline, 'gradient' scales it by the ratio of tolerated to average latency. Errors always cut it. Defaults to None which sends calls without a per endpoint limit.",
+    )
+    adaptive_initial_limit: int = Field(
+        default=16,
+        gt=0,
+        description="Concurrency limit of each endpoint before any latency has been observed.",
+    )
+    adaptive_min_limit: int = Field(
+        default=1,
+        gt=0,
+        description="Lowest concurrency limit adaptive concurrency can set.",
+    )
+    adaptive_max_limit: int = Field(
+        default=256,
+        gt=0,
+        description="Highest concurrency limit adaptive concurrency can set.",
+    )
+    adaptive_latency_tolerance: float = Field(
+        default=2.0,
+        gt=1,
+        description="Latency, as a multiple of the baseline, above which calls are considered queued inside the endpoint and the limit is lowered.",
+    )
+    adaptive_backoff_ratio: float = Field(
+        default=0.9,
+        gt=0,
+        lt=1,
+        description="Factor the concurrency limit is multiplied by when a call fails or, with aimd, is slow.",
+    )
+    failure_policy: FailurePolicy = Field(
+        default=FailurePolicy.closed,
+        description="Verdict for refused calls: 'closed' treats the message as risky, 'open' treats it as safe. Risks can override it.",
+    )
+    breaker_failure_rate: float | None = Field(
+        default=None,
+        gt=0,
+        le=1,
+        description="Open the circuit breaker when this fraction of recent Granite Guardian calls failed or were slow. While open, calls fail fast with the failure policy or a stale cached verdict. Defaults to None which disables the breaker.",
+    )
+    breaker_slow_call_ms: float | None = Field(
+        default=None,
+        gt=0,
+        description="Calls taking longer than this count as failures for the circuit breaker, in milliseconds. Defaults to None which only counts errors.",
+    )
+    breaker_window_size: int = Field(
+        default=20,
+        ge=1,
+        description="Number of recent calls the circuit breaker failure rate is computed over.",
+    )
+    breaker_min_calls: int = Field(
+        default=10,
+        ge=1,
+        description="Calls needed in the window before the circuit breaker can open.",
+    )
+    breaker_open_seconds: float = Field(
+        default=30.0,
+        gt=0,
+        description="How long the circuit breaker stays open before probe calls are let through, in seconds.",
+    )
+    breaker_half_open_probes: int = Field(
+        default=3,
+        ge=1,
+        description="Probe calls that must succeed in a row to close the circuit breaker again. Any failed probe reopens it.",
+    )
+    breaker_serve_stale_seconds: float = Field(
+        default=0.0,
+        ge=0,
+        description="While the circuit breaker is open, answer from cached verdicts up to this many seconds past their TTL before falling back to the failure policy. Requires cache_max_size.",
+    )
+
+    @property
+    def base_urls(self) -> list[str]:
+        return [self.base_url] if isinstance(self.base_url, str) else self.base_url
+
+    @model_validator(mode="after")
+    def check_base_url(self) -> "GraniteGuardianShieldConfig":
+        if not self.base_urls:
+            raise ValueError("base_url must list at least one endpoint")
+        return self
+
+    @model_validator(mode="after")
+    def check_adaptive_concurrency(self) -> "GraniteGuardianShieldConfig":
+        if not self.adaptive_min_limit <= self.adaptive_initial_limit <= self.adaptive_max_limit:
+            raise ValueError("adaptive_initial_limit must be between adaptive_min_limit and adaptive_max_limit")
+        return self
+
+    @model_validator(mode="after")
+    def check_breaker(self) -> "GraniteGuardianShieldConfig":
+        if self.breaker_serve_stale_seconds and not self.cache_max_size:
+            raise ValueError("breaker_serve_stale_seconds requires cache_max_size to keep verdicts")
+        return self
+
+    @model_validator(mode="after")
+    def check_prompt_renderer(self) -> "GraniteGuardianShieldConfig":
+        if self.batching_enabled and not (self.chat_template or self.tokenizer):
+            raise ValueError("batching_enabled requires chat_template or tokenizer to render Granite Guardian prompts")
+        if self.scoring_mode == ScoringMode.prompt_logprobs and not (self.chat_template or self.tokenizer):
+            raise ValueError("prompt_logprobs scoring requires chat_template or tokenizer to render Granite Guardian prompts")
+        return self
@@ -27,3 +27,90 @@ class HallucinationRisk(StrEnum):
     groundedness = "groundedness"
     answer_relevance = "answer_relevance"
     function_call = "function_call"
+
+
+class FailurePolicy(StrEnum):
+    """
+    What verdict to return when Granite Guardian could not be asked.
+    """
+    open = "open"  # Treat the message as safe
+    closed = "closed"  # Treat the message as risky
+
+
+class TruncationStrategy(StrEnum):
+    """
+    How message content over a risk's token budget is reduced before it is sent to Granite Guardian.
+    """
+    head = "head"  # Keep the beginning
+    tail = "tail"  # Keep the end
+    head_tail = "head_tail"  # Keep the beginning and the end, drop the middle
+    sliding_window = "sliding_window"  # Score overlapping windows of the last message and keep the riskiest verdict
+
+
+class ChunkReducer(StrEnum):
+    """
+    How per-chunk risky confidences of a chunked message are combined into one.
+    """
+    max = "max"  # Riskiest chunk decides
+    mean = "mean"  # Average over chunks
+    noisy_or = "noisy_or"  # Probability that at least one chunk is risky, assuming chunks are independent
+
+
+class ScoringMode(StrEnum):
+    """
+    How Granite Guardian's answer probability is obtained.
+    """
+    generate = "generate"  # Let the model generate its answer and read the logprobs of every generated token
+    label_token = "label_token"  # Generate only the label token and read its logprobs
+    prompt_logprobs = "prompt_logprobs"  # No generation, score the label as the last prompt token (echo)
+
+
+class LoadBalancing(StrEnum):
+    """
+    How a Granite Guardian endpoint is picked for each call when several are configured.
+    """
+    least_outstanding = "least_outstanding"  # Endpoint with the fewest calls in flight
+    ewma = "ewma"  # Endpoint with the lowest recent latency weighted by its calls in flight
+
+
+class CircuitState(StrEnum):
+    """
+    State of the circuit breaker in front of Granite Guardian.
+    """
+    closed = "closed"  # Calls go through
+    open = "open"  # Calls fail fast
+    half_open = "half_open"  # A few probe calls go through to test recovery
+
+
+class StreamCheckpoint(StrEnum):
+    """
+    Where a streamed assistant response is checked by Granite Guardian before it is complete.
+    """
+    sentence = "sentence"  # At the end of a sentence or line
+    tokens = "tokens"  # Every stream_checkpoint_tokens tokens
+
+
+class MessageRole(StrEnum):
+    """
+    Roles of the messages a shield is run on.
+    """
+    user = "user"  # Input from the user
+    assistant = "assistant"  # Output of the model
+    tool = "tool"  # Result of a tool call
+
+
+class Priority(StrEnum):
+    """
+    Scheduling class of a shield call when Granite Guardian calls queue for a concurrency slot.
+    """
+    high = "high"  # Interactive traffic, served first
+    normal = "normal"
+    low = "low"  # Background and batch audits, only guaranteed a minimum share while others wait
+
+
+class AdaptiveConcurrency(StrEnum):
+    """
+    How the concurrency limit of a Granite Guardian endpoint follows its observed latency.
+    """
+    aimd = "aimd"  # Grow by about one call per round trip, cut by a ratio when latency rises
+    gradient = "gradient"  # Scale by the ratio of baseline to average latency, plus headroom to probe
@@ -0,0 +1,118 @@
+import json
+from enum import Enum
+from typing import Any, Literal
+
+from llama_stack.apis.common.content_types import (InterleavedContent,
+                                                   TextContentItem)
+from llama_stack.apis.inference import (CompletionMessage, Message,
+                                        ToolResponseMessage, UserMessage)
+from pydantic import BaseModel
+
+from granite_guardian_shield.constants import TruncationStrategy
+from granite_guardian_shield.inference import scoped
+from granite_guardian_shield.truncation import TokenCounter, truncate_text
+
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+class ContextMessage(BaseModel):
+    """
+    Retrieved documents or tool definitions, sent to Granite Guardian with the `context` or `tools`
+    role of its chat template. Built by the shield from the conversation, it is not a Llama Stack
+    message.
+    """
+
+    role: Literal["context", "tools"] = "context"
+    content: str
+
+
+def content_texts(content: InterleavedContent | None) -> list[str]:
+    """
+    Text items of Llama Stack message content. Images are dropped.
+    """
+    if content is None:
+        return []
+    if isinstance(content, str):
+        return [content]
+    if isinstance(content, TextContentItem):
+        return [content.text]
+    if isinstance(content, list):
+        return [text for item in content for text in content_texts(item)]
+    return []
+
+
+def last_user_index(messages: list[Message]) -> int | None:
+    """
+    Position of the user message that started the current turn.
+    """
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], UserMessage):
+            return i
+    return None
+
+
+def extract_context(messages: list[Message], counter: TokenCounter, max_tokens: int | None) -> ContextMessage | None:
+    """
+    Context retrieved for the current turn: the `context` of its user message and the results of
+    tool calls made since. Each text item is a document; a document repeated, up to whitespace, is
+    sent once. Documents are kept in order until `max_tokens` is reached and the one crossing it is
+    cut. Extracted once per shield call and shared by every risk that needs it.
+    """
+    return scoped(("context", id(messages), max_tokens), messages, lambda: _extract_context(messages, counter, max_tokens))
+
+
+def _extract_context(messages: list[Message], counter: TokenCounter, max_tokens: int | None) -> ContextMessage | None:
+    start = last_user_index(messages)
+    if start is None:
+        return None
+
+    documents = content_texts(messages[start].context)
+    for message in messages[start + 1:]:
+        if isinstance(message, ToolResponseMessage):
+            documents.extend(content_texts(message.content))
+
+    seen: set[str] = set()
+    kept: list[str] = []
+    remaining = max_tokens
+    for document in map(str.strip, documents):
+        normalized = " ".join(document.split())
+        if not normalized or normalized in seen:
+            continue
+        seen.add(normalized)
+        if remaining is not None:
+            offsets = counter.offsets(document)
+            if len(offsets) > remaining:
+                if remaining > 0:
+                    kept.append(truncate_text(document, offsets, remaining, TruncationStrategy.head).rstrip())
+                break
+            remaining -= len(offsets)
+        kept.append(document)
+
+    if not kept:
+        return None
+    return ContextMessage(content=DOCUMENT_SEPARATOR.join(kept))
+
+
+def tool_calls_text(message: CompletionMessage) -> str:
+    """
+    The tool calls of an assistant message as the JSON list of {"name", "arguments"} objects the
+    Granite Guardian function_call risk expects as the assistant turn.
+    """
+    calls = []
+    for call in message.tool_calls or []:
+        arguments: Any = call.arguments
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                pass  # Keep arguments that aren't JSON as they were generated
+        name = call.tool_name.value if isinstance(call.tool_name, Enum) else call.tool_name
+        calls.append({"name": name, "arguments": arguments})
+    return json.dumps(calls)
+
+
+def tools_message(tools: Any) -> ContextMessage:
+    """
+    Tool definitions passed in the `tools` run_shield param, for the function_call risk.
+    """
+    return ContextMessage(role="tools", content=tools if isinstance(tools, str) else json.dumps(tools))
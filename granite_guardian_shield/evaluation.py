@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+import yaml
+from llama_stack.apis.inference import Message
+from llama_stack.log import get_logger
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+from granite_guardian_shield import create_inference
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import FailurePolicy, MessageRole
+from granite_guardian_shield.helpers import failure_verdict
+from granite_guardian_shield.plan import applies_to
+from granite_guardian_shield.risk_assessor import (RiskAssessor,
+                                                   RiskAssessorFactory)
+
+logger = get_logger(name=__name__, category="safety")
+
+_messages_adapter = TypeAdapter(list[Message])
+
+
+class EvaluationStats(BaseModel):
+    """
+    Progress of a batch evaluation.
+    """
+
+    records: int = Field(default=0, description="Conversations evaluated in this run")
+    skipped: int = Field(default=0, description="Conversations skipped because the checkpoint shows they were already evaluated")
+    invalid: int = Field(default=0, description="Input rows that could not be parsed into a conversation")
+    verdicts: int = Field(default=0, description="Verdict rows written")
+    errors: int = Field(default=0, description="Risk checks that failed and were written as degraded verdicts")
+    not_applicable: int = Field(
+        default=0,
+        description="Risk checks skipped because the risk doesn't apply to the role of the conversation's last message",
+    )
+    elapsed_seconds: float = Field(default=0.0, description="Time since the evaluation started")
+    records_per_second: float = Field(default=0.0, description="Conversations evaluated per second")
+
+
+class Checkpoint(BaseModel):
+    """
+    Where an interrupted evaluation can resume. Records are evaluated out of order, so besides the
+    index below which every record is done, the few records above it that were already written are kept.
+    """
+
+    next_index: int = Field(default=0, description="Every input row below this index was evaluated")
+    output_offset: int = Field(default=0, description="Length of the output file holding the verdicts of evaluated rows")
+    completed: list[int] = Field(default_factory=list, description="Rows at or above next_index that were already evaluated")
+
+    @classmethod
+    def load(cls, path: Path) -> "Checkpoint | None":
+        if not path.exists():
+            return None
+        return cls.model_validate_json(path.read_text())
+
+    def save(self, path: Path) -> None:
+        # Write then rename so a crash never leaves a partial checkpoint behind
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.model_dump_json())
+        os.replace(tmp, path)
+
+
+@dataclass
+class EvaluationRecord:
+    index: int
+    id: Any
+    messages: list[Message]
+
+
+def parse_messages(messages: Any) -> list[Message]:
+    """
+    Validate a logged conversation. Messages may be given as a JSON string, unset fields may be null
+    and assistant messages without a stop_reason are accepted.
+    """
+    if isinstance(messages, str):
+        messages = json.loads(messages)
+    messages = [{key: value for key, value in message.items() if value is not None} for message in messages]
+    for message in messages:
+        if message.get("role") == "assistant":
+            message.setdefault("stop_reason", "end_of_turn")
+    return _messages_adapter.validate_python(messages)
+
+
+def _jsonl_rows(path: Path, start: int) -> Iterator[tuple[int, str]]:
+    with open(path) as f:
+        for index, line in enumerate(f):
+            # Rows before the checkpoint are skipped without parsing them
+            if index < start or not line.strip():
+                continue
+            yield index, line
+
+
+def _parquet_rows(path: Path, start: int, batch_size: int = 1024) -> Iterator[tuple[int, dict[str, Any]]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Reading Parquet datasets requires pyarrow. "
+            "Install granite_guardian_llama_stack_shield[parquet]."
+        ) from e
+
+    index = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        if index + batch.num_rows <= start:
+            index += batch.num_rows
+            continue
+        for row in batch.to_pylist():
+            if index >= start:
+                yield index, row
+            index += 1
+
+
+def read_rows(path: Path, start: int = 0) -> Iterator[tuple[int, str | dict[str, Any]]]:
+    """
+    Stream (index, row) pairs of a JSONL or Parquet dataset, starting at row `start`. JSONL rows are
+    returned unparsed. Each row holds a `messages` conversation and optionally an `id`.
+    """
+    if path.suffix == ".parquet":
+        return _parquet_rows(path, start)
+    return _jsonl_rows(path, start)
+
+
+class BatchEvaluator:
+    """
+    Scores a dataset of conversations against a set of risk assessors with bounded concurrency.
+    Rows are streamed from the input and verdicts are appended to a JSONL output as they complete,
+    so memory stays flat regardless of the dataset size. A checkpoint is written periodically to
+    resume an interrupted evaluation without scoring conversations twice. As in run_shield, a
+    conversation is only scored for the risks that apply to the role of its last message.
+    """
+
+    def __init__(
+        self,
+        assessors: list[RiskAssessor],
+        concurrency: int = 32,
+        failure_policy: FailurePolicy = FailurePolicy.closed,
+        checkpoint_interval: int = 1000,
+        progress_interval_seconds: float = 10.0,
+    ):
+        if not assessors:
+            raise ValueError("No risks to evaluate")
+        self.assessors = assessors
+        self._by_role = {
+            role: [assessor for assessor in assessors if applies_to(assessor, role)] for role in MessageRole
+        }
+        self.concurrency = concurrency
+        self.failure_policy = failure_policy
+        self.checkpoint_interval = checkpoint_interval
+        self.progress_interval_seconds = progress_interval_seconds
+        self._stats = EvaluationStats()
+        self._started = time.monotonic()
+
+    def stats(self) -> EvaluationStats:
+        elapsed = time.monotonic() - self._started
+        return self._stats.model_copy(update={
+            "elapsed_seconds": elapsed,
+            "records_per_second": self._stats.records / elapsed if elapsed else 0.0,
+        })
+
+    async def evaluate(self, input_path: Path, output_path: Path, checkpoint_path: Path | None = None) -> EvaluationStats:
+        """
+        Evaluate every conversation of `input_path` and append one verdict row per conversation and
+        applicable risk to `output_path`. Rows carry the request key that labels for threshold sweeps refer to. If `checkpoint_path` holds a checkpoint the evaluation resumes from it.
+        """
+        self._stats = EvaluationStats()
+        self._started = time.monotonic()
+
+        checkpoint = Checkpoint.load(checkpoint_path) if checkpoint_path else None
+        if checkpoint is not None and output_path.exists():
+            logger.info(f"Resuming {input_path} from row {checkpoint.next_index}")
+            # Verdicts written after the checkpoint belong to records that are evaluated again
+            with open(output_path, "r+b") as f:
+                f.truncate(checkpoint.output_offset)
+            output = open(output_path, "ab")
+        else:
+            checkpoint = Checkpoint()
+            output = open(output_path, "wb")
+
+        done = set(checkpoint.completed)
+        # Records handed to workers but not written yet, and written records not yet covered by next_index
+        in_flight: set[int] = set()
+        written: set[int] = set(done)
+        position = checkpoint.next_index
+        queue: asyncio.Queue[EvaluationRecord | None] = asyncio.Queue(maxsize=2 * self.concurrency)
+        next_report = time.monotonic() + self.progress_interval_seconds
+
+        def save_checkpoint() -> None:
+            if checkpoint_path is None:
+                return
+            output.flush()
+            os.fsync(output.fileno())
+            next_index = min(in_flight) if in_flight else position
+            written.difference_update([i for i in written if i < next_index])
+            Checkpoint(next_index=next_index, output_offset=output.tell(), completed=sorted(written)).save(checkpoint_path)
+
+        def complete(index: int) -> None:
+            nonlocal next_report
+            in_flight.discard(index)
+            written.add(index)
+            if self._stats.records % self.checkpoint_interval == 0:
+                save_checkpoint()
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.progress_interval_seconds
+                stats = self.stats()
+                logger.info(
+                    f"Evaluated {stats.records} conversations ({stats.records_per_second:.1f}/s), "
+                    f"{stats.verdicts} verdicts, {stats.errors} errors"
+                )
+
+        async def feed() -> None:
+            nonlocal position
+            for index, row in read_rows(input_path, checkpoint.next_index):
+                position = index + 1
+                if index in done:
+                    self._stats.skipped += 1
+                    continue
+                try:
+                    if isinstance(row, str):
+                        row = json.loads(row)
+                    record = EvaluationRecord(index=index, id=row.get("id", index), messages=parse_messages(row["messages"]))
+                except (KeyError, TypeError, ValueError, ValidationError) as e:
+                    logger.warning(f"Skipping invalid row {index} of {input_path}: {e}")
+                    self._stats.invalid += 1
+                    continue
+                in_flight.add(index)
+                await queue.put(record)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        async def work() -> None:
+            while (record := await queue.get()) is not None:
+                _write_rows(output, await self._evaluate(record))
+                self._stats.records += 1
+                complete(record.index)
+
+        try:
+            async with asyncio.TaskGroup() as tasks:
+                tasks.create_task(feed())
+                for _ in range(self.concurrency):
+                    tasks.create_task(work())
+            save_checkpoint()
+        finally:
+            output.close()
+
+        stats = self.stats()
+        logger.info(f"Evaluated {stats.records} conversations in {stats.elapsed_seconds:.1f}s ({stats.records_per_second:.1f}/s)")
+        return stats
+
+    async def _evaluate(self, record: EvaluationRecord) -> list[dict[str, Any]]:
+        assessors = self._by_role.get(record.messages[-1].role, []) if record.messages else []
+        self._stats.not_applicable += len(self.assessors) - len(assessors)
+        results = await asyncio.gather(
+            *(assessor.run(record.messages) for assessor in assessors), return_exceptions=True
+        )
+        rows = []
+        for assessor, result in zip(assessors, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                self._stats.errors += 1
+                result = failure_verdict(assessor.risk, self.failure_policy, f"error: {result}")
+            # request_key is the key of the messages actually sent, which the logprob store is keyed by
+            rows.append({"index": record.index, "id": record.id, **result.model_dump(mode="json")})
+        self._stats.verdicts += len(rows)
+        return rows
+
+
+def _write_rows(output: IO[bytes], rows: list[dict[str, Any]]) -> None:
+    output.write("".join(json.dumps(row) + "\n" for row in rows).encode())
+
+
+async def _run(args: argparse.Namespace) -> EvaluationStats:
+    config = GraniteGuardianShieldConfig.model_validate(yaml.safe_load(Path(args.config).read_text()))
+    risks = [Risk(name=name) for name in args.risk] if args.risk else config.risks
+    inference, token_counter, _ = create_inference(config)
+    factory = RiskAssessorFactory(inference, token_counter, context_max_tokens=config.context_max_tokens)
+    evaluator = BatchEvaluator(
+        [factory.create_assessor(risk) for risk in risks],
+        concurrency=args.concurrency,
+        failure_policy=config.failure_policy,
+        checkpoint_interval=args.checkpoint_interval,
+        progress_interval_seconds=args.progress_interval,
+    )
+
+    output = Path(args.output)
+    checkpoint = Path(args.checkpoint) if args.checkpoint else output.with_name(output.name + ".checkpoint")
+    await inference.initialize()
+    try:
+        return await evaluator.evaluate(Path(args.input), output, checkpoint)
+    finally:
+        await inference.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Score a JSONL or Parquet dataset of conversations with Granite Guardian. "
+        "Each row holds a `messages` list and optionally an `id`. One verdict row per conversation "
+        "and risk is appended to the output. Rerunning an interrupted evaluation resumes from its checkpoint.",
+    )
+    parser.add_argument("input", help="JSONL or .parquet dataset of conversations")
+    parser.add_argument("--output", required=True, help="JSONL file verdicts are written to")
+    parser.add_argument("--config", required=True, help="YAML provider config, as in the safety provider config of run.yaml")
+    parser.add_argument("--risk", action="append", help="Risk to evaluate, repeatable. Defaults to the risks of the config")
+    parser.add_argument("--concurrency", type=int, default=32, help="Conversations evaluated concurrently")
+    parser.add_argument("--checkpoint", help="Checkpoint file, defaults to the output path with a .checkpoint suffix")
+    parser.add_argument("--checkpoint-interval", type=int, default=1000, help="Conversations between checkpoints")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress reports")
+    args = parser.parse_args()
+
+    stats = asyncio.run(_run(args))
+    print(stats.model_dump_json(indent=2))
@@ -1,10 +1,12 @@
 import math
-from typing import Tuple
+from typing import Iterable, Tuple
 
 from openai.types.chat.chat_completion import ChatCompletion, ChoiceLogprobs
+from openai.types.completion_choice import CompletionChoice, Logprobs
 from llama_stack.apis.safety import ViolationLevel
 
 from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import ChunkReducer, FailurePolicy
 from granite_guardian_shield.models import RiskProbability
 
 
@@ -50,25 +52,92 @@ def get_probabilities(
     (e.g., “Yes” might be ["Y", "es"]). We add up the probabilities of every token
     piece that belongs to “Yes” and every piece that belongs to “No”.
 
+    """
+    return _softmax2(*get_label_log_masses(logprobs, safe_token, risky_token))
+
+
+def get_label_log_masses(
+    logprobs: ChoiceLogprobs,
+    safe_token: str = "No",
+    risky_token: str = "Yes",
+) -> Tuple[float, float]:
+    """
+    Natural log of the total probability mass Granite Guardian put on the safe and risky label
+    tokens, before they are normalised into (P_safe, P_risky).
     """
     if not logprobs or not logprobs.content:
         raise ValueError("Granite-Guardian response contained no logprobs.")
 
+    steps = (
+        ((token_prob.token, token_prob.logprob) for token_prob in step.top_logprobs)
+        for step in logprobs.content
+    )
+    return _log_masses_from_steps(steps, safe_token, risky_token)
+
+
+def get_completion_probabilities(
+    logprobs: Logprobs | None,
+    safe_token: str = "No",
+    risky_token: str = "Yes",
+) -> Tuple[float, float]:
+    """
+    Same as get_probabilities but for the legacy /v1/completions logprobs format where each
+    generated position carries a {token: logprob} mapping of its top alternatives.
+    """
+    return _softmax2(*get_completion_label_log_masses(logprobs, safe_token, risky_token))
+
+
+def get_completion_label_log_masses(
+    logprobs: Logprobs | None,
+    safe_token: str = "No",
+    risky_token: str = "Yes",
+) -> Tuple[float, float]:
+    """
+    Same as get_label_log_masses but for the legacy /v1/completions logprobs format.
+    """
+    if not logprobs or not logprobs.top_logprobs:
+        raise ValueError("Granite-Guardian response contained no logprobs.")
+
+    steps = (top.items() for top in logprobs.top_logprobs if top)
+    return _log_masses_from_steps(steps, safe_token, risky_token)
+
+
+def get_prompt_label_log_masses(
+    logprobs: Logprobs | None,
+    safe_token: str = "No",
+    risky_token: str = "Yes",
+) -> Tuple[float, float]:
+    """
+    Same as get_completion_label_log_masses but for an echoed prompt ending in PROMPT_ANSWER, where
+    only the alternatives at the last echoed token are the label.
+    """
+    if not logprobs or not logprobs.top_logprobs:
+        raise ValueError("Granite-Guardian response contained no prompt logprobs.")
+
+    top = logprobs.top_logprobs[-1] or {}
+    return _log_masses_from_steps([top.items()], safe_token, risky_token)
+
+
+def _log_masses_from_steps(
+    steps: Iterable[Iterable[Tuple[str, float]]],
+    safe_token: str,
+    risky_token: str,
+) -> Tuple[float, float]:
     safe_prob = 1e-50  # Essentially zero, safety measure to prevent math.log(0)
     risky_prob = 1e-50
 
     safe_token = safe_token.lower()
     risky_token = risky_token.lower()
 
-    for step in logprobs.content:  # Loops over every token piece the model generated when it wrote its one-word answer.
-        for token_prob in step.top_logprobs:
-            token = token_prob.token.strip().lower()  # normalize to lowercase
+    for step in steps:  # Loops over every token piece the model generated when it wrote its one-word answer.
+        for raw_token, logprob in step:
+            token = raw_token.strip().lower()  # normalize to lowercase
             if token == safe_token:
-                safe_prob += math.exp(token_prob.logprob)  # Adds that piece’s probability to safe_prob when it’s part of "No".
+                safe_prob += math.exp(logprob)  # Adds that piece’s probability to safe_prob when it’s part of "No".
             elif token == risky_token:
-                risky_prob += math.exp(token_prob.logprob)  # Same for "Yes"
+                risky_prob += math.exp(logprob)  # Same for "Yes"
 
-    return _softmax2(math.log(safe_prob), math.log(risky_prob))
+    return math.log(safe_prob), math.log(risky_prob)
 
 
 def parse_output(response: ChatCompletion, risk: Risk) -> RiskProbability:
@@ -92,6 +161,56 @@ def parse_output(response: ChatCompletion, risk: Risk) -> RiskProbability:
         p_safe = None
         p_risky = None
 
+    return _risk_probability(label, p_safe, p_risky, risk)
+
+
+def parse_completion_output(choice: CompletionChoice, risk: Risk) -> RiskProbability:
+    """
+    Parse a single /v1/completions choice for a pre-rendered Granite Guardian prompt into a
+    structured RiskProbability response.
+
+    Args:
+        choice: One CompletionChoice returned by OpenAI client for a batched completions request.
+        risk: represents the risk being checked for
+
+    Returns:
+        RiskProbability: The output risk probability model
+    """
+    label = choice.text.strip().lower()
+    try:
+        p_safe, p_risky = get_completion_probabilities(choice.logprobs)
+    except ValueError:
+        p_safe = None
+        p_risky = None
+
+    return _risk_probability(label, p_safe, p_risky, risk)
+
+
+# Candidate answer appended to the prompt in prompt_logprobs scoring mode
+PROMPT_ANSWER = "Yes"
+
+
+def parse_prompt_logprobs_output(choice: CompletionChoice, risk: Risk) -> RiskProbability:
+    """
+    Parse a /v1/completions choice that echoed a pre-rendered Granite Guardian prompt followed by
+    PROMPT_ANSWER. The top alternatives the model considered at the answer position hold the safe
+    and risky label probabilities, without any token being generated.
+
+    Nothing is generated, so the answer is the last echoed token. Its text offset isn't relied on:
+    detokenization can merge the answer with the end of the prompt or shift offsets.
+
+    Args:
+        choice: The echoed CompletionChoice.
+        risk: represents the risk being checked for
+
+    Raises:
+        ValueError: Raised if the choice has no prompt logprobs.
+    """
+    p_safe, p_risky = _softmax2(*get_prompt_label_log_masses(choice.logprobs))
+    return _risk_probability("yes" if p_risky > p_safe else "no", p_safe, p_risky, risk)
+
+
+def _risk_probability(label: str, p_safe: float | None, p_risky: float | None, risk: Risk) -> RiskProbability:
     # Default is_risky to whatever the Granite Guardian model says
     is_risky = (label == "yes")
 
@@ -109,6 +228,126 @@ def parse_output(response: ChatCompletion, risk: Risk) -> RiskProbability:
     )
 
 
+# Label kind of a raw token, memoised so each distinct token is only normalised once
+_OTHER, _SAFE, _RISKY = 0, 1, 2
+_MAX_LABEL_KINDS = 65536
+_label_kinds: dict[str, int] = {
+    variant: kind
+    for word, kind in (("no", _SAFE), ("yes", _RISKY))
+    for variant in (word, word.capitalize(), word.upper(), " " + word, " " + word.capitalize(), " " + word.upper())
+}
+
+
+def _label_kind(token: str) -> int:
+    kind = _label_kinds.get(token)
+    if kind is None:
+        normalized = token.strip().lower()
+        kind = _SAFE if normalized == "no" else _RISKY if normalized == "yes" else _OTHER
+        if len(_label_kinds) < _MAX_LABEL_KINDS:
+            _label_kinds[token] = kind
+    return kind
+
+
+class LabelScore:
+    """
+    Lightweight result of the fast path parser: Granite Guardian's label and the probability mass
+    on the safe and risky label tokens of its first generated token. Turned into a RiskProbability
+    with to_verdict.
+    """
+
+    __slots__ = ("label", "safe_mass", "risky_mass")
+
+    def __init__(self, label: str, safe_mass: float | None = None, risky_mass: float | None = None):
+        self.label = label
+        self.safe_mass = safe_mass
+        self.risky_mass = risky_mass
+
+    def to_verdict(self, risk: Risk) -> RiskProbability:
+        """
+        Same verdict _risk_probability builds, constructed without running pydantic validation.
+        """
+        p_safe = p_risky = None
+        if self.safe_mass is not None and self.risky_mass is not None:
+            total = self.safe_mass + self.risky_mass
+            # Rounded like the RiskProbability validators
+            p_safe = round(self.safe_mass / total, 4)
+            p_risky = round(self.risky_mass / total, 4)
+
+        is_risky = (self.label == "yes")
+        if risk.violation_threshold and p_risky:
+            is_risky = (p_risky >= risk.violation_threshold)
+
+        return RiskProbability.model_construct(
+            is_risky=is_risky,
+            safe_confidence=p_safe,
+            risky_confidence=p_risky,
+            risk_name=risk.name,
+            risk_definition=risk.definition,
+            violation_level=risk.violation_level,
+        )
+
+
+def parse_raw_output(body: dict) -> LabelScore:
+    """
+    Fast path alternative to parse_output that reads the decoded JSON body of a chat completion
+    directly. Only the top logprobs of the first generated token are read, which is where Granite
+    Guardian puts its one token answer.
+    """
+    choice = body["choices"][0]
+    label = (choice["message"].get("content") or "").strip().lower()
+    logprobs = choice.get("logprobs")
+    if not logprobs or not logprobs.get("content"):
+        return LabelScore(label)
+
+    safe_mass = 1e-50  # Essentially zero, like _log_masses_from_steps
+    risky_mass = 1e-50
+    for alternative in logprobs["content"][0]["top_logprobs"]:
+        kind = _label_kind(alternative["token"])
+        if kind == _SAFE:
+            safe_mass += math.exp(alternative["logprob"])
+        elif kind == _RISKY:
+            risky_mass += math.exp(alternative["logprob"])
+    return LabelScore(label, safe_mass, risky_mass)
+
+
+def failure_verdict(risk: Risk, policy: FailurePolicy, reason: str) -> RiskProbability:
+    """
+    Build the verdict for a risk check that could not be sent to Granite Guardian.
+    Fail closed treats the message as risky, fail open treats it as safe.
+    """
+    return RiskProbability(
+        is_risky=(policy == FailurePolicy.closed),
+        safe_confidence=None,
+        risky_confidence=None,
+        risk_name=risk.name,
+        risk_definition=risk.definition,
+        violation_level=risk.violation_level,
+        degraded_reason=reason,
+    )
+
+
+def riskiest_verdict(verdicts: list[RiskProbability]) -> RiskProbability:
+    """
+    Pick the verdict with the strongest risk signal: risky verdicts first, then the highest risky confidence.
+    """
+    return max(verdicts, key=lambda v: (v.is_risky, v.risky_confidence or 0.0))
+
+
+def reduce_confidences(confidences: list[float], reducer: ChunkReducer) -> float:
+    """
+    Combine per-chunk risky confidences into the risky confidence of the whole message.
+    """
+    if reducer == ChunkReducer.max:
+        return max(confidences)
+    if reducer == ChunkReducer.mean:
+        return sum(confidences) / len(confidences)
+
+    p_all_safe = 1.0
+    for p in confidences:
+        p_all_safe *= 1.0 - p
+    return 1.0 - p_all_safe
+
+
 _level_order = {
     ViolationLevel.INFO: 1,
     ViolationLevel.WARN: 2,
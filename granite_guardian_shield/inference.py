@@ -1,7 +1,18 @@
-from typing import Generator
+import asyncio
+import hashlib
+import json
+import math
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Generator, Iterator, TypeVar
+
 from llama_stack.log import get_logger
-from openai import AsyncOpenAI
+from openai import (NOT_GIVEN, APIConnectionError, AsyncOpenAI,
+                    InternalServerError, RateLimitError)
 from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.completion import Completion
 from llama_stack.apis.inference import Message
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
 from openai.types.chat.chat_completion_tool_message_param import (
@@ -15,14 +26,27 @@ from openai.types.chat.chat_completion_assistant_message_param import (
 )
 
 
-from granite_guardian_shield.constants import RISK_NAME, RISK_DEFINITION
+from granite_guardian_shield.constants import RISK_NAME, RISK_DEFINITION, ScoringMode
 from granite_guardian_shield.config import Risk
-from granite_guardian_shield.helpers import parse_output
+from granite_guardian_shield.helpers import (PROMPT_ANSWER,
+                                             get_label_log_masses,
+                                             get_prompt_label_log_masses,
+                                             parse_output,
+                                             parse_prompt_logprobs_output,
+                                             parse_raw_output)
+from granite_guardian_shield.logprob_store import LogprobStore
 from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.singleflight import SingleFlight
+from granite_guardian_shield.telemetry import Phase, phase_timings
 from abc import ABC, abstractmethod
 
+if TYPE_CHECKING:
+    from granite_guardian_shield.prompt import GuardianPromptRenderer
+
 logger = get_logger(name=__name__, category="safety")
 
+T = TypeVar("T")
+
 # NOTE
 # NOTE This package should be deleted and replaced with Llama Stack inference when this issue is resolved
 # NOTE https://github.com/meta-llama/llama-stack/issues/2720
@@ -34,49 +58,322 @@ class Inference(ABC):
     async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
         pass
 
+    async def initialize(self) -> None:
+        """
+        Called once when the provider starts.
+        """
+
+    async def shutdown(self) -> None:
+        """
+        Called once when the provider stops. Release connections and background tasks here.
+        """
+
+
+# Conversions and request keys shared by the risk checks of the shield call in progress, see conversion_scope
+_call_memo: ContextVar[dict[tuple, tuple] | None] = ContextVar("granite_guardian_call_memo", default=None)
+
+
+@contextmanager
+def conversion_scope() -> Iterator[None]:
+    """
+    Convert each message and compute each request key only once across the risk checks of a
+    shield call. Tasks started inside the scope share it.
+    """
+    token = _call_memo.set({})
+    try:
+        yield
+    finally:
+        _call_memo.reset(token)
+
+
+def _convert_message(message: Message) -> ChatCompletionMessageParam | None:
+    if message.role == "user":
+        return ChatCompletionUserMessageParam(
+            content=str(message.content), role=message.role
+        )
+    elif message.role == "assistant":
+        return ChatCompletionAssistantMessageParam(
+            content=str(message.content), role=message.role
+        )
+    elif message.role == "tool":
+        return ChatCompletionToolMessageParam(
+            content=str(message.content),
+            role=message.role,
+            tool_call_id=message.call_id,
+        )
+    elif message.role in ("context", "tools"):
+        # Granite Guardian chat template roles, see context.ContextMessage
+        return {"content": str(message.content), "role": message.role}
+    else:
+        logger.warning(f"Unknown role {message.role}")
+        return None
+
+
+def convert_messages(
+    messages: list[Message],
+) -> Generator[ChatCompletionMessageParam, None, None]:
+    """
+    Convert Llama Stack messages into OpenAI chat completion messages. Converted messages are
+    shared within a conversion_scope and must not be modified.
+    """
+    memo = _call_memo.get()
+    for message in messages:
+        if memo is None:
+            converted = _convert_message(message)
+        else:
+            # The message is kept in the memo so its id can't be reused by another during the scope
+            entry = memo.get((id(message),))
+            if entry is None:
+                entry = memo[(id(message),)] = (message, _convert_message(message))
+            converted = entry[1]
+        if converted is not None:
+            yield converted
+
+
+def scoped(key: tuple, anchor: object, compute: Callable[[], T]) -> T:
+    """
+    Compute a value once per conversion_scope, or on every call outside of one. `anchor` is kept
+    for the scope so ids in `key` can't be reused by other objects during it.
+    """
+    memo = _call_memo.get()
+    if memo is None:
+        return compute()
+    entry = memo.get(key)
+    if entry is None:
+        entry = memo[key] = (anchor, compute())
+    return entry[-1]
+
+
+@lru_cache(maxsize=1024)
+def guardian_config(risk: Risk) -> dict[str, str]:
+    """
+    Build the `guardian_config` chat template argument for a risk. Shared between calls, must not
+    be modified.
+    """
+    config = {RISK_NAME: risk.name}
+    if risk.definition:
+        config[RISK_DEFINITION] = risk.definition
+    return config
+
+
+@lru_cache(maxsize=1024)
+def extra_body(risk: Risk) -> dict:
+    """
+    Build the vLLM `extra_body` of a chat completion request for a risk. Shared between calls,
+    must not be modified.
+    """
+    return {"chat_template_kwargs": {"guardian_config": guardian_config(risk)}}
+
+
+def request_key(risk: Risk, messages: list[Message]) -> str:
+    """
+    Build a stable key for a Granite Guardian request from the risk configuration and the
+    converted OpenAI messages. Two requests with the same key produce the same verdict.
+    """
+    memo = _call_memo.get()
+    if memo is not None:
+        memo_key = (id(risk), *map(id, messages))
+        entry = memo.get(memo_key)
+        if entry is not None:
+            return entry[-1]
+
+    payload = {
+        "risk": [risk.name, risk.definition, risk.violation_threshold, risk.violation_level],
+        "messages": list(convert_messages(messages)),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    key = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    if memo is not None:
+        memo[memo_key] = (risk, messages, key)
+    return key
+
+
+# Errors worth retrying: the request may succeed on another attempt
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
 
 class GraniteGuardianVLLMInference(Inference):
-    def __init__(self, openai_client: AsyncOpenAI, model: str):
+    def __init__(
+        self,
+        openai_client: AsyncOpenAI,
+        model: str,
+        max_retries: int = 0,
+        retry_backoff_seconds: float = 0.25,
+        retry_backoff_max_seconds: float = 4.0,
+        timeout_seconds: float | None = None,
+        warmup_connections: int = 0,
+        payload_sample_rate: float = 0.0,
+        logprob_store: LogprobStore | None = None,
+        fast_parse: bool = False,
+        scoring_mode: ScoringMode = ScoringMode.generate,
+        renderer: "GuardianPromptRenderer | None" = None,
+    ):
+        if scoring_mode == ScoringMode.prompt_logprobs and renderer is None:
+            raise ValueError("prompt_logprobs scoring requires a prompt renderer")
         self.openai_client = openai_client
         self.model = model
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.retry_backoff_max_seconds = retry_backoff_max_seconds
+        self.timeout_seconds = timeout_seconds
+        self.warmup_connections = warmup_connections
+        self.payload_sample_rate = payload_sample_rate
+        self.logprob_store = logprob_store
+        self.fast_parse = fast_parse
+        self.scoring_mode = scoring_mode
+        self.renderer = renderer
+        # Only the label token is read, so label_token mode doesn't let the model generate more
+        self.max_tokens = 1 if scoring_mode == ScoringMode.label_token else NOT_GIVEN
+        self._single_flight: SingleFlight[RiskProbability] = SingleFlight()
 
-    def _convert_messages(
-        self, messages: list[Message]
-    ) -> Generator[ChatCompletionMessageParam, None, None]:
-        for message in messages:
-            if message.role == "user":
-                yield ChatCompletionUserMessageParam(
-                    content=str(message.content), role=message.role
-                )
-            elif message.role == "assistant":
-                yield ChatCompletionAssistantMessageParam(
-                    content=str(message.content), role=message.role
-                )
-            elif message.role == "tool":
-                yield ChatCompletionToolMessageParam(
-                    content=str(message.content),
-                    role=message.role,
-                    tool_call_id="ABCDEF1234",
-                )
-            else:
-                logger.warning(f"Unknown role {message.role}")
+    async def initialize(self) -> None:
+        if not self.warmup_connections:
+            return
 
-    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
-        guardian_config = {RISK_NAME: risk.name}
-        if risk.definition:
-            guardian_config[RISK_DEFINITION] = risk.definition
-
-        openai_messages = self._convert_messages(messages)
-        response: ChatCompletion = await self.openai_client.chat.completions.create(
-            model=self.model,
-            temperature=0.0,
-            logprobs=True,
-            top_logprobs=20,
-            # TODO This seems to be broke for the output checks like relevance. Do I need to summarize user inputs before checking relevance? Maybe just don't care right now?
-            # TODO Make this handle System, User, or Context type messages
-            messages=openai_messages,
-            extra_body={"chat_template_kwargs": {"guardian_config": guardian_config}},
+        # Open connections up front so the first shield calls don't pay for TCP and TLS setup
+        results = await asyncio.gather(
+            *(self.openai_client.models.list() for _ in range(self.warmup_connections)),
+            return_exceptions=True,
         )
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if failures:
+            logger.warning(f"Granite Guardian connection warm-up failed: {failures[0]}")
+
+    async def shutdown(self) -> None:
+        await self.openai_client.close()
+        if self.logprob_store is not None:
+            self.logprob_store.close()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        # Identical checks already in flight share a single Granite Guardian call
+        key = request_key(risk, messages)
+        return await self._single_flight.do(key, lambda: self._run(risk, messages, key))
+
+    async def _run(self, risk: Risk, messages: list[Message], key: str) -> RiskProbability:
+        async with asyncio.timeout(self.timeout_seconds):
+            attempt = 0
+            while True:
+                try:
+                    verdict = await self._create(risk, messages)
+                    verdict.request_key = key
+                    return verdict
+                except RETRYABLE_ERRORS as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = min(self.retry_backoff_seconds * 2 ** attempt, self.retry_backoff_max_seconds)
+                    attempt += 1
+                    logger.warning(f"Granite Guardian call failed, retry {attempt}/{self.max_retries} in {delay:.2f}s: {e}")
+                    # Full jitter keeps retries from many callers from arriving in lockstep
+                    await asyncio.sleep(random.uniform(0, delay))
+
+    async def _create(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        if self.scoring_mode == ScoringMode.prompt_logprobs:
+            return await self._score_prompt(risk, messages)
+
+        with phase_timings.time(Phase.convert, risk.name):
+            openai_messages = list(convert_messages(messages))
+        if self.fast_parse:
+            return await self._create_raw(risk, messages, openai_messages, extra_body(risk))
+
+        with phase_timings.time(Phase.http, risk.name):
+            response: ChatCompletion = await self.openai_client.chat.completions.create(
+                model=self.model,
+                temperature=0.0,
+                logprobs=True,
+                top_logprobs=20,
+                max_tokens=self.max_tokens,
+                # TODO This seems to be broke for the output checks like relevance. Do I need to summarize user inputs before checking relevance? Maybe just don't care right now?
+                # TODO Make this handle System, User, or Context type messages
+                messages=openai_messages,
+                extra_body=extra_body(risk),
+            )
+
+        # Full payloads are large, only log a sample of them
+        if self.payload_sample_rate and random.random() < self.payload_sample_rate:
+            logger.info(f"Granite Guardian payload sample: messages={openai_messages} extra_body={extra_body(risk)} response={response.model_dump_json()}")
+
+        with phase_timings.time(Phase.parse, risk.name):
+            verdict = parse_output(response, risk)
+        if self.logprob_store is not None:
+            try:
+                log_masses = get_label_log_masses(response.choices[0].logprobs)
+            except ValueError:
+                pass  # Nothing to store for a response without logprobs
+            else:
+                self.logprob_store.append(request_key(risk, messages), risk.name, *log_masses)
+        if response.usage:
+            verdict.prompt_tokens = response.usage.prompt_tokens
+            verdict.completion_tokens = response.usage.completion_tokens
+        return verdict
+
+    async def _create_raw(
+        self,
+        risk: Risk,
+        messages: list[Message],
+        openai_messages: list[ChatCompletionMessageParam],
+        request_body: dict,
+    ) -> RiskProbability:
+        """
+        Fast path of _create that decodes the raw JSON response and reads only what a verdict needs,
+        skipping construction of the OpenAI response models.
+        """
+        with phase_timings.time(Phase.http, risk.name):
+            raw = await self.openai_client.chat.completions.with_raw_response.create(
+                model=self.model,
+                temperature=0.0,
+                logprobs=True,
+                top_logprobs=20,
+                max_tokens=self.max_tokens,
+                messages=openai_messages,
+                extra_body=request_body,
+            )
+
+        if self.payload_sample_rate and random.random() < self.payload_sample_rate:
+            logger.info(f"Granite Guardian payload sample: messages={openai_messages} extra_body={request_body} response={raw.text}")
+
+        with phase_timings.time(Phase.parse, risk.name):
+            body = json.loads(raw.content)
+            score = parse_raw_output(body)
+            verdict = score.to_verdict(risk)
+        if self.logprob_store is not None and score.safe_mass is not None:
+            self.logprob_store.append(
+                request_key(risk, messages), risk.name, math.log(score.safe_mass), math.log(score.risky_mass)
+            )
+        usage = body.get("usage")
+        if usage:
+            verdict.prompt_tokens = usage.get("prompt_tokens")
+            verdict.completion_tokens = usage.get("completion_tokens")
+        return verdict
+
+    async def _score_prompt(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        """
+        Score the label without generating: render the Granite Guardian prompt locally, append a
+        candidate answer and read the alternatives vLLM considered at that position from the echoed
+        prompt logprobs.
+        """
+        with phase_timings.time(Phase.convert, risk.name):
+            prompt = self.renderer.render(risk, messages)
+
+        with phase_timings.time(Phase.http, risk.name):
+            response: Completion = await self.openai_client.completions.create(
+                model=self.model,
+                prompt=prompt + PROMPT_ANSWER,
+                temperature=0.0,
+                echo=True,
+                logprobs=20,
+                max_tokens=0,
+            )
+
+        if self.payload_sample_rate and random.random() < self.payload_sample_rate:
+            logger.info(f"Granite Guardian payload sample: prompt={prompt!r} response={response.model_dump_json()}")
 
-        logger.debug(response)
-        return parse_output(response, risk)
+        with phase_timings.time(Phase.parse, risk.name):
+            verdict = parse_prompt_logprobs_output(response.choices[0], risk)
+        if self.logprob_store is not None:
+            # Parsing succeeded, so the echoed prompt has the answer position's alternatives
+            log_masses = get_prompt_label_log_masses(response.choices[0].logprobs)
+            self.logprob_store.append(request_key(risk, messages), risk.name, *log_masses)
+        if response.usage:
+            verdict.prompt_tokens = response.usage.prompt_tokens
+            verdict.completion_tokens = response.usage.completion_tokens
+        return verdict
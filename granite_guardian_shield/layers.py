@@ -0,0 +1,28 @@
+from granite_guardian_shield.admission import AdaptiveLimit, AdmissionController
+from granite_guardian_shield.balancer import BalancedInference
+from granite_guardian_shield.breaker import CircuitBreaker
+from granite_guardian_shield.cache import VerdictCache
+
+
+class InferenceLayers:
+    """
+    Layers of a Granite Guardian inference chain that keep statistics, kept by create_inference so
+    the shield can report them without walking the chain. Layers the config doesn't enable are None.
+    """
+
+    __slots__ = ("admission", "cache", "breaker", "balancer", "adaptive_limits")
+
+    def __init__(
+        self,
+        admission: AdmissionController | None = None,
+        cache: VerdictCache | None = None,
+        breaker: CircuitBreaker | None = None,
+        balancer: BalancedInference | None = None,
+        adaptive_limits: list[AdaptiveLimit] | None = None,
+    ):
+        self.admission = admission
+        self.cache = cache
+        self.breaker = breaker
+        self.balancer = balancer
+        # One per endpoint when adaptive_concurrency is set
+        self.adaptive_limits = adaptive_limits or []
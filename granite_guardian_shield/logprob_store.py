@@ -0,0 +1,39 @@
+import struct
+from pathlib import Path
+
+from llama_stack.log import get_logger
+
+logger = get_logger(name=__name__, category="safety")
+
+# Request key digest, risk name (UTF-8, NUL padded), log safe mass, log risky mass
+RECORD = struct.Struct("<32s32sdd")
+
+
+class LogprobStore:
+    """
+    Append-only file of the raw label log masses behind each Granite Guardian verdict, one fixed
+    size record per scored request keyed by its request hash. Verdicts can be recomputed for any
+    violation threshold from this file without calling Granite Guardian again, see threshold_sweep.
+
+    Records are buffered and written in order. A record cut short by a crash is ignored on read.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._file = open(self.path, "ab")
+        self.records = 0
+
+    def append(self, key: str, risk_name: str, log_safe: float, log_risky: float) -> None:
+        """
+        Record the label log masses of the request with `key`, a request_key hex digest.
+        """
+        self._file.write(RECORD.pack(bytes.fromhex(key), risk_name.encode("utf-8")[:32], log_safe, log_risky))
+        self.records += 1
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f"Stored label logprobs of {self.records} requests in {self.path}")
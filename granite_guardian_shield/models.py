@@ -2,6 +2,19 @@ from llama_stack.apis.safety import ViolationLevel
 from pydantic import BaseModel, Field, field_validator
 
 
+class ChunkScore(BaseModel):
+    """
+    Score of one chunk of a message that was split for chunked scoring.
+    """
+
+    index: int = Field(description="Position of the chunk in the message")
+    is_risky: bool = Field(description="Whether this chunk alone was considered risky")
+    risky_confidence: float | None = Field(
+        default=None, description="Probability that this chunk is risky, if available"
+    )
+    latency_ms: float = Field(description="Time taken to score this chunk, in milliseconds")
+
+
 class RiskProbability(BaseModel):
     """
     Model representing the risk output from Granite Guardian.
@@ -26,6 +39,42 @@ class RiskProbability(BaseModel):
         default=ViolationLevel.ERROR,
         description="The violation level for this risk. Only error level violations will be raised in API responses."
     )
+    input_tokens: int | None = Field(
+        default=None,
+        description="Message tokens before token budget truncation, if a token budget is configured",
+    )
+    sent_tokens: int | None = Field(
+        default=None,
+        description="Message tokens sent to Granite Guardian after truncation, summed over windows",
+    )
+    prompt_tokens: int | None = Field(
+        default=None,
+        description="Granite Guardian prompt tokens, as reported by the endpoint or counted locally, summed over windows",
+    )
+    completion_tokens: int | None = Field(
+        default=None,
+        description="Tokens generated by Granite Guardian, as reported by the endpoint",
+    )
+    windows: int | None = Field(
+        default=None,
+        description="Number of sliding windows scored, if the message was split",
+    )
+    chunks: list[ChunkScore] | None = Field(
+        default=None,
+        description="Per-chunk scores, if the message was scored in chunks. Chunks cancelled by an early stop are not listed",
+    )
+    degraded_reason: str | None = Field(
+        default=None,
+        description="Why this verdict was decided by a failure policy instead of Granite Guardian, if it was",
+    )
+    screened_by: str | None = Field(
+        default=None,
+        description="Pre-screens that found the message safe without asking Granite Guardian, if any did",
+    )
+    request_key: str | None = Field(
+        default=None,
+        description="request_key of the Granite Guardian request the verdict was scored from, after windowing and truncation, as written to the logprob store. The riskiest window's if the message was split. None if Granite Guardian wasn't asked",
+    )
 
     @field_validator("safe_confidence")
     @classmethod
@@ -0,0 +1,46 @@
+from types import MappingProxyType
+
+from llama_stack.apis.inference import Message
+
+from granite_guardian_shield.admission import AdmissionController
+from granite_guardian_shield.config import ShieldParams
+from granite_guardian_shield.constants import MessageRole
+from granite_guardian_shield.risk_assessor import RiskAssessor
+
+
+def applies_to(assessor: RiskAssessor, role: MessageRole) -> bool:
+    """
+    Whether `assessor` checks last messages with `role`, as limited by its risk's roles setting.
+    """
+    return role in assessor.roles and (assessor.risk.roles is None or role in assessor.risk.roles)
+
+
+class ShieldPlan:
+    """
+    What run_shield needs for one shield, compiled when the shield is registered: its settings, its
+    concurrency limit if it has one and, for each message role, the assessors that apply in
+    registration order. A risk that doesn't apply to a role costs nothing for messages with that
+    role. Plans are never modified, registering the shield again replaces its plan.
+    """
+
+    __slots__ = ("params", "short_circuit", "assessors", "admission", "_by_role")
+
+    def __init__(
+        self,
+        params: ShieldParams,
+        assessors: list[RiskAssessor],
+        admission: AdmissionController | None = None,
+    ):
+        self.params = params
+        self.short_circuit = params.short_circuit
+        self.assessors = tuple(assessors)
+        self.admission = admission
+        self._by_role = MappingProxyType({
+            role: tuple(assessor for assessor in assessors if applies_to(assessor, role)) for role in MessageRole
+        })
+
+    def assessors_for(self, message: Message) -> tuple[RiskAssessor, ...] | None:
+        """
+        Assessors that check `message`, or None if shields don't check messages with its role.
+        """
+        return self._by_role.get(message.role)
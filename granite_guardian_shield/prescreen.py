@@ -0,0 +1,321 @@
+import argparse
+import json
+import math
+import random
+import re
+import time
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from pathlib import Path
+
+from llama_stack.log import get_logger
+from pydantic import BaseModel, Field
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import HallucinationRisk
+
+logger = get_logger(name=__name__, category="safety")
+
+_TOKEN = re.compile(r"\w+")
+
+
+class PreScreenStats(BaseModel):
+    """
+    Counters describing how often a pre-screen answered without Granite Guardian.
+    """
+
+    screened: int = Field(default=0, description="Messages found safe by the pre-screen")
+    escalated: int = Field(default=0, description="Messages passed on to Granite Guardian")
+
+
+class PreScreen(ABC):
+    """
+    Cheap local check run before Granite Guardian. It either finds a message confidently safe or
+    escalates it to Granite Guardian; it never flags a message as risky on its own.
+    """
+
+    name: str
+
+    @abstractmethod
+    def risky_probability(self, text: str) -> float | None:
+        """
+        Risky probability of `text` if the pre-screen finds it safe, otherwise None to escalate.
+        A pre-screen without probabilities returns 0.0 for safe text.
+        """
+        ...
+
+
+class KeywordPreScreen(PreScreen):
+    """
+    Finds text safe when it contains none of `terms`, matched case-insensitively anywhere in the
+    text. Terms are compiled into an Aho-Corasick automaton so a message is scanned once however
+    many terms there are.
+    """
+
+    name = "keywords"
+
+    def __init__(self, terms: list[str]):
+        self.terms = [term.lower() for term in terms if term.strip()]
+        if not self.terms:
+            raise ValueError("KeywordPreScreen requires at least one non-empty term")
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._match: list[bool] = [False]
+        for term in self.terms:
+            node = 0
+            for char in term:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._match.append(False)
+                node = nxt
+            self._match[node] = True
+
+        # Breadth first, so a node's failure link is final before its children need it
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._match[child] = self._match[child] or self._match[self._fail[child]]
+
+    def find(self, text: str) -> bool:
+        """
+        Whether any term occurs in `text`.
+        """
+        goto, fail, match = self._goto, self._fail, self._match
+        node = 0
+        for char in text.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if match[node]:
+                return True
+        return False
+
+    def risky_probability(self, text: str) -> float | None:
+        return None if self.find(text) else 0.0
+
+
+class LinearPreScreen(PreScreen):
+    """
+    Logistic regression over hashed word unigrams and bigrams. Text whose risky probability is
+    below `safe_threshold` is found safe, for the `risks` the model was trained on only. Trained and
+    calibrated with granite-guardian-prescreen.
+    """
+
+    name = "linear"
+
+    def __init__(
+        self,
+        weights: array,
+        bias: float,
+        risks: list[str],
+        safe_threshold: float = 0.01,
+    ):
+        self.weights = weights
+        self.buckets = len(weights)
+        self.bias = bias
+        self.safe_threshold = safe_threshold
+        self.risks = risks
+
+    @classmethod
+    def load(cls, path: str | Path, safe_threshold: float = 0.01) -> "LinearPreScreen":
+        model = json.loads(Path(path).read_text())
+        weights = array("d", bytes(8 * model["buckets"]))
+        if not model.get("risks"):
+            raise ValueError(f"Pre-screen model {path} doesn't list the risks it was trained on, train it again with --risk")
+        for bucket, weight in model["weights"].items():
+            weights[int(bucket)] = weight
+        return cls(weights, model["bias"], model["risks"], safe_threshold)
+
+    def save(self, path: str | Path) -> None:
+        model = {
+            "buckets": self.buckets,
+            "bias": self.bias,
+            "risks": self.risks,
+            # Most buckets are never seen in training, only store the others
+            "weights": {str(i): w for i, w in enumerate(self.weights) if w},
+        }
+        Path(path).write_text(json.dumps(model))
+
+    def covers(self, risk: Risk) -> bool:
+        """
+        Whether the model was trained for this risk. Hallucination risks depend on more than one
+        message and are never pre-screened by a model.
+        """
+        if risk.name in HallucinationRisk.__members__:
+            return False
+        return risk.name in self.risks
+
+    def features(self, text: str) -> set[int]:
+        tokens = _TOKEN.findall(text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return {zlib.crc32(gram.encode("utf-8")) % self.buckets for gram in grams}
+
+    def probability(self, text: str) -> float:
+        weights = self.weights
+        z = self.bias + sum(weights[f] for f in self.features(text))
+        # Numerically stable logistic
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1.0 + e)
+
+    def risky_probability(self, text: str) -> float | None:
+        p_risky = self.probability(text)
+        return p_risky if p_risky < self.safe_threshold else None
+
+
+def train_linear(
+    examples: list[tuple[str, bool]],
+    risks: list[str],
+    buckets: int = 2 ** 18,
+    epochs: int = 5,
+    learning_rate: float = 0.1,
+    l2: float = 1e-6,
+) -> LinearPreScreen:
+    """
+    Fit a LinearPreScreen for `risks` on (text, is_risky) examples with stochastic gradient descent.
+    """
+    if not risks:
+        raise ValueError("A pre-screen model must be trained for at least one risk")
+    model = LinearPreScreen(array("d", bytes(8 * buckets)), 0.0, risks)
+    featurized = [(model.features(text), 1.0 if label else 0.0) for text, label in examples]
+    weights = model.weights
+    shuffle = random.Random(0).shuffle
+    started = time.perf_counter()
+    for epoch in range(epochs):
+        shuffle(featurized)
+        loss = 0.0
+        for features, label in featurized:
+            z = model.bias + sum(weights[f] for f in features)
+            p = 1.0 / (1.0 + math.exp(-max(min(z, 35.0), -35.0)))
+            loss -= math.log(max(p if label else 1.0 - p, 1e-12))
+            gradient = p - label
+            for f in features:
+                weights[f] -= learning_rate * (gradient + l2 * weights[f])
+            model.bias -= learning_rate * gradient
+        logger.info(f"Epoch {epoch + 1}/{epochs} log loss {loss / max(len(featurized), 1):.4f}")
+    logger.info(f"Trained pre-screen on {len(featurized)} examples in {time.perf_counter() - started:.1f}s")
+    return model
+
+
+class CalibrationMetrics(BaseModel):
+    """
+    Granite Guardian calls a pre-screen would save on a labelled dataset, and risky messages it would miss.
+    """
+
+    threshold: float | None = Field(default=None, description="Model safe threshold, None for keywords only")
+    screened: int = Field(description="Messages found safe without Granite Guardian")
+    saved_rate: float = Field(description="Fraction of Granite Guardian calls saved")
+    missed: int = Field(description="Messages labelled risky that were found safe")
+    miss_rate: float = Field(description="Fraction of risky messages found safe")
+
+
+def calibrate(
+    probabilities: list[float | None],
+    labels: list[bool],
+    thresholds: list[float | None],
+) -> list[CalibrationMetrics]:
+    """
+    Calibration metrics for every threshold given the risky probability each message got from the
+    pre-screen, None for escalated messages. A message is screened when its probability is below
+    the threshold; a None threshold screens every message that wasn't escalated.
+    """
+    total = len(labels)
+    risky = sum(labels)
+    metrics = []
+    for threshold in thresholds:
+        screened = missed = 0
+        for p, label in zip(probabilities, labels):
+            if p is not None and (threshold is None or p < threshold):
+                screened += 1
+                missed += label
+        metrics.append(CalibrationMetrics(
+            threshold=threshold,
+            screened=screened,
+            saved_rate=screened / total if total else 0.0,
+            missed=missed,
+            miss_rate=missed / risky if risky else 0.0,
+        ))
+    return metrics
+
+
+def load_examples(path: str | Path) -> list[tuple[str, bool]]:
+    """
+    Read labelled messages from JSONL, one {"text": ..., "label": true|false} or
+    {"messages": [...], "label": ...} per line. For conversations the last message is used.
+    """
+    examples = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            text = row["text"] if "text" in row else row["messages"][-1]["content"]
+            examples.append((str(text), bool(row["label"])))
+    return examples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Train a hashed n-gram pre-screen model, or measure on a labelled dataset how many "
+        "Granite Guardian calls a pre-screen saves and how many risky messages it misses.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="Fit a pre-screen model on labelled messages")
+    train.add_argument("dataset", help='JSONL of {"text" or "messages": ..., "label": true|false}')
+    train.add_argument("--output", required=True, help="Model file for the prescreen_model_path setting")
+    train.add_argument("--risk", action="append", required=True, help="Risk the model screens, repeatable. Other risks always go to Granite Guardian")
+    train.add_argument("--buckets", type=int, default=2 ** 18, help="Hashed feature buckets")
+    train.add_argument("--epochs", type=int, default=5, help="Passes over the dataset")
+    train.add_argument("--learning-rate", type=float, default=0.1, help="SGD step size")
+    calibration = commands.add_parser("calibrate", help="Report calls saved and risky messages missed")
+    calibration.add_argument("dataset", help='JSONL of {"text" or "messages": ..., "label": true|false}')
+    calibration.add_argument("--model", help="Pre-screen model file")
+    calibration.add_argument("--keywords", help="File with one prescreen_keywords term per line")
+    calibration.add_argument("--thresholds", help="Comma separated model safe thresholds, defaults to 0.001 to 0.5")
+    calibration.add_argument("--json", action="store_true", help="Print metrics as JSON lines")
+    args = parser.parse_args()
+
+    examples = load_examples(args.dataset)
+    if args.command == "train":
+        model = train_linear(examples, args.risk, buckets=args.buckets, epochs=args.epochs, learning_rate=args.learning_rate)
+        model.save(args.output)
+        return
+
+    if not (args.model or args.keywords):
+        parser.error("calibrate needs --model, --keywords or both")
+    keywords = KeywordPreScreen(Path(args.keywords).read_text().splitlines()) if args.keywords else None
+    model = LinearPreScreen.load(args.model) if args.model else None
+    probabilities: list[float | None] = []
+    for text, _ in examples:
+        if keywords is not None and keywords.find(text):
+            probabilities.append(None)
+        else:
+            probabilities.append(model.probability(text) if model is not None else 0.0)
+
+    thresholds: list[float | None] = [None]
+    if model is not None:
+        thresholds = [float(t) for t in args.thresholds.split(",")] if args.thresholds else [0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5]
+    metrics = calibrate(probabilities, [label for _, label in examples], thresholds)
+    if args.json:
+        for m in metrics:
+            print(m.model_dump_json())
+        return
+
+    print(f"{len(examples)} messages, {sum(label for _, label in examples)} labelled risky")
+    print(f"{'threshold':>9} {'screened':>9} {'saved':>7} {'missed':>7} {'miss rate':>9}")
+    for m in metrics:
+        threshold = f"{m.threshold:>9.3f}" if m.threshold is not None else f"{'-':>9}"
+        print(f"{threshold} {m.screened:>9} {m.saved_rate:>7.3f} {m.missed:>7} {m.miss_rate:>9.3f}")
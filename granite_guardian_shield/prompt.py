@@ -0,0 +1,134 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from jinja2.exceptions import TemplateError
+from jinja2.ext import loopcontrols
+from jinja2.sandbox import ImmutableSandboxedEnvironment
+from llama_stack.apis.inference import Message
+
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.inference import convert_messages, guardian_config
+
+
+def _raise_exception(message: str) -> None:
+    raise TemplateError(message)
+
+
+def _strftime_now(format: str) -> str:
+    return datetime.now().strftime(format)
+
+
+class GuardianPromptRenderer:
+    """
+    Renders Granite Guardian prompts locally from the model's Jinja chat template, the same way
+    vLLM does before running the model. This lets us send pre-rendered prompts through the
+    /v1/completions API.
+    """
+
+    def __init__(self, chat_template: str, bos_token: str = "", eos_token: str = "", tokenizer: Any = None):
+        environment = ImmutableSandboxedEnvironment(
+            trim_blocks=True, lstrip_blocks=True, extensions=[loopcontrols]
+        )
+        environment.globals["raise_exception"] = _raise_exception
+        environment.globals["strftime_now"] = _strftime_now
+        self.template = environment.from_string(chat_template)
+        self.bos_token = bos_token
+        self.eos_token = eos_token
+        self.tokenizer = tokenizer
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "GuardianPromptRenderer":
+        return cls(Path(path).read_text(encoding="utf-8"))
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer: Any) -> "GuardianPromptRenderer":
+        """
+        Use the chat template and special tokens of a Hugging Face tokenizer.
+        """
+        if not tokenizer.chat_template:
+            raise ValueError(f"Tokenizer {tokenizer.name_or_path} does not define a chat template")
+        return cls(
+            tokenizer.chat_template,
+            bos_token=tokenizer.bos_token or "",
+            eos_token=tokenizer.eos_token or "",
+            tokenizer=tokenizer,
+        )
+
+    @classmethod
+    def from_pretrained(cls, name_or_path: str) -> "GuardianPromptRenderer":
+        return cls.from_tokenizer(load_tokenizer(name_or_path))
+
+    def render(self, risk: Risk, messages: list[Message]) -> str:
+        return self.template.render(
+            messages=list(convert_messages(messages)),
+            guardian_config=guardian_config(risk),
+            add_generation_prompt=True,
+            bos_token=self.bos_token,
+            eos_token=self.eos_token,
+        )
+
+
+def load_tokenizer(name_or_path: str) -> Any:
+    """
+    Load a Hugging Face tokenizer. Requires the optional `transformers` dependency.
+    """
+    try:
+        from transformers import AutoTokenizer
+    except ImportError as e:
+        raise ImportError(
+            "Loading a Granite Guardian tokenizer requires transformers. "
+            "Install granite_guardian_llama_stack_shield[tokenizer]."
+        ) from e
+
+    return AutoTokenizer.from_pretrained(name_or_path)
+
+
+def common_prefix_length(left: str, right: str) -> int:
+    length = min(len(left), len(right))
+    for i in range(length):
+        if left[i] != right[i]:
+            return i
+    return length
+
+
+def order_for_prefix_sharing(prompts: list[str]) -> list[str]:
+    """
+    Order prompts so prompts sharing the longest prefixes are next to each other. vLLM schedules a
+    prompt-list request in order, so the shared conversation prefix is prefilled once and the
+    following prompts reuse it from the automatic prefix cache. Only BatchingVLLMInference sends
+    prompt lists, so this needs batching_enabled.
+    """
+    return sorted(prompts)
+
+
+def prefill_savings(prompts: list[str], count_tokens: Callable[[str], int]) -> tuple[int, int]:
+    """
+    Estimate prefill work for a list of prompts sent in order to a server with prefix caching.
+    Returns the total prompt tokens and the tokens that actually need prefilling, where each prompt
+    only prefills what it doesn't share with the prompt before it.
+    """
+    total = 0
+    prefilled = 0
+    previous = ""
+    for prompt in prompts:
+        tokens = count_tokens(prompt)
+        shared = count_tokens(prompt[:common_prefix_length(previous, prompt)]) if previous else 0
+        total += tokens
+        prefilled += tokens - shared
+        previous = prompt
+    return total, prefilled
+
+
+def load_renderer(config: GraniteGuardianShieldConfig, tokenizer: Any = None) -> GuardianPromptRenderer | None:
+    """
+    Build a GuardianPromptRenderer from the provider configuration, if one is configured.
+    A chat template file takes precedence over the tokenizer's own chat template.
+    """
+    if config.chat_template:
+        renderer = GuardianPromptRenderer.from_file(config.chat_template)
+        renderer.tokenizer = tokenizer
+        return renderer
+    if tokenizer is not None:
+        return GuardianPromptRenderer.from_tokenizer(tokenizer)
+    return None
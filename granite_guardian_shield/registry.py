@@ -0,0 +1,168 @@
+import asyncio
+import os
+from pathlib import Path
+from types import MappingProxyType
+from typing import Awaitable, Callable, Iterable, Mapping
+from weakref import WeakValueDictionary
+
+import yaml
+from llama_stack.log import get_logger
+from pydantic import BaseModel, Field
+
+from granite_guardian_shield.config import Risk, ShieldParams
+from granite_guardian_shield.plan import ShieldPlan
+from granite_guardian_shield.risk_assessor import (RiskAssessor,
+                                                   RiskAssessorFactory)
+
+logger = get_logger(name=__name__, category="safety")
+
+
+class RegistryStats(BaseModel):
+    """
+    Counters describing the shield registry.
+    """
+
+    shields: int = Field(default=0, description="Shields currently registered")
+    assessors: int = Field(default=0, description="Distinct risk assessors in use, after sharing identical risks between shields")
+    interned: int = Field(default=0, description="Risk assessors reused from another shield instead of being built")
+    reloads: int = Field(default=0, description="Shield file reloads applied")
+    reload_errors: int = Field(default=0, description="Shield file reloads rejected because the file was invalid")
+
+
+class ShieldRegistry:
+    """
+    Compiled plans of the registered shields. Every change builds a new snapshot and swaps it in
+    with one assignment, so run_shield reads the registry without locking and a call keeps the plan
+    it started with when its shield is updated or removed meanwhile.
+
+    Assessors are interned: shields with an identical risk going through the same inference share
+    one assessor, and with it its pre-screens and statistics.
+    """
+
+    def __init__(self) -> None:
+        self._plans: Mapping[str, ShieldPlan] = MappingProxyType({})
+        self._assessors: WeakValueDictionary[tuple[Risk, int], RiskAssessor] = WeakValueDictionary()
+        self._stats = RegistryStats()
+
+    def get(self, shield_id: str) -> ShieldPlan:
+        plan = self._plans.get(shield_id)
+        if plan is None:
+            raise ValueError(f"Shield {shield_id} is not registered")
+        return plan
+
+    def snapshot(self) -> Mapping[str, ShieldPlan]:
+        """
+        The current plans by shield id. Never modified, later changes replace the snapshot.
+        """
+        return self._plans
+
+    def update(self, plans: Mapping[str, ShieldPlan], removed: Iterable[str] = ()) -> None:
+        """
+        Register or replace `plans` and unregister the shields in `removed`, in one swap.
+        """
+        snapshot = dict(self._plans)
+        for shield_id in removed:
+            snapshot.pop(shield_id, None)
+        snapshot.update(plans)
+        self._plans = MappingProxyType(snapshot)
+
+    def register(self, shield_id: str, plan: ShieldPlan) -> None:
+        self.update({shield_id: plan})
+
+    def unregister(self, shield_id: str) -> bool:
+        """
+        Remove a shield. Returns whether it was registered.
+        """
+        if shield_id not in self._plans:
+            return False
+        self.update({}, [shield_id])
+        return True
+
+    def intern(self, factory: RiskAssessorFactory, risk: Risk) -> RiskAssessor:
+        """
+        The assessor for `risk` through the factory's inference, built only if no registered shield
+        already has one.
+        """
+        key = (risk, id(factory.ggi))
+        assessor = self._assessors.get(key)
+        if assessor is None:
+            # The assessor keeps its inference alive, so the id in the key can't be reused while it exists
+            assessor = self._assessors[key] = factory.create_assessor(risk)
+        else:
+            self._stats.interned += 1
+        return assessor
+
+    def record_reload(self, ok: bool) -> None:
+        if ok:
+            self._stats.reloads += 1
+        else:
+            self._stats.reload_errors += 1
+
+    def stats(self) -> RegistryStats:
+        return self._stats.model_copy(update={"shields": len(self._plans), "assessors": len(self._assessors)})
+
+
+def load_shield_file(path: str | Path) -> dict[str, ShieldParams]:
+    """
+    Read shield definitions from YAML laid out like the `shields` section of run.yaml: a list of
+    {shield_id, params} entries, at the top level or under a `shields` key.
+    """
+    data = yaml.safe_load(Path(path).read_text()) or []
+    entries = data.get("shields", []) if isinstance(data, dict) else data
+    shields: dict[str, ShieldParams] = {}
+    for entry in entries:
+        shield_id = entry["shield_id"]
+        if shield_id in shields:
+            raise ValueError(f"Shield {shield_id} is defined more than once in {path}")
+        shields[shield_id] = ShieldParams.model_validate(entry.get("params") or {})
+    return shields
+
+
+class FileWatcher:
+    """
+    Calls `on_change` whenever a file's modification time or size changes, checking every
+    `interval_seconds`. Polling keeps it free of platform specific file notification APIs.
+    """
+
+    def __init__(self, path: str | Path, interval_seconds: float, on_change: Callable[[], Awaitable[None]]):
+        self.path = Path(path)
+        self.interval_seconds = interval_seconds
+        self.on_change = on_change
+        self._signature = self._stat()
+        self._task: asyncio.Task | None = None
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def check(self) -> bool:
+        """
+        Call `on_change` if the file changed since the last check. Returns whether it did.
+        """
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        await self.on_change()
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Reloading {self.path} failed: {e}")
@@ -1,17 +1,32 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
 
 from llama_stack.log import get_logger
-from llama_stack.apis.inference import CompletionMessage, Message
+from llama_stack.apis.inference import (CompletionMessage, Message,
+                                        UserMessage)
 
 from granite_guardian_shield.config import Risk
+from granite_guardian_shield.context import (extract_context, last_user_index,
+                                             tool_calls_text)
+from granite_guardian_shield.helpers import reduce_confidences
 from granite_guardian_shield.inference import Inference
-from granite_guardian_shield.models import RiskProbability
-from granite_guardian_shield.constants import HallucinationRisk, SimpleRisk
+from granite_guardian_shield.models import ChunkScore, RiskProbability
+from granite_guardian_shield.constants import ChunkReducer, HallucinationRisk, MessageRole, SimpleRisk
+from granite_guardian_shield.prescreen import (KeywordPreScreen,
+                                               LinearPreScreen, PreScreen,
+                                               PreScreenStats)
+from granite_guardian_shield.telemetry import Phase, phase_timings
+from granite_guardian_shield.truncation import TokenCounter, split_windows
 
 logger = get_logger(name=__name__, category="safety")
 
 
 class RiskAssessor(ABC):
+    risk: Risk
+    # Roles of the last message this assessor can judge
+    roles: frozenset[MessageRole] = frozenset(MessageRole)
+
     @abstractmethod
     async def run(self, messages: list[Message]) -> RiskProbability:
         """
@@ -19,51 +34,285 @@ class RiskAssessor(ABC):
         """
         ...
 
+    def window(self, messages: list[Message]) -> list[Message]:
+        """
+        The messages Granite Guardian needs to judge the last message for this risk. Anything
+        earlier in the conversation is not sent.
+        """
+        return messages[-1:]
+
 
 class RiskAssessorFactory:
-    def __init__(self, ggi: Inference):
+    def __init__(
+        self,
+        ggi: Inference,
+        counter: TokenCounter | None = None,
+        prescreen_model: LinearPreScreen | None = None,
+        context_max_tokens: int | None = None,
+    ):
         self.ggi = ggi
+        self.counter = counter or TokenCounter()
+        self.prescreen_model = prescreen_model
+        self.context_max_tokens = context_max_tokens
 
     def create_assessor(self, risk: Risk) -> RiskAssessor:
+        assessor = self._create_assessor(risk)
+        screens: list[PreScreen] = []
+        if risk.prescreen_keywords:
+            screens.append(KeywordPreScreen(risk.prescreen_keywords))
+        if self.prescreen_model is not None and self.prescreen_model.covers(risk):
+            screens.append(self.prescreen_model)
+        if screens:
+            return PreScreenedAssessor(assessor, screens)
+        return assessor
+
+    def _create_assessor(self, risk: Risk) -> RiskAssessor:
         if risk.name in SimpleRisk.__members__:
-            return SimpleRiskAssessor(risk, self.ggi)
+            return SimpleRiskAssessor(risk, self.ggi, self.counter)
         elif risk.name == HallucinationRisk.answer_relevance:
             return AnswerContextRelevanceRiskAssessor(risk, self.ggi)
         elif risk.name == HallucinationRisk.context_relevance:
-            raise Exception("context_relevance assessor not yet implemented")
+            return ContextRelevanceRiskAssessor(risk, self.ggi, self.counter, self.context_max_tokens)
         elif risk.name == HallucinationRisk.function_call:
-            raise Exception("function_call assessor not yet implemented")
+            return FunctionCallRiskAssessor(risk, self.ggi)
         elif risk.name == HallucinationRisk.groundedness:
-            raise Exception("groundedness assessor not yet implemented")
+            return GroundednessRiskAssessor(risk, self.ggi, self.counter, self.context_max_tokens)
         else:
             logger.info(f"Custom risk definition detected: {risk.name}")
             if not risk.definition or not risk.definition.strip():
                 raise ValueError(f"Missing risk definition for custom risk {risk.name}")
-            return SimpleRiskAssessor(risk, self.ggi)
+            return SimpleRiskAssessor(risk, self.ggi, self.counter)
 
 
 class AnswerContextRelevanceRiskAssessor(RiskAssessor):
+    roles = frozenset({MessageRole.assistant})
+
     def __init__(self, risk: Risk, ggi: Inference):
         self.risk = risk
         self.ggi = ggi
 
+    def window(self, messages: list[Message]) -> list[Message]:
+        # The assistant answer and the user message it answers
+        for i in range(len(messages) - 2, -1, -1):
+            if isinstance(messages[i], UserMessage):
+                return [messages[i], messages[-1]]
+        return messages[-1:]
+
     async def run(self, messages: list[Message]) -> RiskProbability:
         # Peek at last message
         msg = messages[-1]
         if isinstance(msg, CompletionMessage):
             # return RiskProbability(risk_name=self.risk.name, risk_definition=None, is_risky=False, safe_confidence=0, risky_confidence=0)
-            return await self.ggi.run(self.risk, messages)
+            return await self.ggi.run(self.risk, self.window(messages))
         else:
             raise RuntimeError("Improper message stream for answer context relevance evaulator")
 
 
-class SimpleRiskAssessor(RiskAssessor):
+def not_applicable(risk: Risk, reason: str) -> RiskProbability:
+    """
+    Safe verdict, without confidences, for a risk that can't be judged on this conversation.
+    """
+    logger.debug(f"{risk.name} not applicable: {reason}")
+    return RiskProbability(
+        is_risky=False,
+        safe_confidence=None,
+        risky_confidence=None,
+        risk_name=risk.name,
+        risk_definition=risk.definition,
+        violation_level=risk.violation_level,
+    )
+
+
+class GroundednessRiskAssessor(RiskAssessor):
+    """
+    Whether the assistant's answer is supported by the context retrieved for the turn.
+    """
+
+    roles = frozenset({MessageRole.assistant})
+
+    def __init__(self, risk: Risk, ggi: Inference, counter: TokenCounter | None = None, context_max_tokens: int | None = None):
+        self.risk = risk
+        self.ggi = ggi
+        self.counter = counter or TokenCounter()
+        self.context_max_tokens = context_max_tokens
+
+    def window(self, messages: list[Message]) -> list[Message]:
+        context = extract_context(messages, self.counter, self.context_max_tokens)
+        return [context, messages[-1]] if context is not None else []
+
+    async def run(self, messages: list[Message]) -> RiskProbability:
+        window = self.window(messages)
+        if not window:
+            return not_applicable(self.risk, "no retrieved context")
+        return await self.ggi.run(self.risk, window)
+
+
+class ContextRelevanceRiskAssessor(RiskAssessor):
+    """
+    Whether the context retrieved for the turn is relevant to the user's question. Checked when the
+    user message carries context or when tool results come back.
+    """
+
+    roles = frozenset({MessageRole.user, MessageRole.tool})
+
+    def __init__(self, risk: Risk, ggi: Inference, counter: TokenCounter | None = None, context_max_tokens: int | None = None):
+        self.risk = risk
+        self.ggi = ggi
+        self.counter = counter or TokenCounter()
+        self.context_max_tokens = context_max_tokens
+
+    def window(self, messages: list[Message]) -> list[Message]:
+        context = extract_context(messages, self.counter, self.context_max_tokens)
+        if context is None:
+            return []
+        # Only the user message's content is sent, its context is the context message
+        return [messages[last_user_index(messages)], context]
+
+    async def run(self, messages: list[Message]) -> RiskProbability:
+        window = self.window(messages)
+        if not window:
+            return not_applicable(self.risk, "no retrieved context")
+        return await self.ggi.run(self.risk, window)
+
+
+class FunctionCallRiskAssessor(RiskAssessor):
+    """
+    Whether the tool calls of the assistant's message are wrong for the user's request, given the
+    tool definitions passed in the `tools` run_shield param.
+    """
+
+    roles = frozenset({MessageRole.assistant})
+
     def __init__(self, risk: Risk, ggi: Inference):
         self.risk = risk
         self.ggi = ggi
 
+    def window(self, messages: list[Message]) -> list[Message]:
+        msg = messages[-1]
+        user = last_user_index(messages)
+        if not getattr(msg, "tool_calls", None) or user is None:
+            return []
+        calls = msg.model_copy(update={"content": tool_calls_text(msg)})
+        tools = [m for m in messages if m.role == "tools"]
+        return [*tools[-1:], messages[user], calls]
+
+    async def run(self, messages: list[Message]) -> RiskProbability:
+        window = self.window(messages)
+        if not window:
+            return not_applicable(self.risk, "no tool calls")
+        return await self.ggi.run(self.risk, window)
+
+
+class SimpleRiskAssessor(RiskAssessor):
+    def __init__(self, risk: Risk, ggi: Inference, counter: TokenCounter | None = None):
+        self.risk = risk
+        self.ggi = ggi
+        self.counter = counter or TokenCounter()
+
     async def run(self, messages: list[Message]) -> RiskProbability:
         # Peek at the last message
         msg = messages[-1]
 
-        return await self.ggi.run(self.risk, [msg])
+        if self.risk.chunk_size:
+            content = str(msg.content)
+            offsets = self.counter.offsets(content)
+            if len(offsets) > self.risk.chunk_size:
+                overlap = min(self.risk.chunk_overlap, self.risk.chunk_size - 1)
+                chunks = split_windows(content, offsets, self.risk.chunk_size, overlap)
+                return await self._run_chunks(msg, chunks)
+
+        return await self.ggi.run(self.risk, self.window(messages))
+
+    async def _run_chunks(self, msg: Message, chunks: list[str]) -> RiskProbability:
+        """
+        Score chunks of a long message concurrently and combine them with the risk's chunk reducer.
+        With max or noisy_or a single risky chunk decides the verdict, so remaining chunks are cancelled.
+        """
+        async def score(index: int, chunk: str) -> ChunkScore:
+            started = time.perf_counter()
+            verdict = await self.ggi.run(self.risk, [msg.model_copy(update={"content": chunk})])
+            return ChunkScore(
+                index=index,
+                is_risky=verdict.is_risky,
+                risky_confidence=verdict.risky_confidence,
+                latency_ms=(time.perf_counter() - started) * 1000,
+            )
+
+        early_stop = self.risk.chunk_reducer in (ChunkReducer.max, ChunkReducer.noisy_or)
+        pending = {asyncio.ensure_future(score(i, chunk)) for i, chunk in enumerate(chunks)}
+        scores: list[ChunkScore] = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                scores.extend(task.result() for task in done)
+                if early_stop and any(s.is_risky for s in scores):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        scores.sort(key=lambda s: s.index)
+        confidences = [s.risky_confidence if s.risky_confidence is not None else float(s.is_risky) for s in scores]
+        p_risky = reduce_confidences(confidences, self.risk.chunk_reducer)
+        # Any risky chunk makes the message risky for max and noisy_or, as both are at least the max
+        is_risky = p_risky >= (self.risk.violation_threshold or 0.5) or (early_stop and any(s.is_risky for s in scores))
+        logger.debug(f"Scored {len(scores)}/{len(chunks)} chunks for {self.risk.name}, risky confidence {p_risky:.4f}")
+
+        return RiskProbability(
+            is_risky=is_risky,
+            safe_confidence=1.0 - p_risky,
+            risky_confidence=p_risky,
+            risk_name=self.risk.name,
+            risk_definition=self.risk.definition,
+            violation_level=self.risk.violation_level,
+            chunks=scores,
+        )
+
+
+class PreScreenedAssessor(RiskAssessor):
+    """
+    Risk assessor that runs pre-screens on the last message before `assessor`. When every
+    pre-screen finds the message safe the safe verdict is returned without calling Granite
+    Guardian, otherwise the message is escalated to `assessor`.
+    """
+
+    def __init__(self, assessor: RiskAssessor, screens: list[PreScreen]):
+        self.assessor = assessor
+        self.risk = assessor.risk
+        self.roles = assessor.roles
+        self.screens = screens
+        self._stats = PreScreenStats()
+
+    def window(self, messages: list[Message]) -> list[Message]:
+        return self.assessor.window(messages)
+
+    async def run(self, messages: list[Message]) -> RiskProbability:
+        with phase_timings.time(Phase.prescreen, self.risk.name):
+            verdict = self.screen(str(messages[-1].content))
+        if verdict is None:
+            self._stats.escalated += 1
+            return await self.assessor.run(messages)
+        self._stats.screened += 1
+        return verdict
+
+    def screen(self, text: str) -> RiskProbability | None:
+        p_risky = 0.0
+        for screen in self.screens:
+            p = screen.risky_probability(text)
+            if p is None:
+                return None
+            p_risky = max(p_risky, p)
+
+        probabilistic = any(isinstance(screen, LinearPreScreen) for screen in self.screens)
+        return RiskProbability(
+            is_risky=False,
+            safe_confidence=1.0 - p_risky if probabilistic else None,
+            risky_confidence=p_risky if probabilistic else None,
+            risk_name=self.risk.name,
+            risk_definition=self.risk.definition,
+            violation_level=self.risk.violation_level,
+            screened_by=",".join(screen.name for screen in self.screens),
+        )
+
+    def stats(self) -> PreScreenStats:
+        return self._stats.model_copy()
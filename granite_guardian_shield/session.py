@@ -0,0 +1,166 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any
+
+from llama_stack.apis.inference import Message
+from pydantic import BaseModel, Field
+
+from granite_guardian_shield.models import RiskProbability
+
+
+class SessionStats(BaseModel):
+    """
+    Counters describing incremental conversation scoring.
+    """
+
+    sessions: int = Field(default=0, description="Sessions currently tracked")
+    reused: int = Field(default=0, description="Verdicts answered from a session instead of being scored again")
+    scored: int = Field(default=0, description="Verdicts computed and recorded in a session")
+    rewinds: int = Field(default=0, description="Calls whose conversation diverged from the session's instead of extending it")
+    evictions: int = Field(default=0, description="Sessions dropped because they were idle or the store was full")
+
+
+# Message fields besides role and content that risks read: retrieved documents for groundedness and
+# context_relevance, and tool calls and their results for function_call
+FINGERPRINTED_FIELDS = ("context", "tool_calls", "call_id")
+
+
+def fingerprint(previous: bytes, message: Message) -> bytes:
+    """
+    Fingerprint of a conversation prefix, chained from the fingerprint of the prefix before `message`.
+    """
+    digest = hashlib.blake2b(previous, digest_size=16)
+    digest.update(message.role.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(str(message.content).encode("utf-8"))
+    for field in FINGERPRINTED_FIELDS:
+        value = getattr(message, field, None)
+        if value is not None:
+            digest.update(f"\0{field}\0{value}".encode("utf-8"))
+    return digest.digest()
+
+
+def tools_fingerprint(tools: Any) -> bytes:
+    """
+    Fingerprint of the tool definitions passed in the `tools` run_shield param, that every prefix
+    fingerprint of a conversation is chained from.
+    """
+    if not tools:
+        return b""
+    text = tools if isinstance(tools, str) else json.dumps(tools, sort_keys=True)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class ConversationState:
+    """
+    What a session remembers about its conversation: the fingerprint of every prefix of the last
+    conversation seen and, for each prefix, the verdicts computed on it keyed by risk name. Verdicts
+    of turns the conversation still starts with survive new turns and edits of later ones.
+    """
+
+    def __init__(self) -> None:
+        self.fingerprints: list[bytes] = []
+        self.verdicts: dict[bytes, dict[str, RiskProbability]] = {}
+        self.last_seen = 0.0
+
+    def advance(self, fingerprints: list[bytes]) -> bool:
+        """
+        Move the session to a conversation with the given prefix fingerprints, dropping the
+        verdicts of prefixes it doesn't start with. Returns whether the conversation diverged from
+        the session's instead of extending it, as when a turn is edited or regenerated.
+        """
+        known = self.fingerprints
+        if fingerprints == known:
+            return False
+
+        self.fingerprints = fingerprints
+        current = set(fingerprints)
+        self.verdicts = {prefix: verdicts for prefix, verdicts in self.verdicts.items() if prefix in current}
+        # Chained fingerprints match at the end of the known prefix only if every earlier one does
+        return bool(known) and not (len(known) <= len(fingerprints) and fingerprints[len(known) - 1] == known[-1])
+
+
+class SessionStore:
+    """
+    Per-session conversation state for the shield, bounded by an idle timeout and a maximum number
+    of sessions. The least recently used session is evicted first.
+    """
+
+    def __init__(self, idle_seconds: float, max_sessions: int):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, ConversationState] = OrderedDict()
+        self._stats = SessionStats()
+
+    def state(
+        self, shield_id: str, messages: list[Message], session_id: str, tools: Any = None
+    ) -> tuple[ConversationState, bytes]:
+        """
+        The state of the session `messages` belong to, advanced to them, and the fingerprint of the
+        whole conversation that verdicts on it are known and recorded under. Changing the `tools`
+        param changes the fingerprint of every prefix.
+        """
+        fingerprints = []
+        previous = tools_fingerprint(tools)
+        for message in messages:
+            previous = fingerprint(previous, message)
+            fingerprints.append(previous)
+
+        key = f"{shield_id}/{session_id}"
+        now = time.monotonic()
+        self._evict(now)
+        state = self._sessions.get(key)
+        if state is None:
+            state = self._sessions[key] = ConversationState()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats.evictions += 1
+        else:
+            self._sessions.move_to_end(key)
+
+        if state.advance(fingerprints):
+            self._stats.rewinds += 1
+        state.last_seen = now
+        return state, previous
+
+    def known(self, state: ConversationState, conversation: bytes) -> dict[str, RiskProbability]:
+        """
+        Verdicts already computed for the conversation with fingerprint `conversation`.
+        """
+        verdicts = dict(state.verdicts.get(conversation, {}))
+        self._stats.reused += len(verdicts)
+        return verdicts
+
+    def record(self, state: ConversationState, conversation: bytes, verdicts: list[RiskProbability]) -> None:
+        """
+        Remember verdicts computed for the conversation with fingerprint `conversation`. They are
+        dropped if a concurrent call moved the session to a conversation that doesn't start with it.
+        Verdicts decided by a failure policy are not kept so the conversation is scored again once
+        Granite Guardian is back.
+        """
+        if conversation not in state.fingerprints:
+            return
+        for verdict in verdicts:
+            if verdict.degraded_reason is None:
+                state.verdicts.setdefault(conversation, {})[verdict.risk_name] = verdict
+                self._stats.scored += 1
+
+    def forget(self, shield_id: str) -> None:
+        """
+        Drop every session of a shield, for example because its risks changed.
+        """
+        for key in [key for key in self._sessions if key.startswith(f"{shield_id}/")]:
+            del self._sessions[key]
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            key, state = next(iter(self._sessions.items()))
+            if now - state.last_seen < self.idle_seconds:
+                return
+            del self._sessions[key]
+            self._stats.evictions += 1
+
+    def stats(self) -> SessionStats:
+        return self._stats.model_copy(update={"sessions": len(self._sessions)})
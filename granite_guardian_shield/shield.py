@@ -1,19 +1,43 @@
 import asyncio
-from typing import Any
+import time
+from typing import Any, Callable, Sequence
 
-from llama_stack.apis.inference import (CompletionMessage, Message,
-                                        ToolResponseMessage, UserMessage)
+from llama_stack.apis.inference import Message
 from llama_stack.apis.safety import (RunShieldResponse, Safety,
                                      SafetyViolation, ViolationLevel)
 from llama_stack.apis.shields import Shield
 from llama_stack.log import get_logger
 from llama_stack.providers.datatypes import ShieldsProtocolPrivate
+from llama_stack.providers.utils.telemetry import tracing
 
-from granite_guardian_shield.config import Risk
-from granite_guardian_shield.helpers import get_higher_violation_level
-from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.admission import (AdaptiveLimitStats,
+                                               AdmissionController,
+                                               AdmissionStats,
+                                               LimitedInference,
+                                               call_scheduling)
+from granite_guardian_shield.balancer import BalancerStats
+from granite_guardian_shield.breaker import BreakerStats
+from granite_guardian_shield.cache import CacheStats
+from granite_guardian_shield.config import (GraniteGuardianShieldConfig,
+                                            ShieldParams)
+from granite_guardian_shield.constants import (FailurePolicy, Priority,
+                                               StreamCheckpoint)
+from granite_guardian_shield.context import tools_message
+from granite_guardian_shield.helpers import (failure_verdict,
+                                             get_higher_violation_level)
+from granite_guardian_shield.inference import Inference, conversion_scope
+from granite_guardian_shield.layers import InferenceLayers
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.plan import ShieldPlan
+from granite_guardian_shield.prescreen import LinearPreScreen
+from granite_guardian_shield.registry import (FileWatcher, RegistryStats,
+                                              ShieldRegistry, load_shield_file)
 from granite_guardian_shield.risk_assessor import (RiskAssessor,
                                                    RiskAssessorFactory)
+from granite_guardian_shield.session import SessionStats, SessionStore
+from granite_guardian_shield.streaming import OutputStream
+from granite_guardian_shield.telemetry import Phase, phase_timings
+from granite_guardian_shield.truncation import TokenCounter
 
 logger = get_logger(name=__name__, category="safety")
 
@@ -22,33 +46,188 @@ class GraniteGuardianShield(Safety, ShieldsProtocolPrivate):
     """
     Manages registration and running of Shields
     """
-    def __init__(self, inference: Inference) -> None:
-        self._shield_risk_map: dict[str, list[RiskAssessor]] = dict()
+    def __init__(
+        self,
+        inference: Inference,
+        config: GraniteGuardianShieldConfig | None = None,
+        token_counter: TokenCounter | None = None,
+        layers: InferenceLayers | None = None,
+    ) -> None:
+        self.registry = ShieldRegistry()
         self.inference = inference
+        self.layers = layers or InferenceLayers()
+        self.config = config
+        self.token_counter = token_counter or TokenCounter()
+        self.prescreen_model: LinearPreScreen | None = None
+        if config is not None and config.prescreen_model_path:
+            self.prescreen_model = LinearPreScreen.load(config.prescreen_model_path, config.prescreen_safe_threshold)
+        self.sessions: SessionStore | None = None
+        if config is not None and config.session_idle_seconds:
+            self.sessions = SessionStore(config.session_idle_seconds, config.session_max_count)
+        self.shield_file_watcher: FileWatcher | None = None
+        self._file_shields: set[str] = set()
+        if config is not None and config.shields_path:
+            self.shield_file_watcher = FileWatcher(config.shields_path, config.shields_reload_seconds, self.reload_shields)
 
     async def initialize(self) -> None:
-        pass
+        await self.inference.initialize()
+        if self.shield_file_watcher is not None:
+            await self.reload_shields()
+            self.shield_file_watcher.start()
 
     async def shutdown(self) -> None:
-        pass
+        if self.shield_file_watcher is not None:
+            await self.shield_file_watcher.stop()
+        await self.inference.shutdown()
 
     async def register_shield(self, shield: Shield) -> None:
         """
-        Called by Llama Stack per shield configuration. Validates the risk configuration and stores in
-        internal shield/risk mapping.
+        Called by Llama Stack per shield configuration. Validates the risk configuration and compiles
+        it into the shield's plan.
         """
         if shield.params is None or "risks" not in shield.params or not shield.params.get("risks"):
             raise ValueError(f"No risks defined for {shield.shield_id}")
         else:
-            risk_configs = shield.params.get("risks", [])
-            assessor_factory = RiskAssessorFactory(self.inference)
-            risks: list[RiskAssessor] = []
-            for risk_config in risk_configs:
-                risk = Risk.model_validate(risk_config)
-                risks.append(assessor_factory.create_assessor(risk))
-            self._shield_risk_map[shield.shield_id] = risks
+            params = ShieldParams.model_validate(shield.params)
+            self.registry.register(shield.shield_id, self._compile(params))
+            if self.sessions is not None:
+                self.sessions.forget(shield.shield_id)
         logger.info(f"Registered {shield.shield_id}")
 
+    async def unregister_shield(self, shield_id: str) -> None:
+        """
+        Remove a shield. Calls already running on it finish with the plan they started with.
+        """
+        if not self.registry.unregister(shield_id):
+            raise ValueError(f"Shield {shield_id} is not registered")
+        self._file_shields.discard(shield_id)
+        if self.sessions is not None:
+            self.sessions.forget(shield_id)
+        logger.info(f"Unregistered {shield_id}")
+
+    async def reload_shields(self) -> None:
+        """
+        Apply the shields_path file: shields it defines are registered or updated and shields it
+        used to define are removed, all in one registry swap. Unchanged shields keep their plan. An
+        invalid file is rejected as a whole and the shields stay as they were.
+        """
+        path = self.config.shields_path
+        try:
+            definitions = load_shield_file(path)
+        except Exception:
+            self.registry.record_reload(False)
+            raise
+
+        current = self.registry.snapshot()
+        plans = {
+            shield_id: self._compile(params)
+            for shield_id, params in definitions.items()
+            if shield_id not in current or current[shield_id].params != params
+        }
+        removed = self._file_shields - definitions.keys()
+        self.registry.update(plans, removed)
+        self.registry.record_reload(True)
+        self._file_shields = set(definitions)
+        if self.sessions is not None:
+            for shield_id in [*plans, *removed]:
+                self.sessions.forget(shield_id)
+        logger.info(f"Reloaded shields from {path}: {len(plans)} changed, {len(removed)} removed")
+
+    def _compile(self, params: ShieldParams) -> ShieldPlan:
+        """
+        Build a shield's plan, sharing assessors with registered shields where risks are identical.
+        """
+        if len(params.risks) > 1 and self.config is not None and not self.config.batching_enabled:
+            # Only the batching backend orders a call's prompts so vLLM prefills the conversation once
+            logger.warning(
+                f"Risks {', '.join(risk.name for risk in params.risks)} are checked in separate requests without "
+                "shared-prefix ordering, set batching_enabled to score them in one prefix-shared request"
+            )
+        inference, admission = self._shield_inference(params)
+        assessor_factory = RiskAssessorFactory(
+            inference,
+            self.token_counter,
+            self.prescreen_model,
+            self.config.context_max_tokens if self.config is not None else None,
+        )
+        risks: list[RiskAssessor] = []
+        for risk in params.risks:
+            risks.append(self.registry.intern(assessor_factory, risk))
+        return ShieldPlan(params, risks, admission)
+
+    def _shield_inference(self, params: ShieldParams) -> tuple[Inference, AdmissionController | None]:
+        """
+        Wrap the shared inference with this shield's concurrency limit, if one is configured.
+        """
+        max_concurrency = params.max_concurrency
+        if max_concurrency is None and self.config is not None:
+            max_concurrency = self.config.shield_max_concurrency
+        if max_concurrency is None:
+            return self.inference, None
+
+        if self.config is None:
+            controller = AdmissionController(max_concurrency)
+            failure_policy = FailurePolicy.closed
+        else:
+            controller = AdmissionController.from_config(max_concurrency, self.config)
+            failure_policy = self.config.failure_policy
+        return LimitedInference(self.inference, controller, failure_policy), controller
+
+    def admission_stats(self) -> dict[str, AdmissionStats]:
+        """
+        Per-shield concurrency limiting and queueing statistics.
+        """
+        return {
+            shield_id: plan.admission.stats()
+            for shield_id, plan in self.registry.snapshot().items()
+            if plan.admission is not None
+        }
+
+    def provider_admission_stats(self) -> AdmissionStats | None:
+        """
+        Concurrency limiting and queueing statistics of the provider's max_concurrency limit, if one
+        is configured.
+        """
+        return self.layers.admission.stats() if self.layers.admission is not None else None
+
+    def cache_stats(self) -> CacheStats | None:
+        """
+        Verdict cache hit, miss and eviction statistics, if the cache is enabled.
+        """
+        return self.layers.cache.stats() if self.layers.cache is not None else None
+
+    def breaker_stats(self) -> BreakerStats | None:
+        """
+        Circuit breaker state and statistics, if the breaker is enabled.
+        """
+        return self.layers.breaker.stats() if self.layers.breaker is not None else None
+
+    def endpoint_stats(self) -> BalancerStats | None:
+        """
+        Per endpoint load balancing and hedging statistics, if calls are balanced across several
+        endpoints.
+        """
+        return self.layers.balancer.stats() if self.layers.balancer is not None else None
+
+    def adaptive_limit_stats(self) -> list[AdaptiveLimitStats]:
+        """
+        Adaptive concurrency limit and latency estimates of each endpoint, if adaptive concurrency
+        is enabled.
+        """
+        return [adaptive.stats() for adaptive in self.layers.adaptive_limits]
+
+    def registry_stats(self) -> RegistryStats:
+        """
+        Shield registration, assessor sharing and reload statistics.
+        """
+        return self.registry.stats()
+
+    def session_stats(self) -> SessionStats | None:
+        """
+        Incremental conversation scoring statistics, if sessions are enabled.
+        """
+        return self.sessions.stats() if self.sessions is not None else None
+
     async def run_shield(
         self,
         shield_id: str,
@@ -58,24 +237,124 @@ class GraniteGuardianShield(Safety, ShieldsProtocolPrivate):
         """
         Run a single Shield for the updated list of messages in a session. This may evaluate multiple risks and run
         multiple inferences depending on user's Shield configuration.
+
+        Recognised params: `session_id`, `tools` for the function_call risk, and `priority` and
+        `deadline_ms` overriding the shield's scheduling settings for this call.
         """
+        started = time.monotonic()
         # Peek at the last message
         msg = messages[-1]
-
-        if isinstance(msg, UserMessage):
-            # Handle with input safety guardrails
-            logger.debug(f"----------------------{msg}")
-        elif isinstance(msg, CompletionMessage):
-            # Handle with the output safety guardrails
-            logger.debug(f"++++++++++++++++++++++ {msg}")
-        elif isinstance(msg, ToolResponseMessage):
-            logger.debug(f"===================== {msg}")
-        else:
+        plan = self.registry.get(shield_id)
+        assessors = plan.assessors_for(msg)
+        if assessors is None:
             logger.debug(f"run_shield::unknown message type::{msg.model_dump_json()}")
             return RunShieldResponse()
+        if not assessors:
+            return RunShieldResponse()
 
-        tasks = [assessor.run(messages) for assessor in self._shield_risk_map[shield_id]]
-        verdicts = await asyncio.gather(*tasks)
+        known: dict[str, RiskProbability] = {}
+        session_id = (params or {}).get("session_id") if self.sessions is not None else None
+        if session_id is not None:
+            # Risks already scored for this exact conversation are not sent again
+            state, conversation = self.sessions.state(shield_id, messages, session_id, (params or {}).get("tools"))
+            known = self.sessions.known(state, conversation)
+            assessors = [assessor for assessor in assessors if assessor.risk.name not in known]
+
+        if (params or {}).get("tools"):
+            # Tool definitions for the function_call risk, after sessions so they don't identify one
+            messages = [tools_message(params["tools"]), *messages]
+        if plan.short_circuit and any(v.is_risky and v.violation_level == ViolationLevel.ERROR for v in known.values()):
+            verdicts, not_evaluated = [], [assessor.risk.name for assessor in assessors]
+        else:
+            verdicts, not_evaluated = await self._evaluate(plan, assessors, messages, params, started)
+        if session_id is not None:
+            self.sessions.record(state, conversation, verdicts)
+            verdicts = [*known.values(), *verdicts]
+        return self._response(msg, verdicts, not_evaluated)
+
+    def stream_output(
+        self,
+        shield_id: str,
+        messages: list[Message],
+        params: dict[str, Any] = {},
+        on_violation: Callable[[RunShieldResponse], None] | None = None,
+    ) -> OutputStream:
+        """
+        Shield an assistant response while it is generated. `messages` is the conversation the
+        response answers; feed the response's deltas to the returned stream and close it once the
+        response is complete. Checks before completion bypass sessions, the final one is a regular
+        run_shield call.
+        """
+        plan = self.registry.get(shield_id)
+
+        async def check(partial: list[Message]) -> RunShieldResponse:
+            verdicts, not_evaluated = await self._evaluate(
+                plan, plan.assessors_for(partial[-1]), partial, params, time.monotonic()
+            )
+            return self._response(partial[-1], verdicts, not_evaluated)
+
+        async def finish(complete: list[Message]) -> RunShieldResponse:
+            return await self.run_shield(shield_id, complete, params)
+
+        checkpoint, checkpoint_tokens = StreamCheckpoint.sentence, 16
+        if self.config is not None:
+            checkpoint, checkpoint_tokens = self.config.stream_checkpoint, self.config.stream_checkpoint_tokens
+        return OutputStream(
+            messages, check, finish, self.token_counter, checkpoint, checkpoint_tokens, on_violation
+        )
+
+    async def _evaluate(
+        self,
+        plan: ShieldPlan,
+        assessors: Sequence[RiskAssessor],
+        messages: list[Message],
+        params: dict[str, Any] | None = None,
+        started: float | None = None,
+    ) -> tuple[list[RiskProbability], list[str]]:
+        """
+        Run assessors on messages, honouring the shield's short_circuit setting and scheduling them
+        with the call's priority and deadline, counted from `started` on the time.monotonic clock.
+        Messages are converted once for all assessors. Returns the verdicts received and the names
+        of risks not evaluated. If the deadline has already passed no check is sent, with or without
+        a concurrency limit, and every risk gets its failure policy verdict.
+
+        The call gets one Llama Stack telemetry span with every risk's verdict and token usage as
+        attributes. Llama Stack keeps the spans of a trace on a single stack shared by all tasks, so
+        concurrent per-risk spans would nest under each other and close each other.
+        """
+        params = params or {}
+        priority = Priority(params.get("priority", plan.params.priority))
+        deadline_ms = params.get("deadline_ms", plan.params.deadline_ms)
+        deadline = None
+        if deadline_ms is not None:
+            deadline = (started if started is not None else time.monotonic()) + float(deadline_ms) / 1000
+            if time.monotonic() >= deadline:
+                logger.warning(f"Deadline of {deadline_ms}ms passed before the risk checks were sent")
+                policy = self.config.failure_policy if self.config is not None else FailurePolicy.closed
+                reason = "Deadline passed before the risk check was sent"
+                return [failure_verdict(a.risk, a.risk.failure_policy or policy, reason) for a in assessors], []
+        risk_names = [assessor.risk.name for assessor in assessors]
+        async with tracing.span("granite_guardian_shield", {"risk_names": ",".join(risk_names)}) as span:
+            with conversion_scope(), call_scheduling(priority, deadline):
+                if plan.short_circuit:
+                    verdicts, not_evaluated = await self._run_short_circuit(assessors, messages)
+                else:
+                    tasks = [self._run_assessor(assessor, messages) for assessor in assessors]
+                    verdicts, not_evaluated = list(await asyncio.gather(*tasks)), []
+            for verdict in verdicts:
+                prefix = f"{verdict.risk_name}."
+                span.set_attribute(prefix + "is_risky", verdict.is_risky)
+                span.set_attribute(prefix + "risky_confidence", verdict.risky_confidence)
+                span.set_attribute(prefix + "prompt_tokens", verdict.prompt_tokens)
+                span.set_attribute(prefix + "completion_tokens", verdict.completion_tokens)
+            if not_evaluated:
+                span.set_attribute("not_evaluated", ",".join(not_evaluated))
+        return verdicts, not_evaluated
+
+    def _response(self, msg: Message, verdicts: list[RiskProbability], not_evaluated: list[str]) -> RunShieldResponse:
+        """
+        Build the shield response from verdicts, reporting the highest violation level of risky ones.
+        """
         violation_metadatas = []
 
         highest_violation_level = ViolationLevel.INFO
@@ -86,12 +365,51 @@ class GraniteGuardianShield(Safety, ShieldsProtocolPrivate):
                 highest_violation_level = higher_violation_level
 
         if violation_metadatas:
+            metadata: dict[str, Any] = {"metadata": violation_metadatas}
+            if not_evaluated:
+                metadata["not_evaluated"] = not_evaluated
             return RunShieldResponse(
                 violation=SafetyViolation(
                     user_message=msg.content,
                     violation_level=highest_violation_level,
-                    metadata={"metadata": violation_metadatas},
+                    metadata=metadata,
                 )
             )
 
         return RunShieldResponse()
+
+    async def _run_assessor(self, assessor: RiskAssessor, messages: list[Message]) -> RiskProbability:
+        """
+        Run one assessor and time it.
+        """
+        with phase_timings.time(Phase.assess, assessor.risk.name):
+            return await assessor.run(messages)
+
+    async def _run_short_circuit(
+        self, assessors: Sequence[RiskAssessor], messages: list[Message]
+    ) -> tuple[list[RiskProbability], list[str]]:
+        """
+        Run assessors concurrently and stop as soon as one returns an ERROR level violation, since that
+        alone decides the response. Outstanding assessors are cancelled, which also cancels their
+        Granite Guardian requests. Returns the verdicts received and the names of risks not evaluated.
+        """
+        tasks = {asyncio.ensure_future(self._run_assessor(assessor, messages)): assessor for assessor in assessors}
+        pending = set(tasks)
+        verdicts: list[RiskProbability] = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                results = [task.result() for task in done]
+                verdicts.extend(results)
+                if any(v.is_risky and v.violation_level == ViolationLevel.ERROR for v in results):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            # Let cancelled assessors finish cleaning up before the call returns
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        not_evaluated = [tasks[task].risk.name for task in pending]
+        if not_evaluated:
+            logger.debug(f"Short-circuited shield, not evaluated: {not_evaluated}")
+        return verdicts, not_evaluated
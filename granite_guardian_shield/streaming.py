@@ -0,0 +1,146 @@
+import asyncio
+import re
+from typing import Awaitable, Callable
+
+from llama_stack.apis.inference import (CompletionMessage, Message,
+                                        StopReason)
+from llama_stack.apis.safety import RunShieldResponse
+from llama_stack.log import get_logger
+
+from granite_guardian_shield.constants import StreamCheckpoint
+from granite_guardian_shield.truncation import TokenCounter
+
+logger = get_logger(name=__name__, category="safety")
+
+# A sentence ends at terminal punctuation followed by whitespace or the end of the text so far, or at a line break
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?:\s|$)|\n")
+
+Check = Callable[[list[Message]], Awaitable[RunShieldResponse]]
+
+
+class OutputStream:
+    """
+    Shields an assistant response while it is being generated. Deltas are fed as they are streamed
+    and, at every checkpoint, the response so far is checked by Granite Guardian in the background
+    so moderation overlaps with generation. Each check extends the prompt of the one before, which
+    vLLM's prefix caching reuses.
+
+    At most one check is in flight per stream; checkpoints reached meanwhile are folded into a single
+    check of the latest text. As soon as a check finds a violation it is kept, `on_violation` is
+    called and every further `feed` returns it, so the caller can cut the stream off.
+    """
+
+    def __init__(
+        self,
+        messages: list[Message],
+        check: Check,
+        finish: Check,
+        token_counter: TokenCounter,
+        checkpoint: StreamCheckpoint = StreamCheckpoint.sentence,
+        checkpoint_tokens: int = 16,
+        on_violation: Callable[[RunShieldResponse], None] | None = None,
+    ):
+        self.messages = messages
+        self.check = check
+        self.finish = finish
+        self.token_counter = token_counter
+        self.checkpoint = checkpoint
+        self.checkpoint_tokens = checkpoint_tokens
+        self.on_violation = on_violation
+        self.text = ""
+        self.violation: RunShieldResponse | None = None
+        self.checkpoints = 0
+        self._pending_tokens = 0
+        self._boundary = False
+        self._task: asyncio.Task | None = None
+        self._task_text = ""
+        self._checked_text: str | None = None
+        self._closed = False
+
+    def feed(self, delta: str) -> RunShieldResponse | None:
+        """
+        Append a streamed delta of the response. Returns the violation once a check has found one.
+        """
+        if self._closed:
+            raise RuntimeError("Output stream is closed")
+        if self.violation is not None or not delta:
+            return self.violation
+
+        # Look one character back so a sentence end split across deltas is still seen, but not
+        # into text a check already covers
+        start = max(len(self.text) - 1, len(self._task_text))
+        self.text += delta
+        self._pending_tokens += self.token_counter.count(delta)
+        if self.checkpoint == StreamCheckpoint.tokens:
+            self._boundary = self._pending_tokens >= self.checkpoint_tokens
+        elif not self._boundary and self._pending_tokens >= self.checkpoint_tokens:
+            self._boundary = _SENTENCE_END.search(self.text, start) is not None
+        if self._boundary and self._task is None:
+            self._start_check()
+        return self.violation
+
+    def _start_check(self) -> None:
+        self._boundary = False
+        self._pending_tokens = 0
+        self._task_text = self.text
+        self.checkpoints += 1
+        self._task = asyncio.ensure_future(self._run_check(self.text))
+
+    async def _run_check(self, text: str) -> None:
+        try:
+            response = await self.check(self._response_messages(text, StopReason.end_of_message))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The complete response is checked again on close, where errors are surfaced
+            logger.warning(f"Streaming check failed: {e}")
+            response = None
+        self._task = None
+        if response is None:
+            return
+
+        self._checked_text = text
+        if response.violation is not None:
+            self._set_violation(response)
+        elif self._boundary and not self._closed:
+            # Checkpoints were reached while this check was in flight
+            self._start_check()
+
+    def _set_violation(self, response: RunShieldResponse) -> None:
+        if self.violation is not None:
+            return
+        self.violation = response
+        if self.on_violation is not None:
+            self.on_violation(response)
+
+    def _response_messages(self, text: str, stop_reason: StopReason) -> list[Message]:
+        return [*self.messages, CompletionMessage(content=text, role="assistant", stop_reason=stop_reason)]
+
+    async def close(self) -> RunShieldResponse:
+        """
+        End the stream and return the verdict on the complete response. A check already in flight
+        on the complete response is awaited rather than sent again.
+        """
+        self._closed = True
+        task = self._task
+        if task is not None and self.violation is None and self._task_text == self.text:
+            await task
+        self.cancel()
+        if self.violation is not None:
+            return self.violation
+        if self._checked_text == self.text:
+            return RunShieldResponse()
+
+        response = await self.finish(self._response_messages(self.text, StopReason.end_of_turn))
+        if response.violation is not None:
+            self._set_violation(response)
+        return response
+
+    def cancel(self) -> None:
+        """
+        Stop a check in flight, for example because the stream was abandoned.
+        """
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,134 @@
+import bisect
+import time
+from contextlib import contextmanager
+from enum import StrEnum
+from typing import Iterator
+
+from opentelemetry import metrics
+from pydantic import BaseModel, Field
+
+_meter = metrics.get_meter("granite_guardian_shield")
+_phase_duration = _meter.create_histogram(
+    name="granite_guardian.phase.duration",
+    unit="ms",
+    description="Time spent in each phase of a Granite Guardian shield call",
+)
+_concurrency_limit = _meter.create_gauge(
+    name="granite_guardian.concurrency.limit",
+    unit="{call}",
+    description="Adaptive concurrency limit of each Granite Guardian endpoint",
+)
+_concurrency_latency = _meter.create_gauge(
+    name="granite_guardian.concurrency.latency",
+    unit="ms",
+    description="Baseline and moving average call latency the adaptive concurrency limit of each Granite Guardian endpoint follows",
+)
+
+# Upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, float("inf"))
+
+
+class Phase(StrEnum):
+    """
+    Phases of a shield call that are timed separately.
+    """
+    assess = "assess"  # One risk assessor end to end
+    prescreen = "prescreen"  # Local pre-screen before Granite Guardian
+    queue = "queue"  # Waiting for a concurrency slot
+    convert = "convert"  # Converting Llama Stack messages to OpenAI messages
+    http = "http"  # Granite Guardian request and response, including vLLM time
+    parse = "parse"  # Turning logprobs into a RiskProbability
+
+
+class LatencyStats(BaseModel):
+    count: int = Field(description="Number of observations")
+    mean_ms: float = Field(description="Mean latency in milliseconds")
+    p50_ms: float = Field(description="Median latency bucket upper bound in milliseconds")
+    p95_ms: float = Field(description="95th percentile latency bucket upper bound in milliseconds")
+    p99_ms: float = Field(description="99th percentile latency bucket upper bound in milliseconds")
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram. Cheap to record into, percentiles are reported as bucket upper bounds.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, q: float) -> float:
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target and seen:
+                return bound
+        return 0.0
+
+    def stats(self) -> LatencyStats:
+        return LatencyStats(
+            count=self.count,
+            mean_ms=self.total_ms / self.count if self.count else 0.0,
+            p50_ms=self.percentile(0.5),
+            p95_ms=self.percentile(0.95),
+            p99_ms=self.percentile(0.99),
+        )
+
+
+class PhaseTimings:
+    """
+    Latency histograms per phase and risk name. Every observation is also recorded to the
+    OpenTelemetry meter configured by Llama Stack telemetry, if any.
+    """
+
+    def __init__(self) -> None:
+        self._histograms: dict[tuple[str, str], LatencyHistogram] = {}
+
+    def record(self, phase: Phase, risk_name: str, seconds: float) -> None:
+        ms = seconds * 1000
+        key = (phase, risk_name)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = LatencyHistogram()
+        histogram.record(ms)
+        _phase_duration.record(ms, {"phase": str(phase), "risk_name": risk_name})
+
+    @contextmanager
+    def time(self, phase: Phase, risk_name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, risk_name, time.perf_counter() - started)
+
+    def stats(self) -> dict[str, dict[str, LatencyStats]]:
+        """
+        Latency statistics keyed by phase, then risk name.
+        """
+        result: dict[str, dict[str, LatencyStats]] = {}
+        for (phase, risk_name), histogram in self._histograms.items():
+            result.setdefault(str(phase), {})[risk_name] = histogram.stats()
+        return result
+
+    def reset(self) -> None:
+        self._histograms.clear()
+
+
+def record_concurrency_limit(endpoint: str, limit: int, baseline_ms: float, latency_ms: float) -> None:
+    """
+    Record an adaptive concurrency limit and the latency estimates behind it to the OpenTelemetry meter.
+    """
+    _concurrency_limit.set(limit, {"endpoint": endpoint})
+    _concurrency_latency.set(baseline_ms, {"endpoint": endpoint, "estimate": "baseline"})
+    _concurrency_latency.set(latency_ms, {"endpoint": endpoint, "estimate": "average"})
+
+
+# Process wide phase timings shared by all shields
+phase_timings = PhaseTimings()
@@ -0,0 +1,144 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError(
+        "Threshold sweeps require numpy. "
+        "Install granite_guardian_llama_stack_shield[sweep]."
+    ) from e
+
+# Layout of logprob_store.RECORD
+RECORD_DTYPE = np.dtype([("key", "S32"), ("risk", "S32"), ("log_safe", "<f8"), ("log_risky", "<f8")])
+
+
+class ThresholdMetrics(BaseModel):
+    """
+    Verdicts a violation threshold would have produced over the stored requests.
+    """
+
+    threshold: float = Field(description="Candidate violation threshold")
+    flagged: int = Field(description="Requests whose risky confidence reaches the threshold")
+    flag_rate: float = Field(description="Fraction of requests flagged")
+    precision: float | None = Field(default=None, description="Flagged requests labelled risky, out of all flagged. Requires labels")
+    recall: float | None = Field(default=None, description="Requests labelled risky that were flagged. Requires labels")
+    f1: float | None = Field(default=None, description="Harmonic mean of precision and recall. Requires labels")
+
+
+def load_store(path: str | Path, risk_name: str | None = None) -> np.ndarray:
+    """
+    Read a LogprobStore file into a structured array, optionally for one risk. When a request was
+    scored more than once only its last record is kept.
+    """
+    data = Path(path).read_bytes()
+    records = np.frombuffer(data, dtype=RECORD_DTYPE, count=len(data) // RECORD_DTYPE.itemsize)
+    if risk_name is not None:
+        records = records[records["risk"] == risk_name.encode("utf-8")[:32]]
+    _, last = np.unique(records["key"][::-1], return_index=True)
+    return records[np.sort(len(records) - 1 - last)]
+
+
+def risky_probabilities(records: np.ndarray) -> np.ndarray:
+    """
+    P_risky of each record, the same two-way softmax parse_output applies but without rounding.
+    """
+    return 1.0 / (1.0 + np.exp(records["log_safe"] - records["log_risky"]))
+
+
+def match_labels(records: np.ndarray, labels: dict[str, bool]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pair stored records with ground truth labels keyed by request_key hex digest. Returns a mask of
+    the records that have a label and the labels of those records.
+    """
+    label_keys = np.array([bytes.fromhex(key) for key in labels], dtype="S32")
+    label_values = np.fromiter(labels.values(), dtype=bool, count=len(labels))
+    order = np.argsort(label_keys)
+    label_keys, label_values = label_keys[order], label_values[order]
+
+    position = np.clip(np.searchsorted(label_keys, records["key"]), 0, max(len(label_keys) - 1, 0))
+    mask = label_keys[position] == records["key"] if len(label_keys) else np.zeros(len(records), dtype=bool)
+    return mask, label_values[position[mask]]
+
+
+def sweep(p_risky: np.ndarray, thresholds: np.ndarray, labels: np.ndarray | None = None) -> list[ThresholdMetrics]:
+    """
+    Flag counts, and precision and recall when labels are given, for every candidate threshold.
+    A request is flagged when its risky confidence is at least the threshold, like is_risky.
+    """
+    total = len(p_risky)
+    order = np.argsort(-p_risky, kind="stable")
+    descending = p_risky[order]
+    # Number of requests with p_risky >= threshold, for every threshold at once
+    flagged = np.searchsorted(-descending, -thresholds, side="right")
+
+    if labels is not None:
+        true_positives = np.concatenate(([0], np.cumsum(labels[order])))[flagged]
+        positives = int(labels.sum())
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(flagged > 0, true_positives / flagged, 1.0)
+            recall = true_positives / positives if positives else np.zeros(len(thresholds))
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    metrics = []
+    for i, threshold in enumerate(thresholds):
+        values: dict[str, Any] = {
+            "threshold": float(threshold),
+            "flagged": int(flagged[i]),
+            "flag_rate": float(flagged[i] / total) if total else 0.0,
+        }
+        if labels is not None:
+            values.update(precision=float(precision[i]), recall=float(recall[i]), f1=float(f1[i]))
+        metrics.append(ThresholdMetrics(**values))
+    return metrics
+
+
+def load_labels(path: str | Path) -> dict[str, bool]:
+    labels = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                labels[row["request_key"]] = bool(row["label"])
+    return labels
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recompute Granite Guardian verdicts for candidate violation thresholds from a logprob store, "
+        "without calling the model again. With labels, precision and recall are reported for each threshold.",
+    )
+    parser.add_argument("store", help="File written through the logprob_store_path setting")
+    parser.add_argument("--risk", help="Only use records of this risk")
+    parser.add_argument("--labels", help='JSONL ground truth, one {"request_key": ..., "label": true|false} per line')
+    parser.add_argument("--thresholds", help="Comma separated thresholds, defaults to 0.05 to 0.95 in steps of 0.05")
+    parser.add_argument("--json", action="store_true", help="Print metrics as JSON lines")
+    args = parser.parse_args()
+
+    records = load_store(args.store, args.risk)
+    labels = None
+    if args.labels:
+        mask, labels = match_labels(records, load_labels(args.labels))
+        records = records[mask]
+    if args.thresholds:
+        thresholds = np.array([float(t) for t in args.thresholds.split(",")])
+    else:
+        thresholds = np.round(np.arange(0.05, 1.0, 0.05), 2)
+
+    metrics = sweep(risky_probabilities(records), thresholds, labels)
+    if args.json:
+        for m in metrics:
+            print(m.model_dump_json())
+        return
+
+    print(f"{len(records)} requests")
+    print(f"{'threshold':>9} {'flagged':>8} {'rate':>7}" + (f" {'precision':>9} {'recall':>7} {'f1':>6}" if labels is not None else ""))
+    for m in metrics:
+        line = f"{m.threshold:>9.3f} {m.flagged:>8} {m.flag_rate:>7.3f}"
+        if labels is not None:
+            line += f" {m.precision:>9.3f} {m.recall:>7.3f} {m.f1:>6.3f}"
+        print(line)
@@ -0,0 +1,183 @@
+import asyncio
+import re
+from typing import Any
+
+from llama_stack.apis.inference import Message
+from llama_stack.log import get_logger
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import TruncationStrategy
+from granite_guardian_shield.helpers import riskiest_verdict
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.prompt import GuardianPromptRenderer
+
+logger = get_logger(name=__name__, category="safety")
+
+# Roughly how a BPE tokenizer splits text: short word pieces and single punctuation marks
+_APPROXIMATE_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+TRUNCATION_MARKER = "\n...\n"
+
+
+class TokenCounter:
+    """
+    Counts and slices text by tokens. Uses a Hugging Face fast tokenizer when one is configured,
+    otherwise approximates tokens as short word pieces and punctuation.
+    """
+
+    def __init__(self, tokenizer: Any = None):
+        self.tokenizer = tokenizer
+
+    def offsets(self, text: str) -> list[int]:
+        """
+        Character offset at which each token of `text` starts.
+        """
+        if self.tokenizer is None:
+            return [match.start() for match in _APPROXIMATE_TOKEN.finditer(text)]
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [start for start, _ in encoding["offset_mapping"]]
+
+    def count(self, text: str) -> int:
+        return len(self.offsets(text))
+
+
+def _slice(text: str, offsets: list[int], start: int, end: int) -> str:
+    begin = offsets[start] if start < len(offsets) else len(text)
+    stop = offsets[end] if end < len(offsets) else len(text)
+    return text[begin:stop]
+
+
+def truncate_text(text: str, offsets: list[int], budget: int, strategy: TruncationStrategy) -> str:
+    """
+    Reduce `text` to at most `budget` tokens. sliding_window is treated as head_tail here since
+    windows are only built for the message being assessed.
+    """
+    total = len(offsets)
+    if total <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    if strategy == TruncationStrategy.head:
+        return _slice(text, offsets, 0, budget)
+    if strategy == TruncationStrategy.tail:
+        return _slice(text, offsets, total - budget, total)
+
+    head = budget // 2
+    tail = budget - head
+    return _slice(text, offsets, 0, head) + TRUNCATION_MARKER + _slice(text, offsets, total - tail, total)
+
+
+def window_spans(total: int, size: int, overlap: int) -> list[tuple[int, int]]:
+    """
+    Token index spans of windows of `size` tokens over `total` tokens where consecutive windows
+    share `overlap` tokens.
+    """
+    step = max(1, size - overlap)
+    spans = []
+    start = 0
+    while True:
+        end = min(start + size, total)
+        spans.append((start, end))
+        if end == total:
+            return spans
+        start += step
+
+
+def split_windows(text: str, offsets: list[int], size: int, overlap: int) -> list[str]:
+    """
+    Split `text` into windows of `size` tokens where consecutive windows share `overlap` tokens.
+    """
+    return [_slice(text, offsets, start, end) for start, end in window_spans(len(offsets), size, overlap)]
+
+
+def fit_to_budget(lengths: list[int], budget: int) -> list[int]:
+    """
+    Per-message token allowances that fit `budget` in total. Short messages are kept whole and the
+    longest messages are shortened first.
+    """
+    allowances = list(lengths)
+    if sum(lengths) <= budget:
+        return allowances
+
+    remaining = budget
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for rank, i in enumerate(order):
+        allowances[i] = min(lengths[i], remaining // (len(lengths) - rank))
+        remaining -= allowances[i]
+    return allowances
+
+
+class TokenBudgetInference(Inference):
+    """
+    Inference wrapper that enforces a risk's token budget before messages are sent to Granite Guardian.
+    Messages over budget are truncated, or with the sliding_window strategy the last message is split
+    into overlapping windows that are scored concurrently and the riskiest verdict is kept.
+    Token counts are reported on the returned verdict.
+    """
+
+    def __init__(self, inference: Inference, counter: TokenCounter, renderer: GuardianPromptRenderer | None = None):
+        self.inference = inference
+        self.counter = counter
+        self.renderer = renderer
+
+    async def initialize(self) -> None:
+        await self.inference.initialize()
+
+    async def shutdown(self) -> None:
+        await self.inference.shutdown()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        budget = risk.token_budget
+        if not budget:
+            return await self.inference.run(risk, messages)
+
+        contents = [str(message.content) for message in messages]
+        offsets = [self.counter.offsets(content) for content in contents]
+        lengths = [len(o) for o in offsets]
+        input_tokens = sum(lengths)
+
+        if input_tokens <= budget:
+            requests = [messages]
+            sent_tokens = input_tokens
+        elif risk.truncation == TruncationStrategy.sliding_window:
+            # Earlier messages are context, cap them to half the budget and window the last message
+            allowances = fit_to_budget(lengths[:-1], budget // 2)
+            earlier = self._truncate(messages[:-1], contents, offsets, allowances, risk.truncation)
+            size = budget - sum(allowances)
+            spans = window_spans(lengths[-1], size, min(risk.window_overlap, size - 1))
+            requests = [
+                earlier + [messages[-1].model_copy(update={"content": _slice(contents[-1], offsets[-1], start, end)})]
+                for start, end in spans
+            ]
+            sent_tokens = sum(allowances) * len(spans) + sum(end - start for start, end in spans)
+        else:
+            allowances = fit_to_budget(lengths, budget)
+            requests = [self._truncate(messages, contents, offsets, allowances, risk.truncation)]
+            sent_tokens = sum(allowances)
+
+        if len(requests) > 1:
+            logger.debug(f"Scoring {risk.name} over {len(requests)} windows of {input_tokens} tokens")
+        verdicts = await asyncio.gather(*(self.inference.run(risk, request) for request in requests))
+
+        update: dict[str, Any] = {"input_tokens": input_tokens, "sent_tokens": sent_tokens}
+        if len(requests) > 1:
+            update["windows"] = len(requests)
+        if self.renderer is not None:
+            update["prompt_tokens"] = sum(self.counter.count(self.renderer.render(risk, request)) for request in requests)
+        return riskiest_verdict(verdicts).model_copy(update=update)
+
+    @staticmethod
+    def _truncate(
+        messages: list[Message],
+        contents: list[str],
+        offsets: list[list[int]],
+        allowances: list[int],
+        strategy: TruncationStrategy,
+    ) -> list[Message]:
+        truncated = []
+        for message, content, message_offsets, allowance in zip(messages, contents, offsets, allowances):
+            if len(message_offsets) > allowance:
+                message = message.model_copy(update={"content": truncate_text(content, message_offsets, allowance, strategy)})
+            truncated.append(message)
+        return truncated
@@ -0,0 +1,282 @@
+import asyncio
+import time
+
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+
+from granite_guardian_shield.admission import (AdaptiveLimit,
+                                               AdmissionController,
+                                               AdmissionRejected,
+                                               LimitedInference,
+                                               call_scheduling)
+from granite_guardian_shield import create_inference
+from granite_guardian_shield.cache import CachingInference
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import (AdaptiveConcurrency,
+                                               FailurePolicy, Priority)
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.telemetry import phase_timings
+
+
+class SlowInference(Inference):
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return RiskProbability(risk_name=risk.name, is_risky=False, safe_confidence=0.9, risky_confidence=0.1)
+
+
+@pytest.mark.asyncio
+async def test_limited_inference_bounds_concurrency():
+    inner = SlowInference()
+    controller = AdmissionController(max_concurrency=2)
+    inference = LimitedInference(inner, controller, FailurePolicy.closed)
+    messages = [UserMessage(content="hello", role="user")]
+
+    await asyncio.gather(*(inference.run(Risk(name="harm"), messages) for _ in range(6)))
+
+    assert inner.peak == 2
+    stats = controller.stats()
+    assert stats.admitted == 6
+    assert stats.queued == 4
+    assert stats.in_flight == 0
+    assert stats.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_nested_limits_record_the_queue_phase_once_per_call():
+    inner = LimitedInference(SlowInference(), AdmissionController(max_concurrency=1), FailurePolicy.closed)
+    inference = LimitedInference(inner, AdmissionController(max_concurrency=1), FailurePolicy.closed)
+    phase_timings.reset()
+
+    await asyncio.gather(*(inference.run(Risk(name="harm"), [UserMessage(content="hello", role="user")]) for _ in range(3)))
+
+    assert phase_timings.stats()["queue"]["harm"].count == 3
+
+
+def test_provider_limit_sits_below_the_cache():
+    config = GraniteGuardianShieldConfig(base_url="http://localhost", api_key="test", max_concurrency=4, cache_max_size=10)
+    inference, _, layers = create_inference(config)
+
+    assert isinstance(inference.inference, CachingInference)
+    limited = inference.inference.inference
+    assert isinstance(limited, LimitedInference)
+    assert limited.controller is layers.admission
+    assert layers.cache is inference.inference.cache
+    assert layers.breaker is None and layers.balancer is None and layers.adaptive_limits == []
+
+
+def test_create_inference_keeps_endpoint_layers():
+    config = GraniteGuardianShieldConfig(
+        base_url=["http://guardian-1", "http://guardian-2"],
+        api_key="test",
+        breaker_failure_rate=0.5,
+        adaptive_concurrency=AdaptiveConcurrency.gradient,
+    )
+    _, _, layers = create_inference(config)
+
+    assert [endpoint.name for endpoint in layers.balancer.endpoints] == config.base_urls
+    assert [adaptive.name for adaptive in layers.adaptive_limits] == config.base_urls
+    assert layers.breaker is not None
+
+
+@pytest.mark.asyncio
+async def test_admission_rejects_when_queue_is_full():
+    controller = AdmissionController(max_concurrency=1, max_queue_size=0)
+    await controller.acquire()
+
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire()
+    assert controller.stats().rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_admission_rejects_after_queue_wait_deadline():
+    controller = AdmissionController(max_concurrency=1, max_queue_wait_seconds=0.01)
+    await controller.acquire()
+
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire()
+
+    controller.release()
+    stats = controller.stats()
+    assert stats.queue_depth == 0
+    assert stats.in_flight == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("policy,is_risky", [(FailurePolicy.closed, True), (FailurePolicy.open, False)])
+async def test_limited_inference_applies_failure_policy(policy, is_risky):
+    controller = AdmissionController(max_concurrency=1, max_queue_size=0)
+    inference = LimitedInference(SlowInference(), controller, policy)
+    await controller.acquire()
+
+    verdict = await inference.run(Risk(name="harm"), [UserMessage(content="hello", role="user")])
+
+    assert verdict.is_risky is is_risky
+    assert verdict.degraded_reason is not None
+
+
+async def queue_waiters(controller: AdmissionController, waiters: list[tuple[str, Priority, float | None]], served: list[str]) -> list[asyncio.Task]:
+    async def wait(name: str, priority: Priority, deadline: float | None) -> None:
+        with call_scheduling(priority, deadline):
+            await controller.acquire()
+        served.append(name)
+
+    tasks = []
+    for name, priority, deadline in waiters:
+        tasks.append(asyncio.ensure_future(wait(name, priority, deadline)))
+        await asyncio.sleep(0)
+    return tasks
+
+
+async def serve_all(controller: AdmissionController, count: int) -> None:
+    for _ in range(count):
+        controller.release()
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_by_priority_then_deadline():
+    controller = AdmissionController(max_concurrency=1)
+    await controller.acquire()
+    served: list[str] = []
+    later = time.monotonic() + 60
+    await queue_waiters(controller, [
+        ("low", Priority.low, None),
+        ("normal", Priority.normal, None),
+        ("high-late", Priority.high, later + 1),
+        ("high-soon", Priority.high, later),
+    ], served)
+
+    await serve_all(controller, 4)
+    assert served == ["high-soon", "high-late", "normal", "low"]
+    stats = controller.stats()
+    assert stats.priorities[Priority.high].queued == 2
+    assert stats.priorities[Priority.low].queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_low_priority_gets_its_minimum_share():
+    controller = AdmissionController(max_concurrency=1, min_share=0.5)
+    await controller.acquire()
+    served: list[str] = []
+    await queue_waiters(controller, [(f"high-{i}", Priority.high, None) for i in range(3)] + [("low", Priority.low, None)], served)
+
+    await serve_all(controller, 4)
+    assert served == ["high-0", "low", "high-1", "high-2"]
+
+
+@pytest.mark.asyncio
+async def test_minimum_share_is_kept_when_its_reciprocal_is_not_whole():
+    controller = AdmissionController(max_concurrency=1, min_share=0.3)
+    await controller.acquire()
+    served: list[str] = []
+    waiters = [(f"high-{i}", Priority.high, None) for i in range(6)] + [(f"low-{i}", Priority.low, None) for i in range(3)]
+    await queue_waiters(controller, waiters, served)
+
+    await serve_all(controller, 9)
+    # Low priority gets one slot in three, at least its 30% share
+    assert [name.split("-")[0] for name in served] == ["high", "high", "low"] * 3
+
+
+@pytest.mark.asyncio
+async def test_requests_past_their_deadline_are_refused():
+    controller = AdmissionController(max_concurrency=1)
+    await controller.acquire()
+
+    with call_scheduling(Priority.low, time.monotonic() + 0.01):
+        with pytest.raises(AdmissionRejected, match="Deadline passed while waiting"):
+            await controller.acquire()
+    with call_scheduling(Priority.low, time.monotonic() - 1):
+        with pytest.raises(AdmissionRejected, match="Deadline passed before"):
+            await controller.acquire()
+
+    stats = controller.stats()
+    assert stats.priorities[Priority.low].expired == 2
+    assert stats.queue_depth == 0
+    controller.release()
+    assert controller.stats().in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_changing_the_limit_admits_or_retires_slots():
+    controller = AdmissionController(max_concurrency=1)
+    await controller.acquire()
+    served: list[str] = []
+    await queue_waiters(controller, [("first", Priority.normal, None), ("second", Priority.normal, None)], served)
+
+    controller.set_limit(3)
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert served == ["first", "second"]
+    assert controller.stats().in_flight == 3
+
+    controller.set_limit(1)
+    controller.release()
+    controller.release()
+    stats = controller.stats()
+    assert stats.limit == 1
+    assert stats.in_flight == 1
+
+
+def test_aimd_limit_grows_while_in_use_and_backs_off_when_slow():
+    controller = AdmissionController(max_concurrency=4)
+    adaptive = AdaptiveLimit(controller, AdaptiveConcurrency.aimd, min_limit=2, max_limit=8)
+
+    for _ in range(12):
+        adaptive.observe(0.01, in_flight=4)
+    assert controller.max_concurrency == 6
+    # An idle limit isn't raised
+    for _ in range(20):
+        adaptive.observe(0.01, in_flight=1)
+    assert controller.max_concurrency == 6
+
+    adaptive.observe(0.05, in_flight=6)
+    assert controller.max_concurrency == 5
+    for _ in range(20):
+        adaptive.observe(None, in_flight=5)
+    assert controller.max_concurrency == 2
+
+    stats = adaptive.stats()
+    assert stats.baseline_latency_ms == pytest.approx(10)
+    assert stats.failures == 20
+    assert stats.increases == 2
+    assert stats.decreases == 4
+
+
+def test_gradient_limit_follows_latency():
+    controller = AdmissionController(max_concurrency=16)
+    adaptive = AdaptiveLimit(controller, AdaptiveConcurrency.gradient, max_limit=64)
+
+    adaptive.observe(0.01, in_flight=16)
+    for _ in range(50):
+        adaptive.observe(0.08, in_flight=controller.max_concurrency)
+    # Latency well above the tolerated baseline roughly halves the limit, less its headroom
+    assert controller.max_concurrency < 8
+
+    for _ in range(200):
+        adaptive.observe(0.01, in_flight=controller.max_concurrency)
+    assert controller.max_concurrency == 64
+    assert adaptive.stats().latency_ms == pytest.approx(10, rel=0.01)
+
+
+@pytest.mark.asyncio
+async def test_limited_inference_reports_latency_to_adaptive_limit():
+    controller = AdmissionController(max_concurrency=2)
+    adaptive = AdaptiveLimit(controller, AdaptiveConcurrency.aimd)
+    inference = LimitedInference(SlowInference(), controller, FailurePolicy.closed, adaptive)
+    messages = [UserMessage(content="hello", role="user")]
+
+    await asyncio.gather(*(inference.run(Risk(name="harm"), messages) for _ in range(6)))
+
+    stats = adaptive.stats()
+    assert stats.samples == 6
+    assert stats.baseline_latency_ms >= 10
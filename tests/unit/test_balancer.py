@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+
+from granite_guardian_shield.balancer import (HEDGE_MIN_SAMPLES,
+                                              BalancedInference, Endpoint)
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import LoadBalancing
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+
+MESSAGES = [UserMessage(content="hello", role="user")]
+
+
+class ReplicaInference(Inference):
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise ConnectionError("replica down")
+        return RiskProbability(risk_name=risk.name, is_risky=False, safe_confidence=0.9, risky_confidence=0.1)
+
+
+def test_config_accepts_a_list_of_endpoints():
+    assert GraniteGuardianShieldConfig(base_url="http://a/v1").base_urls == ["http://a/v1"]
+    config = GraniteGuardianShieldConfig(base_url=["http://a/v1", "http://b/v1"])
+    assert config.base_urls == ["http://a/v1", "http://b/v1"]
+    with pytest.raises(ValueError):
+        GraniteGuardianShieldConfig(base_url=[])
+
+
+@pytest.mark.asyncio
+async def test_least_outstanding_spreads_concurrent_calls():
+    replicas = [ReplicaInference(delay=0.01) for _ in range(3)]
+    inference = BalancedInference([Endpoint(f"r{i}", r) for i, r in enumerate(replicas)])
+
+    await asyncio.gather(*(inference.run(Risk(name="harm"), MESSAGES) for _ in range(9)))
+
+    assert [r.calls for r in replicas] == [3, 3, 3]
+    assert all(e.outstanding == 0 for e in inference.stats().endpoints)
+
+
+@pytest.mark.asyncio
+async def test_ewma_prefers_the_faster_endpoint():
+    fast, slow = ReplicaInference(delay=0.001), ReplicaInference(delay=0.02)
+    inference = BalancedInference([Endpoint("fast", fast), Endpoint("slow", slow)], policy=LoadBalancing.ewma)
+
+    for _ in range(20):
+        await inference.run(Risk(name="harm"), MESSAGES)
+
+    # Each endpoint is tried once to learn its latency, after that the fast one gets every call
+    assert slow.calls == 1
+    assert fast.calls == 19
+
+
+@pytest.mark.asyncio
+async def test_failing_endpoint_is_ejected_and_returns_after_ejection_seconds():
+    healthy, broken = ReplicaInference(), ReplicaInference(fail=True)
+    endpoints = [Endpoint("healthy", healthy), Endpoint("broken", broken)]
+    inference = BalancedInference(endpoints, ejection_failures=2, ejection_seconds=0.05)
+
+    failures = 0
+    for _ in range(20):
+        try:
+            await inference.run(Risk(name="harm"), MESSAGES)
+        except ConnectionError:
+            failures += 1
+
+    assert failures == 2
+    assert broken.calls == 2
+    stats = {e.name: e for e in inference.stats().endpoints}
+    assert stats["broken"].ejected
+    assert stats["broken"].ejections == 1
+
+    await asyncio.sleep(0.06)
+    assert not inference.stats().endpoints[1].ejected
+    broken.fail = False
+    await asyncio.gather(*(inference.run(Risk(name="harm"), MESSAGES) for _ in range(2)))
+    assert broken.calls == 3
+    assert endpoints[1].consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_all_endpoints_ejected_still_serves_calls():
+    replica = ReplicaInference(fail=True)
+    inference = BalancedInference([Endpoint("a", replica), Endpoint("b", ReplicaInference(fail=True))], ejection_failures=1)
+
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            await inference.run(Risk(name="harm"), MESSAGES)
+    assert all(e.ejected for e in inference.stats().endpoints)
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_loser_cancelled():
+    primary, secondary = ReplicaInference(delay=0.002), ReplicaInference(delay=0.002)
+    inference = BalancedInference([Endpoint("primary", primary), Endpoint("secondary", secondary)], hedge_percentile=90)
+
+    # Learn the usual latency before any call is hedged
+    for _ in range(HEDGE_MIN_SAMPLES):
+        await inference.run(Risk(name="harm"), MESSAGES)
+    assert inference.stats().hedge_delay_ms is not None
+    assert inference.stats().hedged == 0
+
+    primary.delay = 1.0
+    secondary.calls = 0
+    inference._pick = lambda exclude=None: inference.endpoints[1 if exclude else 0]
+    verdict = await asyncio.wait_for(inference.run(Risk(name="harm"), MESSAGES), 0.5)
+    await asyncio.sleep(0)
+
+    assert verdict.risk_name == "harm"
+    assert secondary.calls == 1
+    assert primary.cancelled == 1
+    stats = inference.stats()
+    assert stats.hedged == 1
+    assert stats.hedge_wins == 1
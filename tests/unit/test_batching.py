@@ -0,0 +1,120 @@
+import asyncio
+import math
+
+import httpx
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+from openai import NotFoundError
+from openai.types.completion import Completion
+from openai.types.completion_choice import CompletionChoice, Logprobs
+
+from granite_guardian_shield.batching import BatchingVLLMInference
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.prompt import GuardianPromptRenderer
+
+TEMPLATE = (
+    "{% for message in messages %}{{ message['role'] }}: {{ message['content'] }}\n{% endfor %}"
+    "risk: {{ guardian_config['risk_name'] }}"
+)
+
+
+def completion_choice(index: int, label: str, p_risky: float) -> CompletionChoice:
+    return CompletionChoice(
+        index=index,
+        finish_reason="stop",
+        text=label,
+        logprobs=Logprobs(top_logprobs=[{"Yes": math.log(p_risky), "No": math.log(1 - p_risky)}]),
+    )
+
+
+class FakeCompletions:
+    def __init__(self, error: Exception | None = None):
+        self.requests: list[list[str]] = []
+        self.error = error
+
+    async def create(self, prompt: list[str], **kwargs) -> Completion:
+        self.requests.append(prompt)
+        if self.error:
+            raise self.error
+        return Completion(
+            id="cmpl-abc",
+            created=0,
+            model="test-model",
+            object="text_completion",
+            choices=[
+                completion_choice(i, "Yes" if "violence" in p else "No", 0.9 if "violence" in p else 0.1)
+                for i, p in reversed(list(enumerate(prompt)))
+            ],
+        )
+
+
+class FakeOpenAI:
+    def __init__(self, error: Exception | None = None):
+        self.completions = FakeCompletions(error)
+
+
+class FallbackInference(Inference):
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls += 1
+        return RiskProbability(risk_name=risk.name, is_risky=False, safe_confidence=1.0, risky_confidence=0.0)
+
+
+def batching_inference(client: FakeOpenAI, fallback: Inference, max_batch_size: int = 8) -> BatchingVLLMInference:
+    return BatchingVLLMInference(
+        client,
+        "test-model",
+        renderer=GuardianPromptRenderer(TEMPLATE),
+        fallback=fallback,
+        max_batch_size=max_batch_size,
+        batch_window_seconds=0.01,
+    )
+
+
+@pytest.mark.asyncio
+async def test_batching_sends_concurrent_checks_in_one_request():
+    client = FakeOpenAI()
+    inference = batching_inference(client, FallbackInference())
+    messages = [UserMessage(content="hello", role="user")]
+
+    harm, violence, harm_again = await asyncio.gather(
+        inference.run(Risk(name="harm"), messages),
+        inference.run(Risk(name="violence"), messages),
+        inference.run(Risk(name="harm"), messages),
+    )
+
+    assert client.completions.requests == [["user: hello\nrisk: harm", "user: hello\nrisk: violence"]]
+    assert harm.is_risky is False
+    assert harm_again.risk_name == "harm"
+    assert violence.is_risky is True
+    assert violence.risk_name == "violence"
+
+
+@pytest.mark.asyncio
+async def test_batching_flushes_when_batch_is_full():
+    client = FakeOpenAI()
+    inference = batching_inference(client, FallbackInference(), max_batch_size=2)
+    messages = [UserMessage(content="hello", role="user")]
+
+    await asyncio.gather(*(inference.run(Risk(name=f"risk_{i}"), messages) for i in range(3)))
+
+    assert [len(r) for r in client.completions.requests] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_batching_falls_back_when_endpoint_is_missing():
+    request = httpx.Request("POST", "http://guardian/v1/completions")
+    error = NotFoundError("not found", response=httpx.Response(404, request=request), body=None)
+    fallback = FallbackInference()
+    inference = batching_inference(FakeOpenAI(error), fallback)
+    messages = [UserMessage(content="hello", role="user")]
+
+    await inference.run(Risk(name="harm"), messages)
+    await inference.run(Risk(name="harm"), messages)
+
+    assert inference.batching_supported is False
+    assert fallback.calls == 2
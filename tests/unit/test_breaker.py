@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+
+from granite_guardian_shield.breaker import BreakerInference, CircuitBreaker
+from granite_guardian_shield.cache import CachingInference, VerdictCache
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import CircuitState, FailurePolicy
+from granite_guardian_shield.helpers import failure_verdict
+from granite_guardian_shield.inference import Inference, request_key
+from granite_guardian_shield.models import RiskProbability
+
+MESSAGES = [UserMessage(content="hello", role="user")]
+
+
+class FlakyInference(Inference):
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.delay = 0.0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("Granite Guardian is down")
+        return RiskProbability(risk_name=risk.name, is_risky=False, safe_confidence=0.9, risky_confidence=0.1)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Shift time.monotonic forward by clock[0] seconds, the event loop's clock keeps running
+    offset = [0.0]
+    monotonic = time.monotonic
+    monkeypatch.setattr(time, "monotonic", lambda: monotonic() + offset[0])
+    return offset
+
+
+async def fail_calls(inference: Inference, count: int) -> None:
+    for _ in range(count):
+        with pytest.raises(ConnectionError):
+            await inference.run(Risk(name="harm"), MESSAGES)
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_on_failure_rate_and_fails_fast(clock):
+    inner = FlakyInference()
+    breaker = CircuitBreaker(failure_rate=0.5, window_size=4, min_calls=4)
+    inference = BreakerInference(inner, breaker, FailurePolicy.closed)
+
+    await inference.run(Risk(name="harm"), MESSAGES)
+    inner.fail = True
+    await fail_calls(inference, 2)
+    assert breaker.state == CircuitState.closed
+    await fail_calls(inference, 1)
+    assert breaker.state == CircuitState.open
+
+    verdict = await inference.run(Risk(name="harm"), MESSAGES)
+    open_verdict = await inference.run(Risk(name="harm", failure_policy=FailurePolicy.open), MESSAGES)
+    assert inner.calls == 4
+    assert verdict.is_risky
+    assert not open_verdict.is_risky
+    assert "circuit breaker is open" in verdict.degraded_reason
+    stats = breaker.stats()
+    assert stats.opened == 1
+    assert stats.short_circuited == 2
+
+
+@pytest.mark.asyncio
+async def test_breaker_counts_slow_calls_as_failures(clock):
+    inner = FlakyInference()
+    inner.delay = 0.02
+    breaker = CircuitBreaker(failure_rate=1.0, window_size=2, min_calls=2, slow_call_seconds=0.005)
+    inference = BreakerInference(inner, breaker, FailurePolicy.closed)
+
+    for _ in range(2):
+        assert not (await inference.run(Risk(name="harm"), MESSAGES)).is_risky
+    assert breaker.state == CircuitState.open
+
+
+@pytest.mark.asyncio
+async def test_half_open_probes_close_or_reopen_the_breaker(clock):
+    inner = FlakyInference()
+    breaker = CircuitBreaker(failure_rate=1.0, window_size=2, min_calls=2, open_seconds=10, half_open_probes=2)
+    inference = BreakerInference(inner, breaker, FailurePolicy.closed)
+    inner.fail = True
+    await fail_calls(inference, 2)
+    assert breaker.state == CircuitState.open
+
+    # A failed probe opens the breaker again
+    clock[0] += 10
+    await fail_calls(inference, 1)
+    assert breaker.state == CircuitState.open
+    assert inner.calls == 3
+
+    # Enough successful probes close it
+    clock[0] += 10
+    inner.fail = False
+    await inference.run(Risk(name="harm"), MESSAGES)
+    assert breaker.state == CircuitState.half_open
+    await inference.run(Risk(name="harm"), MESSAGES)
+    assert breaker.state == CircuitState.closed
+    assert breaker.stats().probes == 3
+
+
+@pytest.mark.asyncio
+async def test_half_open_limits_concurrent_probes(clock):
+    inner = FlakyInference()
+    breaker = CircuitBreaker(failure_rate=1.0, window_size=1, min_calls=1, open_seconds=10, half_open_probes=1)
+    inference = BreakerInference(inner, breaker, FailurePolicy.open)
+    inner.fail = True
+    await fail_calls(inference, 1)
+
+    clock[0] += 10
+    inner.fail = False
+    inner.delay = 0.01
+    verdicts = await asyncio.gather(*(inference.run(Risk(name="harm"), MESSAGES) for _ in range(3)))
+
+    assert inner.calls == 2
+    assert sum(v.degraded_reason is not None for v in verdicts) == 2
+    assert breaker.state == CircuitState.closed
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_serves_stale_cached_verdicts(clock):
+    inner = FlakyInference()
+    cache = VerdictCache(max_size=10, ttl_seconds=60, stale_seconds=600)
+    breaker = CircuitBreaker(failure_rate=1.0, window_size=1, min_calls=1, open_seconds=3600)
+    inference = CachingInference(BreakerInference(inner, breaker, FailurePolicy.closed, cache), cache)
+
+    await inference.run(Risk(name="harm"), MESSAGES)
+    clock[0] += 120
+    inner.fail = True
+    await fail_calls(inference, 1)
+
+    verdict = await inference.run(Risk(name="harm"), MESSAGES)
+    assert not verdict.is_risky
+    assert verdict.risky_confidence == 0.1
+    assert "served a cached verdict" in verdict.degraded_reason
+    # Unknown messages still get the failure policy
+    assert (await inference.run(Risk(name="harm"), [UserMessage(content="other", role="user")])).is_risky
+    assert breaker.stats().stale_served == 1
+    # Degraded verdicts are not cached as fresh ones
+    assert cache.get(request_key(Risk(name="harm"), MESSAGES)) is None
+    clock[0] += 600
+    assert (await inference.run(Risk(name="harm"), MESSAGES)).is_risky
+
+
+@pytest.mark.asyncio
+async def test_degraded_verdicts_from_below_are_not_counted_as_successes(clock):
+    inner = FlakyInference()
+    breaker = CircuitBreaker(failure_rate=0.5, window_size=4, min_calls=2)
+    inference = BreakerInference(inner, breaker, FailurePolicy.closed)
+
+    async def shed(risk: Risk, messages: list[Message]) -> RiskProbability:
+        # What an adaptive LimitedInference below the breaker returns when its limit is full
+        return failure_verdict(risk, FailurePolicy.closed, "Granite Guardian concurrency limit reached")
+
+    inner.run = shed
+    for _ in range(4):
+        assert (await inference.run(Risk(name="harm"), MESSAGES)).degraded_reason
+    assert breaker.stats().window_calls == 0
+
+    del inner.run
+    inner.fail = True
+    await fail_calls(inference, 2)
+    assert breaker.state == CircuitState.open
+
+
+def test_serving_stale_verdicts_requires_a_cache():
+    with pytest.raises(ValueError):
+        GraniteGuardianShieldConfig(base_url="http://localhost", breaker_failure_rate=0.5, breaker_serve_stale_seconds=60)
@@ -0,0 +1,66 @@
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+
+from granite_guardian_shield.cache import CachingInference, VerdictCache
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+
+
+class CountingInference(Inference):
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls += 1
+        return RiskProbability(
+            risk_name=risk.name,
+            is_risky=False,
+            risky_confidence=0.01,
+            safe_confidence=0.99,
+        )
+
+
+def verdict(name: str = "harm") -> RiskProbability:
+    return RiskProbability(risk_name=name, is_risky=False, safe_confidence=0.9, risky_confidence=0.1)
+
+
+def test_verdict_cache_evicts_least_recently_used():
+    cache = VerdictCache(max_size=2, ttl_seconds=60)
+    cache.put("a", verdict())
+    cache.put("b", verdict())
+    assert cache.get("a") is not None
+    cache.put("c", verdict())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.size == 2
+
+
+def test_verdict_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("granite_guardian_shield.cache.time.monotonic", lambda: now[0])
+    cache = VerdictCache(max_size=2, ttl_seconds=10)
+    cache.put("a", verdict())
+
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats().expirations == 1
+
+
+@pytest.mark.asyncio
+async def test_caching_inference_reuses_verdicts():
+    inner = CountingInference()
+    inference = CachingInference(inner, VerdictCache(max_size=10, ttl_seconds=60))
+    messages = [UserMessage(content="hello", role="user")]
+
+    await inference.run(Risk(name="harm"), messages)
+    await inference.run(Risk(name="harm"), [UserMessage(content="hello", role="user")])
+    await inference.run(Risk(name="harm", violation_threshold=0.5), messages)
+
+    assert inner.calls == 2
+    stats = inference.cache.stats()
+    assert stats.hits == 1
+    assert stats.misses == 2
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from llama_stack.apis.common.content_types import TextContentItem
+from llama_stack.apis.inference import (CompletionMessage, Message,
+                                        StopReason, ToolCall,
+                                        ToolResponseMessage, UserMessage)
+from llama_stack.apis.safety import Shield
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.context import ContextMessage, extract_context
+from granite_guardian_shield.inference import (Inference, conversion_scope,
+                                                convert_messages)
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.shield import GraniteGuardianShield
+from granite_guardian_shield.truncation import TokenCounter
+
+QUESTION = UserMessage(content="When was the bridge built?", role="user", context="The bridge opened in 1932.")
+RESULTS = ToolResponseMessage(
+    call_id="call-7",
+    content=[TextContentItem(text="It was built from 1923 to 1932."), TextContentItem(text="The bridge  opened in 1932.\n")],
+)
+ANSWER = CompletionMessage(content="It was built in 1932.", role="assistant", stop_reason=StopReason.end_of_turn)
+
+
+class RecordingInference(Inference):
+    def __init__(self):
+        self.calls: dict[str, list[Message]] = {}
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls[risk.name] = messages
+        return RiskProbability(risk_name=risk.name, is_risky=False, safe_confidence=0.9, risky_confidence=0.1)
+
+
+async def rag_shield(inference: Inference, *risks: str) -> GraniteGuardianShield:
+    shield = GraniteGuardianShield(inference)
+    await shield.register_shield(Shield(
+        identifier="rag",
+        provider_id="example",
+        provider_resource_id="rag",
+        params={"risks": [{"name": name} for name in risks]},
+    ))
+    return shield
+
+
+def test_context_is_deduplicated_and_capped():
+    earlier = [UserMessage(content="hi", role="user", context="Old document"), CompletionMessage(content="hello", role="assistant", stop_reason=StopReason.end_of_turn)]
+    messages = [*earlier, QUESTION, RESULTS, ANSWER]
+
+    context = extract_context(messages, TokenCounter(), None)
+    assert context.role == "context"
+    assert context.content == "The bridge opened in 1932.\n\nIt was built from 1923 to 1932."
+
+    capped = extract_context(messages, TokenCounter(), 10)
+    assert capped.content == "The bridge opened in 1932.\n\nIt was"
+    assert extract_context([UserMessage(content="hi", role="user")], TokenCounter(), None) is None
+
+
+@pytest.mark.asyncio
+async def test_rag_risks_share_one_context_extraction():
+    inference = RecordingInference()
+    shield = await rag_shield(inference, "groundedness", "answer_relevance")
+
+    await shield.run_shield("rag", [QUESTION, RESULTS, ANSWER])
+
+    context, answer = inference.calls["groundedness"]
+    assert isinstance(context, ContextMessage)
+    assert answer is ANSWER
+    assert inference.calls["answer_relevance"] == [QUESTION, ANSWER]
+    with conversion_scope():
+        messages = [QUESTION, RESULTS, ANSWER]
+        assert extract_context(messages, TokenCounter(), None) is extract_context(messages, TokenCounter(), None)
+
+
+@pytest.mark.asyncio
+async def test_context_relevance_checks_retrieved_results():
+    inference = RecordingInference()
+    shield = await rag_shield(inference, "context_relevance")
+
+    await shield.run_shield("rag", [QUESTION, RESULTS])
+
+    question, context = inference.calls["context_relevance"]
+    assert question is QUESTION
+    assert "built from 1923" in context.content
+    # Without retrieved context there is nothing to judge
+    verdict = (await shield.run_shield("rag", [UserMessage(content="hi", role="user")]))
+    assert verdict.violation is None
+
+
+@pytest.mark.asyncio
+async def test_function_call_sends_tools_question_and_calls():
+    inference = RecordingInference()
+    shield = await rag_shield(inference, "function_call")
+    call = CompletionMessage(
+        content="",
+        role="assistant",
+        stop_reason=StopReason.end_of_turn,
+        tool_calls=[ToolCall(call_id="call-1", tool_name="get_weather", arguments='{"city": "Paris"}')],
+    )
+    tools = [{"name": "get_weather", "parameters": {"city": {"type": "string"}}}]
+
+    await shield.run_shield("rag", [QUESTION, call], {"tools": tools})
+    tools_message, question, calls = inference.calls["function_call"]
+    assert tools_message.role == "tools"
+    assert json.loads(tools_message.content) == tools
+    assert question is QUESTION
+    assert json.loads(calls.content) == [{"name": "get_weather", "arguments": {"city": "Paris"}}]
+
+    # An answer without tool calls is not checked
+    del inference.calls["function_call"]
+    await shield.run_shield("rag", [QUESTION, ANSWER])
+    assert "function_call" not in inference.calls
+
+
+def test_converted_messages_keep_tool_call_ids_and_context_roles():
+    tool, context = convert_messages([RESULTS, ContextMessage(content="doc")])
+    assert tool["tool_call_id"] == "call-7"
+    assert context == {"content": "doc", "role": "context"}
@@ -0,0 +1,181 @@
+import json
+import math
+
+import pytest
+from llama_stack.apis.inference import Message
+from openai.types.chat.chat_completion import (ChatCompletion, Choice,
+                                               ChoiceLogprobs)
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.chat_completion_token_logprob import (
+    ChatCompletionTokenLogprob, TopLogprob)
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import MessageRole
+from granite_guardian_shield.evaluation import (BatchEvaluator, Checkpoint,
+                                                parse_messages)
+from granite_guardian_shield.inference import GraniteGuardianVLLMInference
+from granite_guardian_shield.logprob_store import RECORD, LogprobStore
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.risk_assessor import (RiskAssessor,
+                                                   RiskAssessorFactory)
+from granite_guardian_shield.truncation import TokenCounter
+
+
+class KeywordAssessor(RiskAssessor):
+    def __init__(self, name: str, fail_on: str | None = None):
+        self.risk = Risk(name=name)
+        self.fail_on = fail_on
+        self.seen: list[str] = []
+
+    async def run(self, messages: list[Message]) -> RiskProbability:
+        content = str(messages[-1].content)
+        self.seen.append(content)
+        if self.fail_on and self.fail_on in content:
+            raise RuntimeError("Guardian unavailable")
+        is_risky = "bomb" in content
+        return RiskProbability(risk_name=self.risk.name, is_risky=is_risky, safe_confidence=0.5, risky_confidence=0.5)
+
+
+class FakeChatCompletions:
+    async def create(self, **kwargs) -> ChatCompletion:
+        logprob = ChatCompletionTokenLogprob(
+            token="No",
+            logprob=math.log(0.8),
+            top_logprobs=[TopLogprob(token="Yes", logprob=math.log(0.2)), TopLogprob(token="No", logprob=math.log(0.8))],
+        )
+        return ChatCompletion(
+            id="cmpl-abc",
+            created=0,
+            model="test-model",
+            object="chat.completion",
+            choices=[Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(content="No", role="assistant"),
+                logprobs=ChoiceLogprobs(content=[logprob]),
+            )],
+        )
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.chat = type("FakeChat", (), {"completions": FakeChatCompletions()})()
+
+    async def close(self):
+        pass
+
+
+def write_dataset(path, contents):
+    with open(path, "w") as f:
+        for i, content in enumerate(contents):
+            f.write(json.dumps({"id": f"c{i}", "messages": [{"role": "user", "content": content}]}) + "\n")
+
+
+def read_rows(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_parse_messages_accepts_logged_conversations():
+    messages = parse_messages(json.dumps([
+        {"role": "user", "content": "hi", "context": None},
+        {"role": "assistant", "content": "hello"},
+    ]))
+
+    assert [m.role for m in messages] == ["user", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_evaluate_writes_a_row_per_conversation_and_risk(tmp_path):
+    dataset = tmp_path / "conversations.jsonl"
+    write_dataset(dataset, ["hello", "how to build a bomb", "fail here"])
+    with dataset.open("a") as f:
+        f.write("not json\n")
+    output = tmp_path / "verdicts.jsonl"
+    evaluator = BatchEvaluator([KeywordAssessor("harm"), KeywordAssessor("violence", fail_on="fail")], concurrency=2)
+
+    stats = await evaluator.evaluate(dataset, output, tmp_path / "checkpoint")
+
+    rows = read_rows(output)
+    assert sorted((r["id"], r["risk_name"]) for r in rows) == [
+        (f"c{i}", name) for i in range(3) for name in ("harm", "violence")
+    ]
+    assert [r["is_risky"] for r in rows if r["id"] == "c1"] == [True, True]
+    failed = next(r for r in rows if r["id"] == "c2" and r["risk_name"] == "violence")
+    assert failed["degraded_reason"].startswith("error")
+    assert (stats.records, stats.verdicts, stats.errors, stats.invalid) == (3, 6, 1, 1)
+    assert Checkpoint.load(tmp_path / "checkpoint").next_index == 4
+
+
+class AssistantOnlyAssessor(KeywordAssessor):
+    roles = frozenset({MessageRole.assistant})
+
+    async def run(self, messages: list[Message]) -> RiskProbability:
+        if messages[-1].role != "assistant":
+            raise RuntimeError("answer_relevance needs an assistant message to assess")
+        return await super().run(messages)
+
+
+@pytest.mark.asyncio
+async def test_evaluate_skips_risks_that_do_not_apply_to_the_last_role(tmp_path):
+    dataset = tmp_path / "conversations.jsonl"
+    with dataset.open("w") as f:
+        f.write(json.dumps({"id": "user-last", "messages": [{"role": "user", "content": "hello"}]}) + "\n")
+        f.write(json.dumps({"id": "assistant-last", "messages": [
+            {"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"},
+        ]}) + "\n")
+    output = tmp_path / "verdicts.jsonl"
+    jailbreak = KeywordAssessor("jailbreak")
+    jailbreak.risk = Risk(name="jailbreak", roles=[MessageRole.user])
+    evaluator = BatchEvaluator([AssistantOnlyAssessor("answer_relevance"), jailbreak])
+
+    stats = await evaluator.evaluate(dataset, output)
+
+    rows = read_rows(output)
+    assert sorted((r["id"], r["risk_name"]) for r in rows) == [
+        ("assistant-last", "answer_relevance"), ("user-last", "jailbreak"),
+    ]
+    assert not any(r["degraded_reason"] for r in rows)
+    assert (stats.verdicts, stats.errors, stats.not_applicable) == (2, 0, 2)
+
+
+@pytest.mark.asyncio
+async def test_evaluate_resumes_from_checkpoint(tmp_path):
+    dataset = tmp_path / "conversations.jsonl"
+    write_dataset(dataset, ["m0", "m1", "m2", "m3", "m4"])
+    output = tmp_path / "verdicts.jsonl"
+    # Rows 0, 1 and 3 were written before the checkpoint, row 2 was written after it
+    done = "".join(json.dumps({"index": i, "id": f"c{i}", "risk_name": "harm"}) + "\n" for i in (0, 1, 3))
+    output.write_text(done + json.dumps({"index": 2, "id": "c2", "risk_name": "harm"}) + "\n")
+    checkpoint = tmp_path / "checkpoint"
+    Checkpoint(next_index=2, output_offset=len(done), completed=[3]).save(checkpoint)
+    assessor = KeywordAssessor("harm")
+
+    stats = await BatchEvaluator([assessor]).evaluate(dataset, output, checkpoint)
+
+    assert sorted(assessor.seen) == ["m2", "m4"]
+    assert sorted(r["index"] for r in read_rows(output)) == [0, 1, 2, 3, 4]
+    assert (stats.records, stats.skipped) == (2, 1)
+    assert Checkpoint.load(checkpoint) == Checkpoint(next_index=5, output_offset=output.stat().st_size)
+
+
+@pytest.mark.asyncio
+async def test_rows_join_to_stored_logprobs_of_multi_turn_conversations(tmp_path):
+    dataset = tmp_path / "conversations.jsonl"
+    dataset.write_text(json.dumps({"id": "c0", "messages": [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+        {"role": "user", "content": "how do I bake bread?"},
+    ]}) + "\n")
+    store_path = tmp_path / "logprobs.bin"
+    inference = GraniteGuardianVLLMInference(FakeOpenAI(), "test-model", logprob_store=LogprobStore(store_path))
+    factory = RiskAssessorFactory(inference, TokenCounter())
+    evaluator = BatchEvaluator([factory.create_assessor(Risk(name="harm"))])
+    output = tmp_path / "verdicts.jsonl"
+
+    await evaluator.evaluate(dataset, output, tmp_path / "checkpoint")
+    await inference.shutdown()
+
+    [row] = read_rows(output)
+    key, risk_name, _, _ = RECORD.unpack(store_path.read_bytes())
+    assert row["request_key"] == key.hex()
+    assert risk_name.rstrip(b"\0") == b"harm"
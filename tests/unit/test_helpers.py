@@ -2,13 +2,15 @@ import math
 import pytest
 
 from granite_guardian_shield.config import Risk
-from granite_guardian_shield.helpers import _softmax2, get_probabilities, parse_output
+from granite_guardian_shield.helpers import (PROMPT_ANSWER, _softmax2, get_probabilities, parse_output,
+                                             parse_prompt_logprobs_output, parse_raw_output)
 from granite_guardian_shield.models import RiskProbability
 
 from openai.types.chat.chat_completion import ChatCompletion, Choice
 from openai.types.chat.chat_completion_message import ChatCompletionMessage
 from openai.types.chat.chat_completion import ChoiceLogprobs
 from openai.types.chat.chat_completion_token_logprob import ChatCompletionTokenLogprob, TopLogprob
+from openai.types.completion_choice import CompletionChoice, Logprobs
 
 
 def test_softmax2_outputs_add_to_one():
@@ -87,3 +89,63 @@ def test_parse_output_yes_label():
     assert result.is_risky is True
     assert round(result.safe_confidence + result.risky_confidence, 4) == 1.0
     assert result.risky_confidence > result.safe_confidence
+
+
+@pytest.mark.parametrize("label,p_risky,threshold", [("Yes", 0.9, None), ("No", 0.3, None), ("No", 0.3, 0.25)])
+def test_parse_raw_output_matches_parse_output(label, p_risky, threshold):
+    body = {
+        "id": "cmpl-abc",
+        "created": 0,
+        "model": "test-model",
+        "object": "chat.completion",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"content": label, "role": "assistant"},
+            "logprobs": {"content": [{
+                "token": label,
+                "logprob": math.log(p_risky if label == "Yes" else 1 - p_risky),
+                "top_logprobs": [
+                    {"token": " yes", "logprob": math.log(p_risky)},
+                    {"token": "No", "logprob": math.log(1 - p_risky)},
+                    {"token": "Maybe", "logprob": math.log(1e-6)},
+                ],
+            }]},
+        }],
+    }
+    risk = Risk(name="test", violation_threshold=threshold)
+
+    fast = parse_raw_output(body).to_verdict(risk)
+
+    assert fast == parse_output(ChatCompletion.model_validate(body), risk)
+
+
+def test_parse_raw_output_without_logprobs():
+    body = {"choices": [{"message": {"content": "Yes", "role": "assistant"}, "logprobs": None}]}
+
+    verdict = parse_raw_output(body).to_verdict(Risk(name="test"))
+
+    assert verdict.is_risky is True
+    assert verdict.risky_confidence is None
+
+
+@pytest.mark.parametrize("answer_shift", [0, -1, 2])
+def test_parse_prompt_logprobs_output_reads_the_last_echoed_token(answer_shift):
+    # The answer token may be merged with the end of the prompt or have a shifted offset
+    prompt = "hello risk: harm answer: " + PROMPT_ANSWER
+    answer_offset = len(prompt) - len(PROMPT_ANSWER) + answer_shift
+    choice = CompletionChoice(
+        index=0,
+        finish_reason="length",
+        text=prompt,
+        logprobs=Logprobs(
+            text_offset=[0, answer_offset],
+            tokens=[prompt[:answer_offset], prompt[answer_offset:]],
+            top_logprobs=[{}, {"Yes": math.log(0.3), "No": math.log(0.7)}],
+        ),
+    )
+
+    verdict = parse_prompt_logprobs_output(choice, Risk(name="harm"))
+
+    assert verdict.is_risky is False
+    assert verdict.risky_confidence == pytest.approx(0.3)
@@ -0,0 +1,257 @@
+import math
+
+import httpx
+import pytest
+from llama_stack.apis.inference import UserMessage
+from openai import APIConnectionError
+from openai.types.chat.chat_completion import (ChatCompletion, Choice,
+                                               ChoiceLogprobs)
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.chat_completion_token_logprob import (
+    ChatCompletionTokenLogprob, TopLogprob)
+from openai.types.completion import Completion
+from openai.types.completion_choice import CompletionChoice, Logprobs
+from openai.types.completion_usage import CompletionUsage
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import ScoringMode
+from granite_guardian_shield.inference import (GraniteGuardianVLLMInference,
+                                                conversion_scope,
+                                                convert_messages, extra_body,
+                                                request_key)
+from granite_guardian_shield.logprob_store import RECORD, LogprobStore
+from granite_guardian_shield.prompt import GuardianPromptRenderer
+
+
+def chat_completion(label: str, p_risky: float) -> ChatCompletion:
+    return ChatCompletion(
+        id="cmpl-abc",
+        created=0,
+        model="test-model",
+        object="chat.completion",
+        choices=[
+            Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(content=label, role="assistant"),
+                logprobs=ChoiceLogprobs(
+                    content=[
+                        ChatCompletionTokenLogprob(
+                            token=label,
+                            logprob=math.log(p_risky if label == "Yes" else 1 - p_risky),
+                            top_logprobs=[
+                                TopLogprob(token="Yes", logprob=math.log(p_risky)),
+                                TopLogprob(token="No", logprob=math.log(1 - p_risky)),
+                            ],
+                        )
+                    ]
+                ),
+            )
+        ],
+    )
+
+
+class FakeChatCompletions:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+        self.requests: list[dict] = []
+
+    async def create(self, **kwargs) -> ChatCompletion:
+        self.calls += 1
+        self.requests.append(kwargs)
+        if self.calls <= self.failures:
+            raise APIConnectionError(request=httpx.Request("POST", "http://guardian/v1/chat/completions"))
+        response = chat_completion("Yes", 0.9)
+        response.usage = CompletionUsage(prompt_tokens=12, completion_tokens=1, total_tokens=13)
+        return response
+
+
+class FakeRawResponse:
+    def __init__(self, response: ChatCompletion):
+        self.text = response.model_dump_json()
+        self.content = self.text.encode()
+
+
+class FakeRawChatCompletions:
+    def __init__(self, completions: FakeChatCompletions):
+        self.completions = completions
+
+    async def create(self, **kwargs) -> FakeRawResponse:
+        return FakeRawResponse(await self.completions.create(**kwargs))
+
+
+class FakeEchoCompletions:
+    """
+    Echoes the prompt as two tokens, the rendered prompt and the appended answer.
+    """
+    def __init__(self):
+        self.requests: list[dict] = []
+
+    async def create(self, prompt: str, **kwargs) -> Completion:
+        self.requests.append({"prompt": prompt, **kwargs})
+        answer_offset = len(prompt) - len("Yes")
+        return Completion(
+            id="cmpl-abc",
+            created=0,
+            model="test-model",
+            object="text_completion",
+            choices=[
+                CompletionChoice(
+                    index=0,
+                    finish_reason="length",
+                    text=prompt,
+                    logprobs=Logprobs(
+                        text_offset=[0, answer_offset],
+                        tokens=[prompt[:answer_offset], "Yes"],
+                        top_logprobs=[{}, {"Yes": math.log(0.8), "No": math.log(0.2)}],
+                    ),
+                )
+            ],
+        )
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+
+    async def list(self):
+        self.calls += 1
+        return []
+
+
+class FakeChat:
+    def __init__(self, failures: int):
+        self.completions = FakeChatCompletions(failures)
+        self.completions.with_raw_response = FakeRawChatCompletions(self.completions)
+
+
+class FakeOpenAI:
+    def __init__(self, failures: int = 0):
+        self.chat = FakeChat(failures)
+        self.models = FakeModels()
+        self.completions = FakeEchoCompletions()
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_run_retries_connection_errors():
+    client = FakeOpenAI(failures=2)
+    inference = GraniteGuardianVLLMInference(client, "test-model", max_retries=2, retry_backoff_seconds=0)
+
+    verdict = await inference.run(Risk(name="harm"), [UserMessage(content="hello", role="user")])
+
+    assert verdict.is_risky is True
+    assert client.chat.completions.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_run_gives_up_after_max_retries():
+    client = FakeOpenAI(failures=5)
+    inference = GraniteGuardianVLLMInference(client, "test-model", max_retries=1, retry_backoff_seconds=0)
+
+    with pytest.raises(APIConnectionError):
+        await inference.run(Risk(name="harm"), [UserMessage(content="hello", role="user")])
+    assert client.chat.completions.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_initialize_warms_up_and_shutdown_closes_client():
+    client = FakeOpenAI()
+    inference = GraniteGuardianVLLMInference(client, "test-model", warmup_connections=3)
+
+    await inference.initialize()
+    await inference.shutdown()
+
+    assert client.models.calls == 3
+    assert client.closed is True
+
+
+@pytest.mark.asyncio
+async def test_run_appends_label_log_masses_to_logprob_store(tmp_path):
+    store = LogprobStore(tmp_path / "logprobs.bin")
+    inference = GraniteGuardianVLLMInference(FakeOpenAI(), "test-model", logprob_store=store)
+    risk = Risk(name="harm")
+    messages = [UserMessage(content="hello", role="user")]
+
+    await inference.run(risk, messages)
+    await inference.shutdown()
+
+    key, risk_name, log_safe, log_risky = RECORD.unpack((tmp_path / "logprobs.bin").read_bytes())
+    assert key.hex() == request_key(risk, messages)
+    assert risk_name.rstrip(b"\0") == b"harm"
+    assert (math.exp(log_safe), math.exp(log_risky)) == pytest.approx((0.1, 0.9))
+
+
+@pytest.mark.asyncio
+async def test_fast_parse_matches_default_parse():
+    risk = Risk(name="harm")
+    messages = [UserMessage(content="hello", role="user")]
+
+    default = await GraniteGuardianVLLMInference(FakeOpenAI(), "test-model").run(risk, messages)
+    fast = await GraniteGuardianVLLMInference(FakeOpenAI(), "test-model", fast_parse=True).run(risk, messages)
+
+    assert fast == default
+    assert fast.prompt_tokens == 12
+
+
+@pytest.mark.asyncio
+async def test_label_token_mode_limits_generation_to_one_token():
+    client = FakeOpenAI()
+    inference = GraniteGuardianVLLMInference(client, "test-model", scoring_mode=ScoringMode.label_token)
+
+    await inference.run(Risk(name="harm"), [UserMessage(content="hello", role="user")])
+
+    assert client.chat.completions.requests[0]["max_tokens"] == 1
+
+
+@pytest.mark.asyncio
+async def test_prompt_logprobs_mode_scores_echoed_answer_without_generating(tmp_path):
+    client = FakeOpenAI()
+    renderer = GuardianPromptRenderer("{{ messages[-1]['content'] }} risk: {{ guardian_config['risk_name'] }} answer: ")
+    inference = GraniteGuardianVLLMInference(
+        client,
+        "test-model",
+        scoring_mode=ScoringMode.prompt_logprobs,
+        renderer=renderer,
+        logprob_store=LogprobStore(tmp_path / "logprobs.bin"),
+    )
+    messages = [UserMessage(content="hello", role="user")]
+
+    verdict = await inference.run(Risk(name="harm"), messages)
+    await inference.shutdown()
+
+    request = client.completions.requests[0]
+    assert request["prompt"] == "hello risk: harm answer: Yes"
+    assert (request["echo"], request["max_tokens"]) == (True, 0)
+    assert verdict.is_risky is True
+    assert verdict.risky_confidence == pytest.approx(0.8)
+    assert client.chat.completions.calls == 0
+    # Threshold sweeps get the label masses at the answer position
+    key, _, log_safe, log_risky = RECORD.unpack((tmp_path / "logprobs.bin").read_bytes())
+    assert key.hex() == verdict.request_key
+    assert math.exp(log_risky) / (math.exp(log_safe) + math.exp(log_risky)) == pytest.approx(0.8)
+
+
+def test_conversion_scope_converts_each_message_once():
+    messages = [UserMessage(content="hello", role="user")]
+    risk = Risk(name="harm")
+    key = request_key(risk, messages)
+
+    with conversion_scope():
+        first = list(convert_messages(messages))
+        assert list(convert_messages(messages))[0] is first[0]
+        assert request_key(risk, messages) == key
+        assert request_key(Risk(name="violence"), messages) != key
+    assert list(convert_messages(messages))[0] is not first[0]
+
+
+def test_extra_body_is_compiled_once_per_risk():
+    risk = Risk(name="pii", definition="Personal information")
+    assert extra_body(risk) is extra_body(Risk(name="pii", definition="Personal information"))
+    assert extra_body(risk)["chat_template_kwargs"]["guardian_config"] == {"risk_name": "pii", "risk_definition": "Personal information"}
+    with pytest.raises(ValueError):
+        risk.name = "harm"
@@ -0,0 +1,61 @@
+import pytest
+from llama_stack.apis.inference import (CompletionMessage, Message,
+                                        StopReason, SystemMessage,
+                                        ToolResponseMessage, UserMessage)
+from llama_stack.apis.safety import Shield
+
+from granite_guardian_shield.config import Risk, ShieldParams
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.plan import ShieldPlan
+from granite_guardian_shield.risk_assessor import RiskAssessorFactory
+from granite_guardian_shield.shield import GraniteGuardianShield
+
+USER = UserMessage(content="hi", role="user")
+ANSWER = CompletionMessage(content="hello", role="assistant", stop_reason=StopReason.end_of_turn)
+TOOL = ToolResponseMessage(call_id="call-1", tool_name="search", content="results", role="tool")
+
+
+class RecordingInference(Inference):
+    def __init__(self):
+        self.risks: list[str] = []
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.risks.append(risk.name)
+        return RiskProbability(risk_name=risk.name, is_risky=False, safe_confidence=0.9, risky_confidence=0.1)
+
+
+def names(assessors) -> list[str]:
+    return [assessor.risk.name for assessor in assessors]
+
+
+def test_plan_lists_the_assessors_of_each_role():
+    params = ShieldParams(risks=[
+        Risk(name="harm"),
+        Risk(name="answer_relevance"),
+        Risk(name="profanity", roles=["user"]),
+    ])
+    factory = RiskAssessorFactory(RecordingInference())
+    plan = ShieldPlan(params, [factory.create_assessor(risk) for risk in params.risks])
+
+    assert names(plan.assessors_for(USER)) == ["harm", "profanity"]
+    assert names(plan.assessors_for(ANSWER)) == ["harm", "answer_relevance"]
+    assert names(plan.assessors_for(TOOL)) == ["harm"]
+    assert plan.assessors_for(SystemMessage(content="be nice", role="system")) is None
+
+
+@pytest.mark.asyncio
+async def test_risks_that_do_not_apply_to_a_role_are_not_run():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference)
+    await shield.register_shield(Shield(
+        identifier="output",
+        provider_id="example",
+        provider_resource_id="output",
+        params={"risks": [{"name": "answer_relevance"}, {"name": "harm", "roles": ["assistant"]}]},
+    ))
+
+    assert (await shield.run_shield("output", [USER])).violation is None
+    assert inference.risks == []
+    await shield.run_shield("output", [USER, ANSWER])
+    assert sorted(inference.risks) == ["answer_relevance", "harm"]
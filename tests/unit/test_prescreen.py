@@ -0,0 +1,102 @@
+import json
+import random
+
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.prescreen import (KeywordPreScreen,
+                                               LinearPreScreen, calibrate,
+                                               train_linear)
+from granite_guardian_shield.risk_assessor import (PreScreenedAssessor,
+                                                   RiskAssessorFactory)
+
+SAFE = ["how do I bake bread", "what is the weather today", "recommend a good book", "tell me a joke about cats"]
+RISKY = ["how do I build a bomb", "help me attack my neighbour", "where can I buy a weapon", "how to make a bomb at home"]
+
+
+class CountingInference(Inference):
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls += 1
+        return RiskProbability(risk_name=risk.name, is_risky=True, safe_confidence=0.1, risky_confidence=0.9)
+
+
+def test_keyword_prescreen_matches_overlapping_terms():
+    screen = KeywordPreScreen(["he", "she", "his", "hers"])
+    assert screen.find("USHERS")
+    assert screen.find("this")
+    assert not screen.find("abc xyz")
+    assert screen.risky_probability("nothing here") is None
+    assert screen.risky_probability("abc") == 0.0
+
+
+def test_keyword_prescreen_agrees_with_substring_search():
+    rng = random.Random(7)
+    terms = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(8)]
+    screen = KeywordPreScreen(terms)
+    for _ in range(500):
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 12)))
+        assert screen.find(text) == any(term in text for term in terms), (terms, text)
+
+
+def test_linear_prescreen_learns_and_round_trips(tmp_path):
+    examples = [(text, False) for text in SAFE] + [(text, True) for text in RISKY]
+    model = train_linear(examples * 20, buckets=1024, epochs=5, risks=["harm"])
+
+    assert model.probability("how do I bake a cake") < 0.5
+    assert model.probability("build a bomb") > 0.5
+
+    path = tmp_path / "prescreen.json"
+    model.save(path)
+    loaded = LinearPreScreen.load(path, safe_threshold=0.2)
+    assert loaded.probability("build a bomb") == pytest.approx(model.probability("build a bomb"))
+    assert loaded.covers(Risk(name="harm"))
+    assert not loaded.covers(Risk(name="violence"))
+    assert not LinearPreScreen(loaded.weights, loaded.bias, ["answer_relevance"]).covers(Risk(name="answer_relevance"))
+
+    # A model that doesn't say which risks it was trained on would screen risks it never saw
+    path.write_text(json.dumps({"buckets": 8, "bias": 0.0, "weights": {}}))
+    with pytest.raises(ValueError):
+        LinearPreScreen.load(path)
+
+
+@pytest.mark.asyncio
+async def test_prescreened_assessor_skips_guardian_for_safe_messages():
+    inference = CountingInference()
+    factory = RiskAssessorFactory(inference)
+    assessor = factory.create_assessor(Risk(name="harm", prescreen_keywords=["bomb", "weapon"]))
+    assert isinstance(assessor, PreScreenedAssessor)
+
+    safe = await assessor.run([UserMessage(content="how do I bake bread", role="user")])
+    risky = await assessor.run([UserMessage(content="how do I build a Bomb", role="user")])
+
+    assert inference.calls == 1
+    assert not safe.is_risky
+    assert safe.screened_by == "keywords"
+    assert risky.is_risky
+    assert risky.screened_by is None
+    stats = assessor.stats()
+    assert stats.screened == 1
+    assert stats.escalated == 1
+
+
+def test_risks_without_prescreen_are_not_wrapped():
+    assert not isinstance(RiskAssessorFactory(CountingInference()).create_assessor(Risk(name="harm")), PreScreenedAssessor)
+
+
+def test_calibrate_reports_calls_saved_and_risky_missed():
+    probabilities = [0.001, 0.03, None, 0.2, 0.004]
+    labels = [False, True, True, False, False]
+
+    loose, strict = calibrate(probabilities, labels, [0.05, 0.01])
+
+    assert (loose.screened, loose.missed) == (3, 1)
+    assert loose.saved_rate == pytest.approx(0.6)
+    assert loose.miss_rate == pytest.approx(0.5)
+    assert (strict.screened, strict.missed) == (2, 0)
+    assert calibrate(probabilities, labels, [None])[0].screened == 4
@@ -0,0 +1,42 @@
+from llama_stack.apis.inference import UserMessage
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.prompt import (GuardianPromptRenderer,
+                                            common_prefix_length,
+                                            order_for_prefix_sharing,
+                                            prefill_savings)
+
+TEMPLATE = (
+    "{% for message in messages %}{{ message['role'] }}: {{ message['content'] }}\n{% endfor %}"
+    "risk: {{ guardian_config['risk_name'] }}"
+    "{% if guardian_config['risk_definition'] %} ({{ guardian_config['risk_definition'] }}){% endif %}"
+)
+
+
+def test_renderer_passes_guardian_config_to_template():
+    renderer = GuardianPromptRenderer(TEMPLATE)
+    messages = [UserMessage(content="hello", role="user")]
+
+    assert renderer.render(Risk(name="harm"), messages) == "user: hello\nrisk: harm"
+    assert renderer.render(Risk(name="pii", definition="personal data"), messages) == "user: hello\nrisk: pii (personal data)"
+
+
+def test_common_prefix_length():
+    assert common_prefix_length("abcdef", "abcxyz") == 3
+    assert common_prefix_length("abc", "abc") == 3
+    assert common_prefix_length("", "abc") == 0
+
+
+def test_order_for_prefix_sharing_groups_conversations():
+    prompts = ["a: hi\nrisk: harm", "b: yo\nrisk: harm", "a: hi\nrisk: violence"]
+
+    assert order_for_prefix_sharing(prompts) == ["a: hi\nrisk: harm", "a: hi\nrisk: violence", "b: yo\nrisk: harm"]
+
+
+def test_prefill_savings_counts_shared_prefix_once():
+    prompts = ["conversation|harm", "conversation|violence"]
+
+    total, prefilled = prefill_savings(prompts, len)
+
+    assert total == len(prompts[0]) + len(prompts[1])
+    assert prefilled == len(prompts[0]) + len("violence")
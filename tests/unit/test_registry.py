@@ -0,0 +1,110 @@
+import asyncio
+import os
+
+import pytest
+import yaml
+from llama_stack.apis.inference import Message, UserMessage
+from llama_stack.apis.safety import Shield
+
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.shield import GraniteGuardianShield
+
+MESSAGES = [UserMessage(content="hello", role="user")]
+
+
+class SlowInference(Inference):
+    def __init__(self):
+        self.risks: list[str] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.risks.append(risk.name)
+        await self.release.wait()
+        return RiskProbability(risk_name=risk.name, is_risky=False, safe_confidence=0.9, risky_confidence=0.1)
+
+
+def shield(shield_id: str, *risks: str) -> Shield:
+    return Shield(
+        identifier=shield_id,
+        provider_id="example",
+        provider_resource_id=shield_id,
+        params={"risks": [{"name": name} for name in risks]},
+    )
+
+
+def write_shields(path, shields: dict[str, list[str]]) -> None:
+    entries = [{"shield_id": shield_id, "params": {"risks": [{"name": name} for name in risks]}} for shield_id, risks in shields.items()]
+    path.write_text(yaml.safe_dump({"shields": entries}))
+    # Make the change visible even on file systems with coarse modification times
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.mark.asyncio
+async def test_identical_risks_share_one_assessor():
+    gg_shield = GraniteGuardianShield(SlowInference())
+    await gg_shield.register_shield(shield("tenant-a", "harm", "violence"))
+    await gg_shield.register_shield(shield("tenant-b", "harm"))
+
+    plans = gg_shield.registry.snapshot()
+    assert plans["tenant-a"].assessors[0] is plans["tenant-b"].assessors[0]
+    stats = gg_shield.registry_stats()
+    assert stats.shields == 2
+    assert stats.assessors == 2
+    assert stats.interned == 1
+
+
+@pytest.mark.asyncio
+async def test_updates_do_not_affect_calls_in_flight():
+    inference = SlowInference()
+    gg_shield = GraniteGuardianShield(inference)
+    await gg_shield.register_shield(shield("tenant", "harm"))
+
+    inference.release.clear()
+    call = asyncio.ensure_future(gg_shield.run_shield("tenant", MESSAGES))
+    await asyncio.sleep(0)
+    await gg_shield.register_shield(shield("tenant", "violence"))
+    inference.release.set()
+    await call
+    await gg_shield.run_shield("tenant", MESSAGES)
+    assert inference.risks == ["harm", "violence"]
+
+    await gg_shield.unregister_shield("tenant")
+    with pytest.raises(ValueError):
+        await gg_shield.run_shield("tenant", MESSAGES)
+    with pytest.raises(ValueError):
+        await gg_shield.unregister_shield("tenant")
+
+
+@pytest.mark.asyncio
+async def test_shield_file_is_reloaded_when_it_changes(tmp_path):
+    path = tmp_path / "shields.yaml"
+    write_shields(path, {"tenant-a": ["harm"], "tenant-b": ["violence"]})
+    config = GraniteGuardianShieldConfig(base_url="http://localhost", shields_path=str(path), shields_reload_seconds=3600)
+    gg_shield = GraniteGuardianShield(SlowInference(), config)
+    await gg_shield.initialize()
+    try:
+        await gg_shield.register_shield(shield("builtin", "harm"))
+        tenant_a = gg_shield.registry.get("tenant-a")
+        assert not await gg_shield.shield_file_watcher.check()
+
+        write_shields(path, {"tenant-a": ["harm"], "tenant-c": ["profanity"]})
+        assert await gg_shield.shield_file_watcher.check()
+        plans = gg_shield.registry.snapshot()
+        assert sorted(plans) == ["builtin", "tenant-a", "tenant-c"]
+        assert plans["tenant-a"] is tenant_a
+
+        # An invalid file is rejected and the shields stay as they were
+        path.write_text("shields:\n- shield_id: tenant-d\n  params: {risks: [{name: harm, violation_threshold: high}]}\n")
+        os.utime(path, ns=(0, 1))
+        with pytest.raises(ValueError):
+            await gg_shield.shield_file_watcher.check()
+        assert gg_shield.registry.snapshot() is plans
+        stats = gg_shield.registry_stats()
+        assert stats.reloads == 2
+        assert stats.reload_errors == 1
+    finally:
+        await gg_shield.shutdown()
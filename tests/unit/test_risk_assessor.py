@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import ChunkReducer
+from granite_guardian_shield.helpers import reduce_confidences
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.risk_assessor import SimpleRiskAssessor
+
+TEXT = " ".join(f"w{i}" for i in range(10))
+
+
+class ChunkInference(Inference):
+    """
+    Chunks containing `risky_word` score 0.9, others 0.2. Chunks without it are slow.
+    """
+    def __init__(self, risky_word: str | None = None):
+        self.risky_word = risky_word
+        self.chunks: list[str] = []
+        self.cancelled = 0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        content = str(messages[-1].content)
+        self.chunks.append(content)
+        is_risky = self.risky_word is not None and self.risky_word in content
+        if not is_risky and self.risky_word is not None:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        p_risky = 0.9 if is_risky else 0.2
+        return RiskProbability(risk_name=risk.name, is_risky=is_risky, safe_confidence=1 - p_risky, risky_confidence=p_risky)
+
+
+def test_reduce_confidences():
+    assert reduce_confidences([0.2, 0.4], ChunkReducer.max) == 0.4
+    assert reduce_confidences([0.2, 0.4], ChunkReducer.mean) == pytest.approx(0.3)
+    assert reduce_confidences([0.2, 0.4], ChunkReducer.noisy_or) == pytest.approx(0.52)
+
+
+@pytest.mark.asyncio
+async def test_short_message_is_not_chunked():
+    inference = ChunkInference()
+    assessor = SimpleRiskAssessor(Risk(name="harm", chunk_size=20), inference)
+
+    verdict = await assessor.run([UserMessage(content=TEXT)])
+
+    assert inference.chunks == [TEXT]
+    assert verdict.chunks is None
+
+
+@pytest.mark.asyncio
+async def test_chunked_scoring_reduces_chunk_confidences():
+    inference = ChunkInference()
+    risk = Risk(name="harm", chunk_size=4, chunk_overlap=1, chunk_reducer=ChunkReducer.noisy_or, violation_threshold=0.4)
+    assessor = SimpleRiskAssessor(risk, inference)
+
+    verdict = await assessor.run([UserMessage(content=TEXT)])
+
+    assert len(inference.chunks) == 3
+    assert [c.index for c in verdict.chunks] == [0, 1, 2]
+    assert verdict.risky_confidence == pytest.approx(1 - 0.8 ** 3, abs=1e-4)
+    assert verdict.is_risky is True
+
+
+@pytest.mark.asyncio
+async def test_chunked_scoring_stops_at_first_risky_chunk():
+    inference = ChunkInference(risky_word="w8")
+    assessor = SimpleRiskAssessor(Risk(name="harm", chunk_size=4, chunk_overlap=1), inference)
+
+    verdict = await asyncio.wait_for(assessor.run([UserMessage(content=TEXT)]), timeout=1)
+    await asyncio.sleep(0)
+
+    assert verdict.is_risky is True
+    assert [c.index for c in verdict.chunks] == [2]
+    assert inference.cancelled == 2
@@ -0,0 +1,207 @@
+import asyncio
+
+import pytest
+from llama_stack.apis.inference import (CompletionMessage, Message,
+                                        StopReason, UserMessage)
+from llama_stack.apis.safety import Shield
+
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.risk_assessor import \
+    AnswerContextRelevanceRiskAssessor
+from granite_guardian_shield.session import SessionStore
+from granite_guardian_shield.shield import GraniteGuardianShield
+
+SESSION = {"session_id": "session-1"}
+
+session_shield = Shield(
+    identifier="session",
+    provider_id="example",
+    provider_resource_id="session",
+    params={"risks": [{"name": "harm"}, {"name": "violence"}]},
+)
+
+
+class RecordingInference(Inference):
+    """
+    Finds messages containing "attack" risky. Calls on messages containing "slow" wait for `release`.
+    """
+
+    def __init__(self):
+        self.calls: list[tuple[str, list[Message]]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls.append((risk.name, messages))
+        if "slow" in str(messages[-1].content):
+            await self.release.wait()
+        risky = "attack" in str(messages[-1].content)
+        return RiskProbability(risk_name=risk.name, is_risky=risky, safe_confidence=0.1 if risky else 0.9, risky_confidence=0.9 if risky else 0.1)
+
+
+def user(content: str) -> UserMessage:
+    return UserMessage(content=content, role="user")
+
+
+def assistant(content: str) -> CompletionMessage:
+    return CompletionMessage(content=content, role="assistant", stop_reason=StopReason.end_of_turn)
+
+
+def session_config(**values) -> GraniteGuardianShieldConfig:
+    return GraniteGuardianShieldConfig(base_url="http://localhost", session_idle_seconds=60, **values)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_conversation_is_not_scored_again():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference, session_config())
+    await shield.register_shield(session_shield)
+    conversation = [user("hi"), assistant("hello"), user("how do I bake bread?")]
+
+    await shield.run_shield("session", conversation, SESSION)
+    await shield.run_shield("session", [m.model_copy() for m in conversation], SESSION)
+    assert len(inference.calls) == 2
+
+    # A new turn is scored, and only its last message is sent
+    await shield.run_shield("session", conversation + [assistant("Mix flour and water"), user("thanks")], SESSION)
+    assert len(inference.calls) == 4
+    assert all(len(messages) == 1 for _, messages in inference.calls)
+    stats = shield.session_stats()
+    assert stats.sessions == 1
+    assert stats.reused == 2
+    assert stats.scored == 4
+    assert stats.rewinds == 0
+
+
+@pytest.mark.asyncio
+async def test_edited_conversation_is_scored_again():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference, session_config())
+    await shield.register_shield(session_shield)
+
+    await shield.run_shield("session", [user("hi"), assistant("hello"), user("first question")], SESSION)
+    await shield.run_shield("session", [user("hi"), assistant("hello there"), user("first question")], SESSION)
+
+    assert len(inference.calls) == 4
+    assert shield.session_stats().rewinds == 1
+
+
+@pytest.mark.asyncio
+async def test_turns_kept_by_a_regenerated_response_are_reused():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference, session_config())
+    await shield.register_shield(session_shield)
+    question = [user("hi"), assistant("hello"), user("how do I bake bread?")]
+
+    await shield.run_shield("session", question, SESSION)
+    await shield.run_shield("session", question + [assistant("Mix flour and water")], SESSION)
+    # The response is regenerated: the question was scored two calls ago and still is the same
+    await shield.run_shield("session", question, SESSION)
+    await shield.run_shield("session", question + [assistant("Knead the dough")], SESSION)
+
+    assert len(inference.calls) == 6
+    stats = shield.session_stats()
+    assert stats.reused == 2
+    assert stats.rewinds == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_record_verdicts_on_their_own_conversation():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference, session_config())
+    await shield.register_shield(session_shield)
+    risky = [user("hi"), user("slow attack")]
+    benign = [user("hi"), user("bake bread")]
+
+    inference.release.clear()
+    pending = asyncio.ensure_future(shield.run_shield("session", risky, SESSION))
+    await asyncio.sleep(0)
+    assert (await shield.run_shield("session", benign, SESSION)).violation is None
+    inference.release.set()
+    assert (await pending).violation is not None
+
+    # The risky verdicts finished after the session moved on and were not kept for either conversation
+    assert (await shield.run_shield("session", benign, SESSION)).violation is None
+    assert (await shield.run_shield("session", risky, SESSION)).violation is not None
+    assert shield.session_stats().reused == 2
+
+
+@pytest.mark.asyncio
+async def test_calls_without_session_id_are_always_scored():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference, session_config())
+    await shield.register_shield(session_shield)
+
+    assert (await shield.run_shield("session", [user("hi"), user("attack")])).violation is not None
+    assert (await shield.run_shield("session", [user("hi"), user("bake bread")])).violation is None
+
+    assert len(inference.calls) == 4
+    assert shield.session_stats().sessions == 0
+
+
+@pytest.mark.asyncio
+async def test_session_id_param_separates_conversations():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference, session_config())
+    await shield.register_shield(session_shield)
+    conversation = [user("hi")]
+
+    await shield.run_shield("session", conversation, {"session_id": "a"})
+    await shield.run_shield("session", conversation, {"session_id": "b"})
+    await shield.run_shield("session", conversation, {"session_id": "a"})
+
+    assert len(inference.calls) == 4
+    assert shield.session_stats().sessions == 2
+
+
+def test_sessions_are_evicted_when_idle_or_over_capacity(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("granite_guardian_shield.session.time.monotonic", lambda: now[0])
+    store = SessionStore(idle_seconds=10, max_sessions=2)
+
+    for session_id in ("a", "b", "c"):
+        store.state("shield", [user("hi")], session_id)
+    assert store.stats().sessions == 2
+    assert store.stats().evictions == 1
+
+    now[0] += 11
+    store.state("shield", [user("hi")], "d")
+    assert store.stats().sessions == 1
+    assert store.stats().evictions == 3
+
+
+def test_sessions_disabled_by_default():
+    shield = GraniteGuardianShield(RecordingInference(), GraniteGuardianShieldConfig(base_url="http://localhost"))
+    assert shield.session_stats() is None
+
+
+@pytest.mark.asyncio
+async def test_answer_relevance_sends_only_the_question_and_answer():
+    inference = RecordingInference()
+    assessor = AnswerContextRelevanceRiskAssessor(Risk(name="answer_relevance"), inference)
+    question, answer = user("what is the capital of France?"), assistant("Paris")
+
+    await assessor.run([user("hi"), assistant("hello"), question, answer])
+
+    assert inference.calls == [("answer_relevance", [question, answer])]
+
+
+@pytest.mark.asyncio
+async def test_changed_context_or_tools_are_scored_again():
+    inference = RecordingInference()
+    shield = GraniteGuardianShield(inference, session_config())
+    await shield.register_shield(session_shield)
+    question = UserMessage(content="When was the bridge built?", role="user", context="The bridge opened in 1932.")
+    answer = assistant("In 1932.")
+
+    await shield.run_shield("session", [question, answer], SESSION)
+    retrieved_again = question.model_copy(update={"context": "The bridge opened in 1937."})
+    await shield.run_shield("session", [retrieved_again, answer], SESSION)
+    assert len(inference.calls) == 4
+
+    await shield.run_shield("session", [retrieved_again, answer], {**SESSION, "tools": [{"name": "search"}]})
+    await shield.run_shield("session", [retrieved_again, answer], {**SESSION, "tools": [{"name": "search"}]})
+    assert len(inference.calls) == 6
+    assert shield.session_stats().rewinds == 2
@@ -1,9 +1,19 @@
+import asyncio
+
 import pytest
 from llama_stack.apis.inference import Message, UserMessage
 from llama_stack.apis.safety import Shield, ViolationLevel
+from llama_stack.apis.telemetry import SpanEndPayload, SpanStartPayload
+from llama_stack.providers.utils.telemetry import tracing
 
-from granite_guardian_shield.config import Risk
+from granite_guardian_shield.admission import (AdmissionController,
+                                               LimitedInference)
+from granite_guardian_shield.breaker import CircuitBreaker
+from granite_guardian_shield.cache import CachingInference, VerdictCache
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import FailurePolicy
 from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.layers import InferenceLayers
 from granite_guardian_shield.models import RiskProbability
 from granite_guardian_shield.shield import GraniteGuardianShield
 
@@ -97,3 +107,191 @@ async def test_run_shield_no_violation():
     result = await gg_shield.run_shield(fake_shield.identifier, [user_msg])
 
     assert result.violation is None
+
+
+@pytest.mark.asyncio
+async def test_register_shield_with_max_concurrency():
+    limited_shield = Shield(
+        identifier="limited",
+        provider_id="example",
+        provider_resource_id="limited",
+        params={"risks": [{"name": "harm"}], "max_concurrency": 1},
+    )
+    gg_shield = GraniteGuardianShield(FakeInference(trigger_violation=True))
+    await gg_shield.register_shield(limited_shield)
+    user_msg = UserMessage(content="You suck", role="user")
+
+    result = await gg_shield.run_shield(limited_shield.identifier, [user_msg])
+
+    assert result.violation is not None
+    stats = gg_shield.admission_stats()["limited"]
+    assert stats.limit == 1
+    assert stats.admitted == 1
+    assert gg_shield.provider_admission_stats() is None
+
+
+@pytest.mark.asyncio
+async def test_provider_admission_stats():
+    controller = AdmissionController(max_concurrency=2)
+    inference = LimitedInference(FakeInference(trigger_violation=False), controller, FailurePolicy.closed)
+    gg_shield = GraniteGuardianShield(inference, layers=InferenceLayers(controller))
+    await gg_shield.register_shield(fake_shield)
+
+    await gg_shield.run_shield(fake_shield.identifier, [UserMessage(content="hello", role="user")])
+
+    stats = gg_shield.provider_admission_stats()
+    assert stats.limit == 2
+    assert stats.admitted == 1
+
+
+@pytest.mark.asyncio
+async def test_layer_stats_are_reported_by_the_shield():
+    gg_shield = GraniteGuardianShield(FakeInference(trigger_violation=False))
+    assert (gg_shield.cache_stats(), gg_shield.breaker_stats(), gg_shield.endpoint_stats()) == (None, None, None)
+    assert gg_shield.adaptive_limit_stats() == []
+
+    cache = VerdictCache(max_size=10, ttl_seconds=60)
+    gg_shield = GraniteGuardianShield(
+        CachingInference(FakeInference(trigger_violation=False), cache),
+        layers=InferenceLayers(cache=cache, breaker=CircuitBreaker(failure_rate=0.5)),
+    )
+    await gg_shield.register_shield(fake_shield)
+    for _ in range(2):
+        await gg_shield.run_shield(fake_shield.identifier, [UserMessage(content="hello", role="user")])
+
+    cache_stats = gg_shield.cache_stats()
+    assert (cache_stats.hits, cache_stats.misses) == (1, 1)
+    assert gg_shield.breaker_stats().state == "closed"
+
+
+class SlowSafeInference(Inference):
+    """
+    Flags harm immediately, takes a long time to clear every other risk.
+    """
+    def __init__(self):
+        self.cancelled: list[str] = []
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        if risk.name == "harm":
+            return RiskProbability(risk_name=risk.name, is_risky=True, risky_confidence=0.95, safe_confidence=0.05)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled.append(risk.name)
+            raise
+        return RiskProbability(risk_name=risk.name, is_risky=False, risky_confidence=0.05, safe_confidence=0.95)
+
+
+@pytest.mark.asyncio
+async def test_run_shield_short_circuit_cancels_remaining_risks():
+    short_circuit_shield = Shield(
+        identifier="short",
+        provider_id="example",
+        provider_resource_id="short",
+        params={"risks": [{"name": "violence"}, {"name": "harm"}, {"name": "profanity"}], "short_circuit": True},
+    )
+    inference = SlowSafeInference()
+    gg_shield = GraniteGuardianShield(inference)
+    await gg_shield.register_shield(short_circuit_shield)
+    user_msg = UserMessage(content="You suck", role="user")
+
+    result = await asyncio.wait_for(gg_shield.run_shield(short_circuit_shield.identifier, [user_msg]), timeout=1)
+
+    assert result.violation is not None
+    assert result.violation.violation_level == ViolationLevel.ERROR
+    assert sorted(result.violation.metadata["not_evaluated"]) == ["profanity", "violence"]
+    assert sorted(inference.cancelled) == ["profanity", "violence"]
+
+
+class SafeInference(Inference):
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        return RiskProbability(risk_name=risk.name, is_risky=False, risky_confidence=0.01, safe_confidence=0.95)
+
+
+class RecordingTraceLogger:
+    def __init__(self):
+        self.events = []
+
+    def log_event(self, event):
+        self.events.append(event)
+
+
+@pytest.mark.asyncio
+async def test_run_shield_traces_every_risk_in_one_span():
+    two_risk_shield = Shield(
+        identifier="two",
+        provider_id="example",
+        provider_resource_id="two",
+        params={"risks": [{"name": "harm"}, {"name": "violence"}]},
+    )
+    gg_shield = GraniteGuardianShield(SafeInference())
+    await gg_shield.register_shield(two_risk_shield)
+    trace_logger = RecordingTraceLogger()
+    context = tracing.TraceContext(trace_logger, "trace-1")
+    context.spans = []
+    token = tracing.CURRENT_TRACE_CONTEXT.set(context)
+    try:
+        await gg_shield.run_shield(two_risk_shield.identifier, [UserMessage(content="hello", role="user")])
+    finally:
+        tracing.CURRENT_TRACE_CONTEXT.reset(token)
+
+    starts = [event for event in trace_logger.events if isinstance(event.payload, SpanStartPayload)]
+    ends = [event for event in trace_logger.events if isinstance(event.payload, SpanEndPayload)]
+    # run_shield is traced by the Safety protocol; the shield adds one child span for all risks
+    assert [event.payload.name for event in starts] == ["GraniteGuardianShield.run_shield", "granite_guardian_shield"]
+    assert starts[1].payload.parent_span_id == starts[0].span_id
+    assert [event.span_id for event in ends] == [starts[1].span_id, starts[0].span_id]
+    assert ends[0].attributes["harm.is_risky"] == "False"
+    assert "violence.prompt_tokens" in ends[0].attributes
+    assert context.spans == []
+
+
+class CountingInference(SafeInference):
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.calls += 1
+        return await super().run(risk, messages)
+
+
+@pytest.mark.asyncio
+async def test_expired_deadline_is_enforced_without_a_concurrency_limit():
+    deadline_shield = Shield(
+        identifier="deadline",
+        provider_id="example",
+        provider_resource_id="deadline",
+        params={"risks": [{"name": "harm"}, {"name": "violence", "failure_policy": "open"}]},
+    )
+    inference = CountingInference()
+    gg_shield = GraniteGuardianShield(inference)
+    await gg_shield.register_shield(deadline_shield)
+    user_msg = UserMessage(content="hello", role="user")
+
+    result = await gg_shield.run_shield(deadline_shield.identifier, [user_msg], {"deadline_ms": 0})
+
+    assert inference.calls == 0
+    assert result.violation is not None
+    [harm] = result.violation.metadata["metadata"]
+    assert harm["risk_name"] == "harm"
+    assert harm["degraded_reason"].startswith("Deadline passed")
+
+    result = await gg_shield.run_shield(deadline_shield.identifier, [user_msg], {"deadline_ms": 1000})
+    assert inference.calls == 2
+    assert result.violation is None
+
+
+@pytest.mark.asyncio
+async def test_multi_risk_shield_warns_that_prefix_sharing_needs_batching(caplog):
+    two_risk_shield = Shield(
+        identifier="two",
+        provider_id="example",
+        provider_resource_id="two",
+        params={"risks": [{"name": "harm"}, {"name": "violence"}]},
+    )
+    config = GraniteGuardianShieldConfig(base_url="http://localhost")
+    gg_shield = GraniteGuardianShield(SafeInference(), config)
+
+    await gg_shield.register_shield(two_risk_shield)
+
+    assert "set batching_enabled" in caplog.text
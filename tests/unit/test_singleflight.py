@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from granite_guardian_shield.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    single_flight: SingleFlight[int] = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def work() -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return 42
+
+    waiters = [asyncio.create_task(single_flight.do("key", work)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == [42] * 5
+    assert calls == 1
+    assert single_flight.coalesced == 4
+    assert single_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_raises_errors_to_every_waiter():
+    single_flight: SingleFlight[int] = SingleFlight()
+
+    async def work() -> int:
+        await asyncio.sleep(0)
+        raise RuntimeError("guardian unavailable")
+
+    results = await asyncio.gather(
+        single_flight.do("key", work), single_flight.do("key", work), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancelling_one_waiter_keeps_shared_call():
+    single_flight: SingleFlight[int] = SingleFlight()
+    release = asyncio.Event()
+    cancelled = False
+
+    async def work() -> int:
+        nonlocal cancelled
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return 7
+
+    first = asyncio.create_task(single_flight.do("key", work))
+    second = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == 7
+    assert first.cancelled()
+    assert not cancelled
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancels_work_when_all_waiters_leave():
+    single_flight: SingleFlight[int] = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def work() -> int:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return 0
+
+    waiter = asyncio.create_task(single_flight.do("key", work))
+    await asyncio.sleep(0)
+    waiter.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert single_flight.in_flight() == 0
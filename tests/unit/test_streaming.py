@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+from llama_stack.apis.safety import Shield
+
+from granite_guardian_shield.config import GraniteGuardianShieldConfig, Risk
+from granite_guardian_shield.constants import StreamCheckpoint
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.shield import GraniteGuardianShield
+
+stream_shield = Shield(
+    identifier="output",
+    provider_id="example",
+    provider_resource_id="output",
+    params={"risks": [{"name": "harm"}]},
+)
+
+QUESTION = [UserMessage(content="tell me something", role="user")]
+
+
+class KeywordInference(Inference):
+    """
+    Finds text risky when it mentions a bomb, recording the text of every call.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.texts: list[str] = []
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        text = str(messages[-1].content)
+        self.texts.append(text)
+        await asyncio.sleep(self.delay)
+        risky = "bomb" in text
+        return RiskProbability(risk_name=risk.name, is_risky=risky, safe_confidence=0.1 if risky else 0.9, risky_confidence=0.9 if risky else 0.1)
+
+
+async def make_shield(inference: Inference, **values) -> GraniteGuardianShield:
+    config = GraniteGuardianShieldConfig(base_url="http://localhost", **values)
+    shield = GraniteGuardianShield(inference, config)
+    await shield.register_shield(stream_shield)
+    return shield
+
+
+@pytest.mark.asyncio
+async def test_sentence_checkpoints_catch_a_violation_before_the_stream_ends():
+    inference = KeywordInference()
+    shield = await make_shield(inference, stream_checkpoint_tokens=2)
+    violations = []
+    stream = shield.stream_output("output", QUESTION, on_violation=violations.append)
+
+    for delta in ["Here is ", "a fact.", " Next you build", " a bomb", " by mixing"]:
+        assert stream.feed(delta) is None
+    await asyncio.sleep(0.01)
+    assert inference.texts == ["Here is a fact."]
+
+    assert stream.feed(". Then") is None
+    await asyncio.sleep(0.01)
+    assert stream.feed(" more") is not None
+    assert len(violations) == 1
+    assert inference.texts[-1] == "Here is a fact. Next you build a bomb by mixing. Then"
+
+    response = await stream.close()
+    assert response.violation is not None
+    assert len(inference.texts) == 2
+
+
+@pytest.mark.asyncio
+async def test_close_checks_the_complete_response_once():
+    inference = KeywordInference()
+    shield = await make_shield(inference, stream_checkpoint_tokens=2)
+    stream = shield.stream_output("output", QUESTION)
+
+    stream.feed("The sky is blue.\n")
+    await asyncio.sleep(0)
+    assert (await stream.close()).violation is None
+    assert inference.texts == ["The sky is blue.\n"]
+
+    stream = shield.stream_output("output", QUESTION)
+    stream.feed("The sky is blue.\n")
+    stream.feed("Grass is green")
+    assert (await stream.close()).violation is None
+    # The check of the first sentence was still in flight and is superseded by the final one
+    assert inference.texts[1:] == ["The sky is blue.\nGrass is green"]
+    with pytest.raises(RuntimeError):
+        stream.feed("more")
+
+
+@pytest.mark.asyncio
+async def test_token_checkpoints_keep_one_check_in_flight():
+    inference = KeywordInference(delay=0.01)
+    shield = await make_shield(inference, stream_checkpoint=StreamCheckpoint.tokens, stream_checkpoint_tokens=2)
+    stream = shield.stream_output("output", QUESTION)
+
+    for word in "one two three four five six seven eight".split():
+        stream.feed(f"{word} ")
+        await asyncio.sleep(0)
+    assert inference.texts == ["one two "]
+
+    await asyncio.sleep(0.02)
+    # Checkpoints reached while the first check was in flight are folded into one
+    assert inference.texts[1] == "one two three four five six seven eight "
+    await stream.close()
+    assert stream.checkpoints == 2
+    assert len(inference.texts) == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_output_requires_a_registered_shield():
+    shield = await make_shield(KeywordInference())
+    with pytest.raises(ValueError):
+        shield.stream_output("missing", QUESTION)
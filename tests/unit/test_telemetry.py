@@ -0,0 +1,39 @@
+import pytest
+
+from granite_guardian_shield.telemetry import (LatencyHistogram, Phase,
+                                               PhaseTimings)
+
+
+def test_histogram_percentiles_are_bucket_upper_bounds():
+    histogram = LatencyHistogram()
+    for ms in [0.3] * 50 + [3] * 45 + [40] * 5:
+        histogram.record(ms)
+
+    stats = histogram.stats()
+
+    assert stats.count == 100
+    assert stats.mean_ms == pytest.approx((0.3 * 50 + 3 * 45 + 40 * 5) / 100)
+    assert stats.p50_ms == 0.5
+    assert stats.p95_ms == 5
+    assert stats.p99_ms == 50
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().stats().p99_ms == 0.0
+
+
+def test_phase_timings_keyed_by_phase_and_risk():
+    timings = PhaseTimings()
+    timings.record(Phase.http, "harm", 0.004)
+    timings.record(Phase.http, "jailbreak", 0.15)
+    with timings.time(Phase.parse, "harm"):
+        pass
+
+    stats = timings.stats()
+
+    assert stats["http"]["harm"].p50_ms == 5
+    assert stats["http"]["jailbreak"].p50_ms == 200
+    assert stats["parse"]["harm"].count == 1
+
+    timings.reset()
+    assert timings.stats() == {}
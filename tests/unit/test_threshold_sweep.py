@@ -0,0 +1,49 @@
+import math
+
+import pytest
+
+from granite_guardian_shield.logprob_store import LogprobStore
+
+np = pytest.importorskip("numpy")
+
+from granite_guardian_shield.threshold_sweep import (load_store,  # noqa: E402
+                                                     match_labels,
+                                                     risky_probabilities,
+                                                     sweep)
+
+KEYS = [f"{i:064x}" for i in range(1, 5)]
+
+
+def write_store(path, p_risky_by_key, risk_name="harm"):
+    store = LogprobStore(path)
+    for key, p_risky in p_risky_by_key:
+        store.append(key, risk_name, math.log(1 - p_risky), math.log(p_risky))
+    store.close()
+
+
+def test_load_store_keeps_last_record_per_request(tmp_path):
+    path = tmp_path / "logprobs.bin"
+    write_store(path, [(KEYS[0], 0.2), (KEYS[1], 0.7), (KEYS[0], 0.4)])
+    write_store(path, [(KEYS[2], 0.9)], risk_name="violence")
+    with open(path, "ab") as f:
+        f.write(b"partial")
+
+    records = load_store(path, "harm")
+
+    assert [key.hex() for key in records["key"]] == [KEYS[1], KEYS[0]]
+    assert risky_probabilities(records) == pytest.approx([0.7, 0.4])
+
+
+def test_sweep_reports_flags_precision_and_recall(tmp_path):
+    path = tmp_path / "logprobs.bin"
+    write_store(path, zip(KEYS, [0.2, 0.45, 0.6, 0.9]))
+    records = load_store(path)
+    mask, labels = match_labels(records, {KEYS[1]: True, KEYS[2]: False, KEYS[3]: True, "ff" * 32: True})
+
+    metrics = sweep(risky_probabilities(records[mask]), np.array([0.5, 0.4, 0.95]), labels)
+
+    assert [m.flagged for m in metrics] == [2, 3, 0]
+    assert metrics[0].precision == pytest.approx(0.5)
+    assert metrics[0].recall == pytest.approx(0.5)
+    assert metrics[1].recall == pytest.approx(1.0)
+    assert metrics[2].recall == 0.0
@@ -0,0 +1,101 @@
+import pytest
+from llama_stack.apis.inference import Message, UserMessage
+
+from granite_guardian_shield.config import Risk
+from granite_guardian_shield.constants import TruncationStrategy
+from granite_guardian_shield.inference import Inference
+from granite_guardian_shield.models import RiskProbability
+from granite_guardian_shield.truncation import (TRUNCATION_MARKER,
+                                                TokenBudgetInference,
+                                                TokenCounter, fit_to_budget,
+                                                split_windows, truncate_text)
+
+TEXT = " ".join(f"w{i}" for i in range(10))
+
+
+class RecordingInference(Inference):
+    def __init__(self, risky_word: str | None = None):
+        self.requests: list[list[Message]] = []
+        self.risky_word = risky_word
+
+    async def run(self, risk: Risk, messages: list[Message]) -> RiskProbability:
+        self.requests.append(messages)
+        is_risky = self.risky_word is not None and self.risky_word in str(messages[-1].content)
+        return RiskProbability(
+            risk_name=risk.name,
+            is_risky=is_risky,
+            safe_confidence=0.1 if is_risky else 0.9,
+            risky_confidence=0.9 if is_risky else 0.1,
+        )
+
+
+def test_approximate_token_counter():
+    counter = TokenCounter()
+
+    assert counter.count(TEXT) == 10
+    assert counter.count("internationalization!") == 6
+
+
+@pytest.mark.parametrize(
+    "strategy,expected",
+    [
+        (TruncationStrategy.head, "w0 w1 w2 w3 "),
+        (TruncationStrategy.tail, "w6 w7 w8 w9"),
+        (TruncationStrategy.head_tail, "w0 w1 " + TRUNCATION_MARKER + "w8 w9"),
+    ],
+)
+def test_truncate_text(strategy, expected):
+    offsets = TokenCounter().offsets(TEXT)
+
+    assert truncate_text(TEXT, offsets, 4, strategy) == expected
+
+
+def test_split_windows_overlap():
+    offsets = TokenCounter().offsets(TEXT)
+
+    assert split_windows(TEXT, offsets, 4, 1) == ["w0 w1 w2 w3 ", "w3 w4 w5 w6 ", "w6 w7 w8 w9"]
+
+
+def test_fit_to_budget_shortens_longest_messages_first():
+    assert fit_to_budget([2, 10, 20], 20) == [2, 9, 9]
+    assert fit_to_budget([2, 3], 20) == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_token_budget_truncates_and_reports_token_counts():
+    inner = RecordingInference()
+    inference = TokenBudgetInference(inner, TokenCounter())
+    risk = Risk(name="harm", token_budget=4, truncation=TruncationStrategy.tail)
+
+    verdict = await inference.run(risk, [UserMessage(content=TEXT)])
+
+    assert inner.requests[0][0].content == "w6 w7 w8 w9"
+    assert verdict.input_tokens == 10
+    assert verdict.sent_tokens == 4
+    assert verdict.windows is None
+
+
+@pytest.mark.asyncio
+async def test_token_budget_sliding_window_keeps_riskiest_verdict():
+    inner = RecordingInference(risky_word="w8")
+    inference = TokenBudgetInference(inner, TokenCounter())
+    risk = Risk(name="harm", token_budget=4, truncation=TruncationStrategy.sliding_window, window_overlap=1)
+
+    verdict = await inference.run(risk, [UserMessage(content=TEXT)])
+
+    assert len(inner.requests) == 3
+    assert verdict.is_risky is True
+    assert verdict.windows == 3
+    assert verdict.sent_tokens == 12
+
+
+@pytest.mark.asyncio
+async def test_no_token_budget_passes_messages_through():
+    inner = RecordingInference()
+    inference = TokenBudgetInference(inner, TokenCounter())
+    messages = [UserMessage(content=TEXT)]
+
+    verdict = await inference.run(Risk(name="harm"), messages)
+
+    assert inner.requests == [messages]
+    assert verdict.input_tokens is None